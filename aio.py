@@ -0,0 +1,67 @@
+# asyncio facade over the OpenD contexts. The SDK is blocking, so every call
+# runs on a bounded thread pool; independent queries can then be composed with
+# asyncio.gather and finish in the time of the slowest one. Rate limits still
+# apply: the calls go through the same ScheduledContext/Scheduler as sync code.
+#
+#   async def main(session):
+#       (ret_a, funds), (ret_p, positions) = await asyncio.gather(
+#           session.trade.accinfo_query(trd_env=TRADING_ENV),
+#           session.trade.position_list_query(trd_env=TRADING_ENV))
+#   aio.run(main)
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from connection import ConnectionManager, MAX_WORKERS
+
+class AsyncContext:
+    """
+    Awaitable view of a trade or quote context: every public method becomes a
+    coroutine. The context itself is fetched on the pool, so connecting never
+    blocks the event loop.
+    """
+    def __init__(self, session, get_context):
+        self._session = session
+        self._get_context = get_context
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            return await self._session.run(lambda: getattr(self._get_context(), name)(*args, **kwargs))
+        return call
+
+class AsyncSession:
+    """
+    One event loop's worth of OpenD access: `trade` and `quote` contexts plus
+    run() for any other blocking helper (ledger fetches, etc.). At most
+    `max_concurrency` blocking calls run at once.
+    """
+    def __init__(self, max_concurrency=MAX_WORKERS):
+        self.max_concurrency = max(1, max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="opend-aio")
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.trade = AsyncContext(self, ConnectionManager.get_trade_context)
+        self.quote = AsyncContext(self, ConnectionManager.get_quote_context)
+
+    async def run(self, fn, *args, **kwargs):
+        """Awaits fn(*args, **kwargs) run on the session's thread pool."""
+        async with self._semaphore:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.close()
+
+def run(main, *args, max_concurrency=MAX_WORKERS):
+    """Runs `await main(session, *args)` from synchronous code and returns its result."""
+    async def runner():
+        async with AsyncSession(max_concurrency) as session:
+            return await main(session, *args)
+    return asyncio.run(runner())
@@ -0,0 +1,82 @@
+# Cold-start benchmark for the CLI: how long each subcommand takes before it can
+# talk to OpenD. Every sample is a fresh interpreter, so nothing is warm.
+#
+#   python bench_startup.py --runs 10 --output bench_output.txt
+import os
+import statistics
+import subprocess
+import sys
+import time
+import click
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+MAIN_PY = os.path.join(HERE, "main.py")
+
+# Module each command imports before its first request (none: CLI only).
+COMMAND_MODULES = {
+    "portfolio summary": "portfolio",
+    "portfolio positions": "portfolio",
+    "portfolio deals": "portfolio",
+    "portfolio pnl": "portfolio",
+    "statement": "portfolio",
+    "quote": "market_data",
+    "blotter": "blotter",
+    "subscriptions": "market_data",
+    "unlock": "connection",
+    "orders": "trading",
+    "cancel": "trading",
+    "batch": "trading",
+    "buy": "trading",
+    "sell": "trading",
+    "shell": "shell",
+    "daemon start": None,
+    "daemon stop": None,
+    "daemon status": None,
+    "daemon run": "connection",
+}
+
+def _time_process(args, runs):
+    """Wall-clock seconds of `python args...` for each run."""
+    env = dict(os.environ, MOOMOO_NO_DAEMON="1")
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + args, cwd=HERE, env=env,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def _cold_start(command, runs):
+    """
+    Samples for `main.py <command> --help` plus, in the same process, the import
+    of the command's module: the startup cost paid before the first request.
+    """
+    module = COMMAND_MODULES[command]
+    argv = command.split() + ["--help"]
+    code = ("import sys; sys.argv = ['main.py'] + %r; import main\n"
+            "try:\n    main.cli()\nexcept SystemExit:\n    pass\n" % argv)
+    if module:
+        code += "import %s\n" % module
+    return _time_process(["-c", code], runs)
+
+@click.command()
+@click.option("--runs", default=5, show_default=True, help="Fresh processes per command.")
+@click.option("--output", "-o", type=click.Path(dir_okay=False), default=None,
+              help="Also write the results to this file.")
+def bench(runs, output):
+    """Measure cold-start latency of every subcommand."""
+    baseline = statistics.median(_time_process(["-c", "pass"], runs))
+    lines = [f"python startup (baseline): {baseline * 1000:.0f} ms",
+             f"{'command':<22}{'module':<14}{'median ms':>10}{'min ms':>10}{'max ms':>10}"]
+    click.echo("\n".join(lines))
+    for command, module in COMMAND_MODULES.items():
+        samples = _cold_start(command, runs)
+        lines.append(f"{command:<22}{module or '-':<14}{statistics.median(samples) * 1000:>10.0f}"
+                     f"{min(samples) * 1000:>10.0f}{max(samples) * 1000:>10.0f}")
+        click.echo(lines[-1])
+    if output:
+        with open(output, "w") as f:
+            f.write("\n".join(lines) + "\n")
+
+if __name__ == "__main__":
+    bench()
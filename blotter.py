@@ -0,0 +1,227 @@
+import threading
+import time
+from rich.console import Console, Group
+from rich.live import Live
+from rich.table import Table
+from moomoo import RET_OK, TrdSide, OrderStatus
+from connection import ConnectionManager, TRADING_ENV, safe_float, interruptible, health_note
+from trading import OrderPushHandler, DealPushHandler, WORKING_STATUSES
+from lots import SIDE_SIGNS
+
+console = Console()
+
+# Default cap on screen refreshes per second
+DEFAULT_BLOTTER_FPS = 2
+# Orders shown (working orders first, then most recently updated)
+MAX_ORDER_ROWS = 20
+
+class Blotter:
+    """
+    In-memory order and position tables. A full query seeds them (at startup,
+    or after a reconnect via resync()); afterwards order and deal pushes are
+    applied incrementally, so OpenD is never polled.
+    """
+    def __init__(self):
+        self.orders = {}
+        self.positions = {}
+        self._seen_deals = set()
+        self._pending = None  # pushes held back while resync() takes its snapshot
+        self.lock = threading.Lock()
+        self.dirty = threading.Event()
+        self.pushes = 0
+        self.synced_at = None
+
+    def resync(self):
+        """
+        Replaces both tables with a full order_list_query / position_list_query.
+        Pushes that arrive meanwhile are held back and reapplied on top of the
+        snapshot: order updates unless the snapshot has a newer version, fills
+        only if they came after the position query was sent (earlier ones are
+        already in it).
+        """
+        ctx = ConnectionManager.get_trade_context()
+        with self.lock:
+            self._pending = []
+        ret_o, orders = ctx.order_list_query(trd_env=TRADING_ENV)
+        with self.lock:
+            self._pending.append(('positions', None))
+        ret_p, positions = ctx.position_list_query(trd_env=TRADING_ENV)
+        with self.lock:
+            pending, self._pending = self._pending, None
+            if ret_o == RET_OK:
+                self.orders = {str(r['order_id']): r for r in orders.to_dict('records')}
+            if ret_p == RET_OK:
+                self.positions = {
+                    r['code']: {
+                        'name': r.get('stock_name', ''),
+                        'qty': safe_float(r.get('qty')),
+                        'cost': safe_float(r.get('average_cost')),
+                        'price': safe_float(r.get('nominal_price')),
+                    }
+                    for r in positions.to_dict('records') if safe_float(r.get('qty')) != 0
+                }
+            after_positions = ret_p != RET_OK
+            for kind, r in pending:
+                if kind == 'positions':
+                    after_positions = True
+                elif kind == 'order':
+                    self._apply_order(r)
+                elif after_positions:
+                    self._apply_deal(r)
+                else:
+                    self._seen_deals.add(r['deal_id'])
+            self.synced_at = time.strftime("%H:%M:%S")
+        self.dirty.set()
+        return ret_o == RET_OK and ret_p == RET_OK
+
+    def on_order(self, data):
+        self._on_push('order', data)
+
+    def on_deal(self, data):
+        self._on_push('deal', data)
+
+    def _on_push(self, kind, data):
+        with self.lock:
+            for r in data.to_dict('records'):
+                if r.get('trd_env') not in (None, TRADING_ENV):
+                    continue
+                self.pushes += 1
+                if self._pending is not None:
+                    self._pending.append((kind, r))
+                elif kind == 'order':
+                    self._apply_order(r)
+                else:
+                    self._apply_deal(r)
+        self.dirty.set()
+
+    def _apply_order(self, r):
+        """Keeps the newest version of each order (caller holds the lock)."""
+        order_id = str(r['order_id'])
+        current = self.orders.get(order_id)
+        if current is None or str(r.get('updated_time', '')) >= str(current.get('updated_time', '')):
+            self.orders[order_id] = r
+
+    def _apply_deal(self, r):
+        """Moves the position by one fill (caller holds the lock)."""
+        sign = SIDE_SIGNS.get(str(r.get('trd_side')))
+        if sign is None or r['deal_id'] in self._seen_deals:
+            return
+        self._seen_deals.add(r['deal_id'])
+        qty = safe_float(r.get('qty'))
+        price = safe_float(r.get('price'))
+        pos = self.positions.setdefault(r['code'], {'name': r.get('stock_name', ''), 'qty': 0.0,
+                                                    'cost': 0.0, 'price': price})
+        held, change = pos['qty'], sign * qty
+        new_qty = held + change
+        if held * change >= 0 and new_qty:
+            # Opening or adding (long or short): re-average the cost.
+            pos['cost'] = (pos['cost'] * abs(held) + price * qty) / abs(new_qty)
+        elif held * new_qty < 0:
+            # Through zero: what is left was opened by this fill.
+            pos['cost'] = price
+        pos['qty'] = new_qty
+        pos['price'] = price
+        if pos['qty'] == 0:
+            del self.positions[r['code']]
+
+    def render(self):
+        with self.lock:
+            orders = sorted(self.orders.values(), key=lambda r: str(r.get('updated_time', '')), reverse=True)
+            working = [r for r in orders if r.get('order_status') in WORKING_STATUSES]
+            recent = [r for r in orders if r.get('order_status') not in WORKING_STATUSES]
+            shown = (working + recent)[:MAX_ORDER_ROWS]
+            positions = sorted(self.positions.items())
+            pushes, synced_at = self.pushes, self.synced_at
+
+        order_table = Table(title=f"Orders ({len(working)} working)")
+        order_table.add_column("Order ID", style="dim")
+        order_table.add_column("Symbol", style="yellow")
+        order_table.add_column("Side", justify="center")
+        order_table.add_column("Status")
+        order_table.add_column("Price", justify="right")
+        order_table.add_column("Qty", justify="right")
+        order_table.add_column("Filled", justify="right")
+        order_table.add_column("Avg Px", justify="right", style="bold cyan")
+        order_table.add_column("Updated", justify="right", style="dim")
+        for r in shown:
+            side = r.get('trd_side', 'UNKNOWN')
+            side_style = "bold red" if side == TrdSide.BUY else "bold green"
+            status = r.get('order_status', 'UNKNOWN')
+            status_style = "bold white" if status in WORKING_STATUSES else \
+                "green" if status == OrderStatus.FILLED_ALL else "dim"
+            dealt_qty = safe_float(r.get('dealt_qty'))
+            order_table.add_row(
+                str(r.get('order_id', '')),
+                str(r.get('code', '')),
+                f"[{side_style}]{side}[/{side_style}]",
+                f"[{status_style}]{status}[/{status_style}]",
+                f"{safe_float(r.get('price')):.2f}",
+                f"{safe_float(r.get('qty')):.0f}",
+                f"{dealt_qty:.0f}",
+                f"{safe_float(r.get('dealt_avg_price')):.2f}" if dealt_qty else "-",
+                str(r.get('updated_time', ''))
+            )
+
+        pos_table = Table(title="Positions")
+        pos_table.add_column("Symbol", style="yellow")
+        pos_table.add_column("Name")
+        pos_table.add_column("Qty", justify="right")
+        pos_table.add_column("Avg Cost", justify="right", style="bold")
+        pos_table.add_column("Last Px", justify="right")
+        pos_table.add_column("Market Val", justify="right")
+        pos_table.add_column("P&L", justify="right")
+        for code, pos in positions:
+            pl_val = (pos['price'] - pos['cost']) * pos['qty']
+            pl_style = "green" if pl_val >= 0 else "red"
+            pos_table.add_row(
+                code,
+                str(pos['name']),
+                f"{pos['qty']:,.0f}",
+                f"{pos['cost']:,.2f}",
+                f"{pos['price']:,.2f}",
+                f"{pos['qty'] * pos['price']:,.2f}",
+                f"[{pl_style}]{pl_val:+,.2f}[/{pl_style}]"
+            )
+
+        note = health_note(ConnectionManager.health_stats())
+        footer = f"[dim]{TRADING_ENV} | synced {synced_at} | {pushes} pushes{note} | Ctrl+C to exit[/dim]"
+        return Group(order_table, pos_table, footer)
+
+def run_blotter(fps=DEFAULT_BLOTTER_FPS):
+    """
+    Live order/position blotter. Handlers are registered before the initial full
+    query so no push is lost; redraws are throttled to `fps` per second.
+    """
+    ctx = ConnectionManager.get_trade_context()
+    blotter = Blotter()
+    handlers = [OrderPushHandler(blotter.on_order), DealPushHandler(blotter.on_deal)]
+    for handler in handlers:
+        ctx.set_handler(handler)
+
+    if not blotter.resync():
+        console.print("[bold red]Initial order/position query failed; showing pushes only.[/bold red]")
+
+    # Pushes sent while the link was down are lost: start over from a full query.
+    def on_reconnect(kind):
+        if kind == 'trade':
+            blotter.resync()
+    ConnectionManager.health.add_hook(on_reconnect)
+
+    interval = 1.0 / max(fps, 0.1)
+    note = health_note(ConnectionManager.health_stats())
+    try:
+        with interruptible(), Live(blotter.render(), console=console, auto_refresh=False) as live:
+            while True:
+                changed = blotter.dirty.wait(timeout=1.0)
+                previous, note = note, health_note(ConnectionManager.health_stats())
+                if changed or note != previous:
+                    blotter.dirty.clear()
+                    live.update(blotter.render(), refresh=True)
+                    time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        ConnectionManager.health.remove_hook(on_reconnect)
+        for handler in handlers:
+            ctx.remove_handler(handler)
+        ConnectionManager.close()
@@ -1,14 +1,51 @@
 import os
-from moomoo import OpenSecTradeContext, OpenQuoteContext, TrdEnv, SecurityFirm, TrdMarket, RET_OK
+import signal
+import socket
+import sys
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import click
+from moomoo import OpenSecTradeContext, OpenQuoteContext, TrdEnv, SecurityFirm, TrdMarket, RET_OK, ContextStatus
+from scheduler import Scheduler, ScheduledContext
+from instrumentation import Profiler
 
 # Default Configuration
 HOST = os.getenv("MOOMOO_HOST", "127.0.0.1")
 PORT = int(os.getenv("MOOMOO_PORT", 11111))
+# Offline mode: fake_opend stands in for the gateway (MOOMOO_FAKE=1 or MOOMOO_HOST=fake).
+USE_FAKE = os.getenv("MOOMOO_FAKE", "") not in ("", "0") or HOST == "fake"
 TRADING_ENV = TrdEnv.SIMULATE if os.getenv("MOOMOO_ENV", "SIMULATE") == "SIMULATE" else TrdEnv.REAL
 
+# Local cache directory (trading calendar, ledger, etc.)
+CACHE_DIR = os.path.expanduser(os.getenv("MOOMOO_CACHE_DIR", "~/.moomoo-cli"))
+
 # Security Firm
 SECURITY_FIRM = SecurityFirm.FUTUINC 
 
+# OpenD refuses to unsubscribe a symbol until it has been held for one minute.
+MIN_SUBSCRIPTION_HOLD = 60.0
+
+# Upper bound on concurrent in-flight requests for fan-out helpers
+MAX_WORKERS = int(os.getenv("MOOMOO_MAX_WORKERS", 8))
+
+# Reconnect policy. Connection attempts back off exponentially (1s, 2s, 4s, ... capped).
+CONNECT_ATTEMPTS = int(os.getenv("MOOMOO_CONNECT_ATTEMPTS", 4))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# How often the health monitor checks both links.
+HEALTH_INTERVAL = 1.0
+# The SDK retries a dropped socket on a fixed 6s timer; a link still down after
+# this long is torn down and rebuilt by the health monitor instead.
+RECONNECT_GRACE = float(os.getenv("MOOMOO_RECONNECT_GRACE", 3))
+# How long a request waits for a dropped link to come back before it is sent anyway.
+RECONNECT_CALL_WAIT = float(os.getenv("MOOMOO_RECONNECT_WAIT", 30))
+
+class GatewayUnavailable(click.ClickException):
+    """OpenD could not be reached after CONNECT_ATTEMPTS tries."""
+
 # --- Helper Functions (DRY & Robustness) ---
 def safe_float(value):
     """
@@ -30,35 +67,409 @@ def normalize_ticker(ticker):
         return f"US.{ticker}"
     return ticker
 
+@contextmanager
+def interruptible():
+    """
+    The moomoo package maps SIGINT to an immediate os._exit(0). Long-running views
+    (live quotes, shell) restore Python's KeyboardInterrupt so Ctrl+C can clean up.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+    previous = signal.signal(signal.SIGINT, signal.default_int_handler)
+    try:
+        yield
+    finally:
+        signal.signal(signal.SIGINT, previous)
+
+def backoff_delays(base=BACKOFF_BASE, cap=BACKOFF_MAX):
+    """Yields 1, 2, 4, ... seconds, capped at `cap`."""
+    delay = base
+    while True:
+        yield delay
+        delay = min(cap, delay * 2)
+
+def gateway_reachable(timeout=2.0):
+    """Cheap TCP probe of OpenD: the SDK constructors block for a long time on a dead port."""
+    if USE_FAKE:
+        from fake_opend import gateway_reachable as fake_reachable
+        return fake_reachable()
+    try:
+        with socket.create_connection((HOST, PORT), timeout=timeout):
+            return True
+    except OSError:
+        return False
+
+def health_note(stats):
+    """Short footer fragment for live views: '' while nothing has happened."""
+    if stats['state'] != 'up':
+        return f" | [bold red]OpenD {stats['state']}, reconnecting...[/bold red]"
+    if stats['reconnects']:
+        return f" | {stats['reconnects']} reconnects, {stats['downtime']:.0f}s down"
+    return ""
+
+def parallel_map(func, items, max_workers=MAX_WORKERS):
+    """
+    Runs func over items on a bounded thread pool. Rate limits are enforced by
+    the scheduler behind the contexts. Results keep input order.
+    """
+    items = list(items)
+    if not items:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(items)))) as pool:
+        return list(pool.map(func, items))
+
+class SubscriptionManager:
+    """
+    Tracks the quote context's subscriptions (code -> subtypes) so repeated
+    requests reuse them. When OpenD's quota would be exceeded, least-recently-used
+    symbols that have been held past MIN_SUBSCRIPTION_HOLD are unsubscribed first.
+    """
+    def __init__(self):
+        self._subs = OrderedDict()  # code -> {'types': set, 'since': t, 'used': t}; oldest use first
+        self._lock = threading.Lock()
+
+    def ensure(self, codes, subtypes):
+        """
+        Makes sure every code is subscribed to every subtype. Returns (ret, err).
+        """
+        ctx = ConnectionManager.get_quote_context()
+        now = time.monotonic()
+        with self._lock:
+            cost = 0
+            pending = []
+            for code in codes:
+                info = self._subs.get(code)
+                held = info['types'] if info else set()
+                missing = set(subtypes) - held
+                if missing:
+                    cost += len(missing)
+                    pending.append(code)
+                if info:
+                    info['used'] = now
+                    self._subs.move_to_end(code)
+
+            if not pending:
+                return RET_OK, None
+
+            remain = self._remaining(ctx)
+            if remain is not None and cost > remain:
+                self._evict(ctx, cost - remain, protect=set(codes))
+
+            ret, err = ctx.subscribe(pending, list(subtypes))
+            if ret != RET_OK:
+                return ret, f"{err} (quota: {self.usage_line(ctx)})"
+
+            for code in pending:
+                info = self._subs.setdefault(code, {'types': set(), 'since': now, 'used': now})
+                info['types'].update(subtypes)
+                info['since'] = now
+                info['used'] = now
+                self._subs.move_to_end(code)
+        return RET_OK, None
+
+    def _remaining(self, ctx):
+        ret, data = ctx.query_subscription()
+        return data.get('remain') if ret == RET_OK else None
+
+    def _evict(self, ctx, needed, protect):
+        """Unsubscribes LRU symbols past the minimum hold time until `needed` quota is freed."""
+        now = time.monotonic()
+        freed = 0
+        for code, info in list(self._subs.items()):
+            if freed >= needed:
+                break
+            if code in protect or now - info['since'] < MIN_SUBSCRIPTION_HOLD:
+                continue
+            ret, _ = ctx.unsubscribe([code], list(info['types']))
+            if ret == RET_OK:
+                freed += len(info['types'])
+                del self._subs[code]
+        return freed
+
+    def usage(self):
+        """
+        Returns (quota dict from query_subscription or None, list of
+        (code, subtypes, held seconds, idle seconds)) in LRU order.
+        """
+        ctx = ConnectionManager.get_quote_context()
+        ret, data = ctx.query_subscription()
+        now = time.monotonic()
+        with self._lock:
+            rows = [(code, sorted(info['types']), now - info['since'], now - info['used'])
+                    for code, info in self._subs.items()]
+        return (data if ret == RET_OK else None), rows
+
+    def usage_line(self, ctx):
+        ret, data = ctx.query_subscription()
+        if ret != RET_OK:
+            return "unknown"
+        return f"{data.get('total_used')} used, {data.get('remain')} remaining"
+
+    def reset(self):
+        """Forgets all subscriptions (they die with the quote connection)."""
+        with self._lock:
+            self._subs.clear()
+
+    def restore(self, ctx, resubscribe):
+        """
+        Called after a reconnect. OpenD restarts the minimum hold clock, and a
+        freshly built context has no subscriptions at all, so `resubscribe`
+        replays them on `ctx` (symbols that fail are forgotten). Returns the
+        number of symbols restored.
+        """
+        now = time.monotonic()
+        with self._lock:
+            groups = {}
+            for code, info in self._subs.items():
+                info['since'] = now
+                groups.setdefault(frozenset(info['types']), []).append(code)
+            if not resubscribe:
+                return len(self._subs)
+            for subtypes, codes in groups.items():
+                ret, _ = ctx.subscribe(codes, list(subtypes))
+                if ret != RET_OK:
+                    for code in codes:
+                        del self._subs[code]
+            return len(self._subs)
+
+class HealthMonitor:
+    """
+    Background thread watching the state of both OpenD links. When one drops,
+    its gate closes so new requests wait for it rather than failing. The SDK
+    reconnects the socket by itself (and resubscribes/unlocks); a link that
+    stays down past RECONNECT_GRACE is closed and rebuilt with exponential
+    backoff, after which subscriptions and unlock state are replayed here.
+    Either way, reconnect hooks run once the link is back (e.g. the blotter
+    resyncs its orders), and reconnects and downtime are counted.
+    """
+    KINDS = ('trade', 'quote')
+
+    def __init__(self):
+        self.gates = {kind: threading.Event() for kind in self.KINDS}
+        for gate in self.gates.values():
+            gate.set()
+        self._down_since = {}
+        self._outage_started = None
+        self._hooks = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reconnects = 0
+        self.downtime = 0.0
+        self.last_error = None
+
+    def start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="opend-health", daemon=True)
+                self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        thread = self._thread
+        if thread is not None and thread is not threading.current_thread():
+            thread.join(timeout=5)
+        self._thread = None
+        self._down_since.clear()
+        for gate in self.gates.values():
+            gate.set()
+
+    def add_hook(self, fn):
+        """fn(kind) runs on the monitor thread after the 'trade' or 'quote' link recovers."""
+        with self._lock:
+            self._hooks.append(fn)
+
+    def remove_hook(self, fn):
+        with self._lock:
+            if fn in self._hooks:
+                self._hooks.remove(fn)
+
+    def stats(self):
+        """
+        {'state', 'reconnects', 'downtime', 'last_error'}. Downtime is wall time
+        with at least one link down, including an ongoing outage.
+        """
+        down = dict(self._down_since)
+        started = self._outage_started
+        current = time.monotonic() - started if down and started is not None else 0.0
+        return {'state': 'down: ' + ', '.join(sorted(down)) if down else 'up',
+                'reconnects': self.reconnects, 'downtime': self.downtime + current,
+                'last_error': self.last_error}
+
+    def _run(self):
+        while not self._stop.wait(HEALTH_INTERVAL):
+            for kind in self.KINDS:
+                try:
+                    self._check(kind)
+                except Exception as e:
+                    self.last_error = str(e)
+
+    def _check(self, kind):
+        wrapper = ConnectionManager._context(kind)
+        if wrapper is None:
+            return
+        since = self._down_since.get(kind)
+        if _is_up(wrapper._ctx):
+            if since is not None:
+                self._recovered(kind, wrapper, rebuilt=False)
+            return
+        now = time.monotonic()
+        if since is None:
+            if not self._down_since:
+                self._outage_started = now
+            self._down_since[kind] = now
+            self.gates[kind].clear()
+        elif now - since >= RECONNECT_GRACE and self._rebuild(kind, wrapper):
+            self._recovered(kind, wrapper, rebuilt=True)
+
+    def _rebuild(self, kind, wrapper):
+        """Replaces the wrapper's context with a new one, retrying until it is up or we stop."""
+        try:
+            # Also stops the SDK's own fixed-interval retries on the old socket.
+            wrapper._ctx.close()
+        except Exception:
+            pass
+        delays = backoff_delays()
+        while not self._stop.is_set():
+            if gateway_reachable():
+                try:
+                    ctx = ConnectionManager._open(kind)
+                    if _is_up(ctx):
+                        wrapper.replace(ctx)
+                        return True
+                    ctx.close()
+                except Exception as e:
+                    self.last_error = str(e)
+            else:
+                self.last_error = f"OpenD not reachable at {HOST}:{PORT}"
+            self._stop.wait(next(delays))
+        return False
+
+    def _recovered(self, kind, wrapper, rebuilt):
+        ctx = wrapper._ctx
+        # Straight on the raw context: requests through the wrapper would wait on the closed gate.
+        with ConnectionManager.profiler.phase('reconnect ' + kind):
+            if kind == 'quote':
+                ConnectionManager.subscriptions.restore(ctx, resubscribe=rebuilt)
+            elif rebuilt and ConnectionManager._unlock_password is not None:
+                ret, data = ctx.unlock_trade(password=ConnectionManager._unlock_password)
+                if ret != RET_OK:
+                    self.last_error = f"unlock replay failed: {data}"
+        del self._down_since[kind]
+        self.reconnects += 1
+        if not self._down_since:
+            self.downtime += time.monotonic() - self._outage_started
+        self.gates[kind].set()
+        with self._lock:
+            hooks = list(self._hooks)
+        for hook in hooks:
+            try:
+                hook(kind)
+            except Exception as e:
+                self.last_error = str(e)
+
+def _is_up(ctx):
+    # Contexts without a status (older SDKs) are assumed healthy.
+    return getattr(ctx, 'status', ContextStatus.READY) == ContextStatus.READY
+
 class ConnectionManager:
     _trade_context = None
     _quote_context = None
+    subscriptions = SubscriptionManager()
+    # Every rate-limited SDK call on either context goes through this scheduler.
+    scheduler = Scheduler(max_in_flight=MAX_WORKERS)
+    # Times SDK calls and phases when --profile is on (otherwise idle).
+    profiler = Profiler()
+    # Tracks link state, reconnects after gateway restarts, counts downtime.
+    health = HealthMonitor()
+    _connect_lock = threading.RLock()
+    # Kept in memory only, to replay unlock_trade on a rebuilt trade context.
+    _unlock_password = None
+    _account_key = None
+    _persistent = False
 
     @classmethod
-    def get_trade_context(cls):
-        if cls._trade_context is None:
+    def _open(cls, kind):
+        """Creates a bare SDK (or fake) context of the given kind."""
+        if kind == 'trade':
+            if USE_FAKE:
+                from fake_opend import FakeTradeContext
+                return FakeTradeContext()
+            return OpenSecTradeContext(
+                host=HOST, 
+                port=PORT, 
+                security_firm=SECURITY_FIRM,
+                filter_trdmarket=TrdMarket.US
+            )
+        if USE_FAKE:
+            from fake_opend import FakeQuoteContext
+            return FakeQuoteContext()
+        return OpenQuoteContext(host=HOST, port=PORT)
+
+    @classmethod
+    def _connect(cls, kind):
+        """
+        Opens a context, retrying with exponential backoff while OpenD is not
+        reachable. Raises GatewayUnavailable after CONNECT_ATTEMPTS tries.
+        """
+        delays = backoff_delays()
+        error = None
+        for attempt in range(CONNECT_ATTEMPTS):
+            if attempt:
+                delay = next(delays)
+                print(f"OpenD unavailable ({error}); retrying in {delay:.0f}s...", file=sys.stderr)
+                time.sleep(delay)
+            if not gateway_reachable():
+                error = f"OpenD not reachable at {HOST}:{PORT}"
+                continue
             try:
-                cls._trade_context = OpenSecTradeContext(
-                    host=HOST, 
-                    port=PORT, 
-                    security_firm=SECURITY_FIRM,
-                    filter_trdmarket=TrdMarket.US
-                )
+                with cls.profiler.phase('connect ' + kind):
+                    ctx = cls._open(kind)
             except Exception as e:
-                print(f"[bold red]Error connecting to Trade Context:[/bold red] {e}")
-                exit(1)
+                error = e
+                continue
+            cls.health.start()
+            return ScheduledContext(ctx, cls.scheduler, cls.profiler,
+                                    gate=cls.health.gates[kind], gate_timeout=RECONNECT_CALL_WAIT)
+        raise GatewayUnavailable(f"Cannot open the {kind} context at {HOST}:{PORT} "
+                                 f"after {CONNECT_ATTEMPTS} attempts: {error}")
+
+    @classmethod
+    def _context(cls, kind):
+        return cls._trade_context if kind == 'trade' else cls._quote_context
+
+    @classmethod
+    def get_trade_context(cls):
+        with cls._connect_lock:
+            if cls._trade_context is None:
+                cls._trade_context = cls._connect('trade')
         return cls._trade_context
 
     @classmethod
     def get_quote_context(cls):
-        if cls._quote_context is None:
-            try:
-                cls._quote_context = OpenQuoteContext(host=HOST, port=PORT)
-            except Exception as e:
-                print(f"[bold red]Error connecting to Quote Context:[/bold red] {e}")
-                exit(1)
+        with cls._connect_lock:
+            if cls._quote_context is None:
+                cls._quote_context = cls._connect('quote')
         return cls._quote_context
 
+    @classmethod
+    def account_key(cls):
+        """
+        Stable identifier of the account the trade context acts on, e.g. '281756:SIMULATE'.
+        Used to key local caches so accounts and environments never mix.
+        """
+        if cls._account_key is None:
+            acc_id = 0
+            ret, data = cls.get_trade_context().get_acc_list()
+            if ret == RET_OK and not data.empty:
+                rows = data[data['trd_env'] == TRADING_ENV]
+                if not rows.empty:
+                    acc_id = rows.iloc[0]['acc_id']
+            cls._account_key = f"{acc_id}:{TRADING_ENV}"
+        return cls._account_key
+
     @classmethod
     def unlock(cls, password):
         """
@@ -68,15 +479,40 @@ class ConnectionManager:
         ret, data = ctx.unlock_trade(password=password)
         
         if ret == RET_OK:
+            cls._unlock_password = password
             print("[bold green]Trading successfully unlocked![/bold green]")
         else:
             print(f"[bold red]Unlock failed:[/bold red] {data}")
 
+    @classmethod
+    def keep_alive(cls, enabled=True):
+        """
+        Long-lived processes (daemon, shell) keep the contexts, subscriptions and
+        unlock state across commands: close() becomes a no-op until shutdown().
+        """
+        cls._persistent = enabled
+
     @classmethod
     def close(cls):
+        if cls._persistent:
+            return
+        cls.shutdown()
+
+    @classmethod
+    def health_stats(cls):
+        """Link state, reconnect count and total downtime (seconds) of this session."""
+        return cls.health.stats()
+
+    @classmethod
+    def shutdown(cls):
+        cls.health.stop()
+        cls._unlock_password = None
+        # A context opened later in this process may act on another account.
+        cls._account_key = None
         if cls._trade_context:
             cls._trade_context.close()
             cls._trade_context = None
         if cls._quote_context:
             cls._quote_context.close()
-            cls._quote_context = None
\ No newline at end of file
+            cls._quote_context = None
+            cls.subscriptions.reset()
\ No newline at end of file
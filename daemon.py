@@ -0,0 +1,248 @@
+# Optional session daemon: holds warm OpenD contexts, subscriptions and unlock
+# state, and runs CLI commands sent by thin clients over a local Unix socket.
+# The client half only uses the standard library, so a forwarded command never
+# pays for importing moomoo, pandas or rich.
+import io
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import time
+
+SOCKET_PATH = os.getenv(
+    "MOOMOO_DAEMON_SOCKET",
+    os.path.join(os.path.expanduser(os.getenv("MOOMOO_CACHE_DIR", "~/.moomoo-cli")), "daemon.sock"),
+)
+
+# A forwarded command is only valid if the daemon talks to the same gateway/environment.
+FORWARDED_ENV = ("MOOMOO_HOST", "MOOMOO_PORT", "MOOMOO_ENV", "MOOMOO_FAKE")
+
+# Commands that manage the daemon itself or need the client's own terminal.
+LOCAL_COMMANDS = {"daemon", "shell", "blotter"}
+# --wait too: the daemon serves one request at a time, and a fill wait would
+# hold up every other client (a `cancel --all` included) until it times out.
+LOCAL_FLAGS = {"--watch", "--wait"}
+
+def _env_fingerprint():
+    return {k: os.getenv(k) for k in FORWARDED_ENV}
+
+def _send(sock, message):
+    sock.sendall((json.dumps(message) + "\n").encode())
+
+# --- Client ---
+
+def _request(message, timeout=None):
+    """Sends one request and yields the daemon's JSON replies. Raises OSError if unreachable."""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(SOCKET_PATH)
+        _send(sock, message)
+        with sock.makefile("r", encoding="utf-8") as replies:
+            for line in replies:
+                yield json.loads(line)
+    finally:
+        sock.close()
+
+def forward_to_daemon(argv):
+    """
+    Runs argv inside a running daemon, streaming its output to stdout.
+    Returns the exit code, or None when the command must run locally
+    (no daemon, local-only command, MOOMOO_NO_DAEMON set, or environment mismatch).
+    """
+    if os.getenv("MOOMOO_NO_DAEMON") or not argv or not os.path.exists(SOCKET_PATH):
+        return None
+    if argv[0] in LOCAL_COMMANDS or LOCAL_FLAGS.intersection(argv):
+        return None
+
+    message = {
+        "op": "run",
+        "argv": argv,
+        "cwd": os.getcwd(),
+        "env": _env_fingerprint(),
+        "tty": sys.stdout.isatty(),
+        "width": shutil.get_terminal_size().columns,
+    }
+    try:
+        for reply in _request(message):
+            if "out" in reply:
+                sys.stdout.write(reply["out"])
+                sys.stdout.flush()
+            elif "err" in reply:
+                sys.stderr.write(reply["err"])
+                sys.stderr.flush()
+            elif "fallback" in reply:
+                return None
+            elif "exit" in reply:
+                return reply["exit"]
+    except (OSError, ValueError):
+        return None
+    return 1
+
+def daemon_status():
+    """Returns the daemon's status dict, or None if it is not running."""
+    try:
+        for reply in _request({"op": "status"}, timeout=5):
+            return reply
+    except (OSError, ValueError):
+        return None
+
+def stop_daemon():
+    """Asks the daemon to shut down. Returns False if none was running."""
+    try:
+        for _ in _request({"op": "stop"}, timeout=5):
+            pass
+        return True
+    except (OSError, ValueError):
+        return False
+
+def start_daemon(timeout=15.0):
+    """
+    Launches `main.py daemon run` in the background and waits for its socket.
+    Returns True once the daemon answers.
+    """
+    if daemon_status():
+        return True
+    main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "main.py")
+    with open(os.devnull, "wb") as devnull:
+        subprocess.Popen([sys.executable, main_py, "daemon", "run"],
+                         stdin=devnull, stdout=devnull, stderr=devnull,
+                         start_new_session=True)
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if daemon_status():
+            return True
+        time.sleep(0.1)
+    return False
+
+# --- Server ---
+
+class _SocketWriter(io.TextIOBase):
+    """File object that streams everything written to it back to the client's stdout (or stderr)."""
+    def __init__(self, sock, tty, key="out"):
+        self._sock = sock
+        self._tty = tty
+        self._key = key
+
+    def writable(self):
+        return True
+
+    def isatty(self):
+        return self._tty
+
+    def write(self, text):
+        # click probes streams with write(b"") and then sends bytes to "binary" writers
+        if isinstance(text, bytes):
+            text = text.decode("utf-8", "replace")
+        if text:
+            _send(self._sock, {self._key: text})
+        return len(text)
+
+def _command_consoles():
+    """(module, Console) pairs for the repo's command modules loaded in this process."""
+    from rich.console import Console
+    here = os.path.dirname(os.path.abspath(__file__))
+    pairs = []
+    for module in list(sys.modules.values()):
+        console = getattr(module, "console", None)
+        path = getattr(module, "__file__", None) or ""
+        if isinstance(console, Console) and os.path.dirname(os.path.abspath(path)) == here:
+            pairs.append((module, console))
+    return pairs
+
+def _run_command(cli, argv, writer, err_writer, width):
+    """Runs one click command in-process with stdout/stderr (and the consoles) sent to the writers."""
+    import contextlib
+    import traceback
+    import click
+    from rich.console import Console
+
+    # No fixed file: the console follows sys.stdout, so commands that move their
+    # status output to stderr (--format) are honoured.
+    console = Console(force_terminal=writer.isatty(), width=width,
+                      color_system="256" if writer.isatty() else None)
+    bound = _command_consoles()
+    for module, _ in bound:
+        module.console = console
+    try:
+        with contextlib.redirect_stdout(writer), contextlib.redirect_stderr(err_writer):
+            try:
+                result = cli.main(args=argv, prog_name="main.py", standalone_mode=False)
+                return result if isinstance(result, int) else 0
+            except click.exceptions.ClickException as e:
+                e.show(file=err_writer)
+                return e.exit_code
+            except click.exceptions.Abort:
+                err_writer.write("Aborted!\n")
+                return 1
+            except SystemExit as e:
+                return e.code if isinstance(e.code, int) else 1
+            except Exception:
+                err_writer.write(traceback.format_exc())
+                return 1
+    finally:
+        for module, original in bound:
+            module.console = original
+
+def serve(cli):
+    """
+    Runs the daemon in the foreground until stopped. Requests are handled one at a
+    time: commands share the process-wide consoles and contexts.
+    """
+    import socketserver
+    from connection import ConnectionManager
+
+    env = _env_fingerprint()
+    started = time.time()
+    stats = {"commands": 0}
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline())
+            op = request.get("op")
+            if op == "status":
+                _send(self.connection, {"pid": os.getpid(), "uptime": time.time() - started,
+                                        "commands": stats["commands"], "env": env,
+                                        "health": ConnectionManager.health_stats()})
+            elif op == "stop":
+                _send(self.connection, {"exit": 0})
+                self.server.stopping = True
+            elif op == "run":
+                if request.get("env") != env:
+                    _send(self.connection, {"fallback": True})
+                    return
+                os.chdir(request.get("cwd") or os.getcwd())
+                writer = _SocketWriter(self.connection, bool(request.get("tty")))
+                err_writer = _SocketWriter(self.connection, bool(request.get("tty")), key="err")
+                code = _run_command(cli, request.get("argv", []), writer, err_writer, request.get("width") or 80)
+                stats["commands"] += 1
+                _send(self.connection, {"exit": code})
+
+    os.makedirs(os.path.dirname(SOCKET_PATH), exist_ok=True)
+    if os.path.exists(SOCKET_PATH):
+        os.unlink(SOCKET_PATH)
+
+    ConnectionManager.keep_alive()
+    ConnectionManager.get_trade_context()
+    ConnectionManager.get_quote_context()
+
+    # The daemon can place orders on an unlocked account: owner-only access,
+    # from the moment the socket exists (bind creates it with the umask).
+    previous_umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(SOCKET_PATH, Handler)
+    finally:
+        os.umask(previous_umask)
+    server.stopping = False
+    os.chmod(SOCKET_PATH, 0o600)
+    try:
+        while not server.stopping:
+            server.handle_request()
+    finally:
+        server.server_close()
+        if os.path.exists(SOCKET_PATH):
+            os.unlink(SOCKET_PATH)
+        ConnectionManager.keep_alive(False)
+        ConnectionManager.shutdown()
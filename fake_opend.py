@@ -0,0 +1,747 @@
+# Offline stand-in for the OpenD gateway. Implements the part of
+# OpenSecTradeContext / OpenQuoteContext this CLI uses, backed by a synthetic,
+# seeded market, so commands, benchmarks and experiments run without a
+# gateway or a logged-in account.
+#
+# Select it with MOOMOO_FAKE=1 (or MOOMOO_HOST=fake). Tuning knobs:
+#   MOOMOO_FAKE_LATENCY_MS       mean request round-trip (default 20)
+#   MOOMOO_FAKE_JITTER_MS        uniform +/- jitter on that (default 5)
+#   MOOMOO_FAKE_RATE_LIMITS      0 disables OpenD's 30 s request quotas (default 1)
+#   MOOMOO_FAKE_DEALS_PER_DAY    synthetic history fills per trading day (default 20)
+#   MOOMOO_FAKE_FLOWS_PER_DAY    synthetic cash-flow rows per day (default 2)
+#   MOOMOO_FAKE_ORDERS           orders already on today's book (default 20)
+#   MOOMOO_FAKE_POSITIONS        open positions per account (default 10)
+#   MOOMOO_FAKE_ACCOUNTS         accounts per trading environment (default 1)
+#   MOOMOO_FAKE_SUB_QUOTA        quote subscription quota (default 100)
+#   MOOMOO_FAKE_PUSH_HZ          quote/order-book pushes per second per symbol (default 5)
+#   MOOMOO_FAKE_FILL_MS          delay before a marketable order fills (default 50)
+#   MOOMOO_FAKE_SEED             seed for all synthetic data (default 7)
+#   MOOMOO_FAKE_OUTAGE           "EVERY:DURATION" seconds: the gateway goes down for
+#                                DURATION every EVERY seconds, like an OpenD restart (off)
+import os
+import random
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+import pandas as pd
+import pytz
+from moomoo import (RET_OK, RET_ERROR, ContextStatus, TrdEnv, TrdSide, OrderType, OrderStatus, ModifyOrderOp, SubType,
+                    StockQuoteHandlerBase, OrderBookHandlerBase, TradeOrderHandlerBase, TradeDealHandlerBase)
+from scheduler import RATE_LIMITS, RATE_LIMIT_WINDOW, rate_family
+
+LATENCY = float(os.getenv("MOOMOO_FAKE_LATENCY_MS", 20)) / 1000
+JITTER = float(os.getenv("MOOMOO_FAKE_JITTER_MS", 5)) / 1000
+RATE_LIMITED = os.getenv("MOOMOO_FAKE_RATE_LIMITS", "1") != "0"
+DEALS_PER_DAY = int(os.getenv("MOOMOO_FAKE_DEALS_PER_DAY", 20))
+FLOWS_PER_DAY = int(os.getenv("MOOMOO_FAKE_FLOWS_PER_DAY", 2))
+OPEN_ORDERS = int(os.getenv("MOOMOO_FAKE_ORDERS", 20))
+POSITIONS = int(os.getenv("MOOMOO_FAKE_POSITIONS", 10))
+ACCOUNTS = int(os.getenv("MOOMOO_FAKE_ACCOUNTS", 1))
+SUB_QUOTA = int(os.getenv("MOOMOO_FAKE_SUB_QUOTA", 100))
+PUSH_HZ = float(os.getenv("MOOMOO_FAKE_PUSH_HZ", 5))
+FILL_DELAY = float(os.getenv("MOOMOO_FAKE_FILL_MS", 50)) / 1000
+SEED = int(os.getenv("MOOMOO_FAKE_SEED", 7))
+OUTAGE_EVERY, _, OUTAGE_DURATION = os.getenv("MOOMOO_FAKE_OUTAGE", "0:0").partition(":")
+OUTAGE_EVERY, OUTAGE_DURATION = float(OUTAGE_EVERY or 0), float(OUTAGE_DURATION or 0)
+
+# Same limits as the real gateway: at most 90 days per history query, 400 codes
+# per snapshot, 400 orders per fee query, one minute before unsubscribing.
+MAX_HISTORY_DAYS = 90
+MAX_SNAPSHOT_CODES = 400
+MAX_FEE_ORDERS = 400
+MIN_SUBSCRIPTION_HOLD = 60.0
+
+MARKET_TZ = pytz.timezone('US/Eastern')
+FX_RATES = {'USD': 1.0, 'HKD': 7.8, 'CNH': 7.2}
+STARTING_CASH = 100000.0
+BOOK_DEPTH = 10
+
+TICKERS = ['AAPL', 'MSFT', 'NVDA', 'AMZN', 'GOOGL', 'META', 'TSLA', 'AMD', 'NFLX', 'INTC',
+           'ORCL', 'CRM', 'ADBE', 'QCOM', 'AVGO', 'COST', 'PEP', 'KO', 'JPM', 'V']
+
+def _symbols(n):
+    """n synthetic US codes: real-looking tickers first, then SYM0001..."""
+    codes = [f"US.{t}" for t in TICKERS[:n]]
+    codes += [f"US.SYM{i:04d}" for i in range(n - len(codes))]
+    return codes
+
+def _today():
+    return datetime.now(MARKET_TZ).strftime("%Y-%m-%d")
+
+def _now():
+    return datetime.now(MARKET_TZ).strftime("%Y-%m-%d %H:%M:%S.%f")[:-3]
+
+def _weekdays(start, end):
+    day = datetime.strptime(start[:10], "%Y-%m-%d")
+    last = datetime.strptime(end[:10], "%Y-%m-%d")
+    days = []
+    while day <= last:
+        if day.weekday() < 5:
+            days.append(day.strftime("%Y-%m-%d"))
+        day += timedelta(days=1)
+    return days
+
+def _frame(rows, columns):
+    return pd.DataFrame(rows, columns=columns)
+
+ORDER_COLUMNS = ["code", "stock_name", "trd_side", "order_type", "order_status", "order_id", "qty", "price",
+                 "create_time", "updated_time", "dealt_qty", "dealt_avg_price", "last_err_msg", "remark",
+                 "aux_price", "trail_type", "trail_value", "trail_spread", "currency", "trd_env"]
+DEAL_COLUMNS = ["code", "stock_name", "deal_id", "order_id", "qty", "price", "trd_side", "create_time",
+                "counter_broker_id", "counter_broker_name", "status", "trd_env"]
+POSITION_COLUMNS = ["code", "stock_name", "qty", "can_sell_qty", "cost_price", "average_cost", "diluted_cost",
+                    "market_val", "nominal_price", "pl_ratio", "pl_val", "today_pl_val", "unrealized_pl",
+                    "realized_pl", "currency"]
+CASH_FLOW_COLUMNS = ["cashflow_id", "clearing_date", "settlement_date", "currency", "cashflow_type",
+                     "cashflow_direction", "cashflow_amount", "cashflow_remark", "create_time"]
+QUOTE_COLUMNS = ["code", "name", "data_date", "data_time", "last_price", "open_price", "high_price",
+                 "low_price", "prev_close_price", "volume", "turnover"]
+SNAPSHOT_COLUMNS = ["code", "name", "update_time", "last_price", "open_price", "high_price", "low_price",
+                    "prev_close_price", "volume", "turnover", "bid_price", "ask_price", "bid_vol", "ask_vol"]
+
+class RateLimiter:
+    """OpenD's request quotas: at most N calls per limited family (scheduler.rate_family) in any 30-second window."""
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def allow(self, family):
+        if not RATE_LIMITED or family is None:
+            return True
+        limit = RATE_LIMITS[family.split('@')[0]]
+        now = time.monotonic()
+        with self._lock:
+            calls = self._calls.setdefault(family, deque())
+            while calls and now - calls[0] >= RATE_LIMIT_WINDOW:
+                calls.popleft()
+            if len(calls) >= limit:
+                return False
+            calls.append(now)
+            return True
+
+class Market:
+    """Random-walk prices for any code, seeded per symbol so runs are repeatable."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._state = {}
+
+    def _symbol(self, code):
+        state = self._state.get(code)
+        if state is None:
+            rng = random.Random(f"{SEED}:{code}")
+            prev_close = round(rng.uniform(10, 500), 2)
+            state = {'rng': rng, 'prev_close': prev_close, 'open': prev_close, 'last': prev_close,
+                     'high': prev_close, 'low': prev_close, 'volume': 0}
+            self._state[code] = state
+        return state
+
+    def tick(self, code):
+        """Advances one step and returns a copy of the symbol's state."""
+        with self._lock:
+            s = self._symbol(code)
+            rng = s['rng']
+            s['last'] = round(max(0.01, s['last'] * (1 + rng.gauss(0, 0.0005))), 2)
+            s['high'] = max(s['high'], s['last'])
+            s['low'] = min(s['low'], s['last'])
+            s['volume'] += rng.randint(1, 50) * 100
+            return dict(s)
+
+    def last(self, code):
+        with self._lock:
+            return self._symbol(code)['last']
+
+    def quote(self, code):
+        s = self.tick(code)
+        return {'code': code, 'name': code.split('.')[-1], 'data_date': _today(), 'data_time': _now()[11:],
+                'last_price': s['last'], 'open_price': s['open'], 'high_price': s['high'], 'low_price': s['low'],
+                'prev_close_price': s['prev_close'], 'volume': s['volume'], 'turnover': s['volume'] * s['last']}
+
+    def book(self, code, num=BOOK_DEPTH):
+        s = self.tick(code)
+        rng = random.Random(f"{SEED}:{code}:{s['volume']}")
+        tick = 0.01 if s['last'] < 100 else 0.05
+        bids = [(round(s['last'] - tick * (i + 1), 2), rng.randint(1, 40) * 100, rng.randint(1, 9), {})
+                for i in range(num)]
+        asks = [(round(s['last'] + tick * (i + 1), 2), rng.randint(1, 40) * 100, rng.randint(1, 9), {})
+                for i in range(num)]
+        return {'code': code, 'name': code.split('.')[-1], 'svr_recv_time_bid': _now(),
+                'svr_recv_time_ask': _now(), 'Bid': bids, 'Ask': asks}
+
+    def snapshot(self, code):
+        q = self.quote(code)
+        book = self.book(code, 1)
+        return {'code': code, 'name': q['name'], 'update_time': f"{q['data_date']} {q['data_time']}",
+                'last_price': q['last_price'], 'open_price': q['open_price'], 'high_price': q['high_price'],
+                'low_price': q['low_price'], 'prev_close_price': q['prev_close_price'], 'volume': q['volume'],
+                'turnover': q['turnover'], 'bid_price': book['Bid'][0][0], 'ask_price': book['Ask'][0][0],
+                'bid_vol': book['Bid'][0][1], 'ask_vol': book['Ask'][0][1]}
+
+class Account:
+    """One account's book: cash, positions, today's orders and fills."""
+    def __init__(self, acc_id, trd_env, market):
+        self.acc_id = acc_id
+        self.trd_env = trd_env
+        self.cash = STARTING_CASH
+        self.realized = 0.0
+        self.orders = {}
+        self.deals = []
+        self.positions = {}
+        self._ids = iter(range(1, 1 << 62))
+        rng = random.Random(f"{SEED}:{acc_id}")
+        for code in _symbols(POSITIONS):
+            qty = rng.randint(1, 20) * 10
+            cost = round(market.last(code) * rng.uniform(0.8, 1.2), 2)
+            self.positions[code] = {'qty': qty, 'cost': cost}
+            self.cash -= qty * cost
+        for i in range(OPEN_ORDERS):
+            code = rng.choice(_symbols(max(POSITIONS, 1)))
+            side = rng.choice([TrdSide.BUY, TrdSide.SELL])
+            away = 0.9 if side == TrdSide.BUY else 1.1
+            self.new_order(code, side, OrderType.NORMAL, round(market.last(code) * away, 2),
+                           rng.randint(1, 10) * 10, status=OrderStatus.SUBMITTED)
+
+    def next_id(self):
+        return f"{self.acc_id}{next(self._ids):08d}"
+
+    def new_order(self, code, side, order_type, price, qty, aux_price=None, trail_type=None,
+                  trail_value=None, trail_spread=None, remark=None, status=OrderStatus.SUBMITTING):
+        now = _now()
+        order = {'code': code, 'stock_name': code.split('.')[-1], 'trd_side': side, 'order_type': order_type,
+                 'order_status': status, 'order_id': self.next_id(), 'qty': float(qty), 'price': float(price),
+                 'create_time': now, 'updated_time': now, 'dealt_qty': 0.0, 'dealt_avg_price': 0.0,
+                 'last_err_msg': '', 'remark': remark or '', 'aux_price': float(aux_price or 0.0),
+                 'trail_type': trail_type or 'N/A', 'trail_value': float(trail_value or 0.0),
+                 'trail_spread': float(trail_spread or 0.0), 'currency': 'USD', 'trd_env': self.trd_env}
+        self.orders[order['order_id']] = order
+        return order
+
+    def fill(self, order, qty, price):
+        """Books one fill against an order; returns the deal row."""
+        total = order['dealt_qty'] + qty
+        order['dealt_avg_price'] = (order['dealt_avg_price'] * order['dealt_qty'] + price * qty) / total
+        order['dealt_qty'] = total
+        order['order_status'] = OrderStatus.FILLED_ALL if total >= order['qty'] else OrderStatus.FILLED_PART
+        order['updated_time'] = _now()
+
+        sign = 1 if order['trd_side'] == TrdSide.BUY else -1
+        pos = self.positions.setdefault(order['code'], {'qty': 0, 'cost': 0.0})
+        if sign > 0:
+            new_qty = pos['qty'] + qty
+            pos['cost'] = (pos['cost'] * pos['qty'] + price * qty) / new_qty if new_qty else 0.0
+            pos['qty'] = new_qty
+        else:
+            self.realized += (price - pos['cost']) * qty
+            pos['qty'] -= qty
+        if pos['qty'] == 0:
+            del self.positions[order['code']]
+        self.cash -= sign * qty * price
+
+        deal = {'code': order['code'], 'stock_name': order['stock_name'], 'deal_id': self.next_id(),
+                'order_id': order['order_id'], 'qty': float(qty), 'price': price, 'trd_side': order['trd_side'],
+                'create_time': order['updated_time'], 'counter_broker_id': 0, 'counter_broker_name': '',
+                'status': 'OK', 'trd_env': self.trd_env}
+        self.deals.append(deal)
+        return deal
+
+    def history_deals(self, day):
+        """Deterministic synthetic fills for a past day."""
+        rng = random.Random(f"{SEED}:{self.acc_id}:{day}")
+        codes = _symbols(max(POSITIONS, 1))
+        deals = []
+        order_id = None
+        seconds = sorted(rng.randint(34200, 57599) for _ in range(DEALS_PER_DAY))
+        for i, sec in enumerate(seconds):
+            # Runs of 1-3 fills belong to one order.
+            if order_id is None or rng.random() < 0.5:
+                order_id = f"{self.acc_id}{day.replace('-', '')}{i:04d}"
+                code, side = rng.choice(codes), rng.choice([TrdSide.BUY, TrdSide.SELL])
+            deals.append({'code': code, 'stock_name': code.split('.')[-1],
+                          'deal_id': f"{order_id}{i:04d}", 'order_id': order_id,
+                          'qty': float(rng.randint(1, 10) * 10), 'price': round(rng.uniform(10, 500), 2),
+                          'trd_side': side, 'create_time': f"{day} {sec // 3600:02d}:{sec // 60 % 60:02d}:{sec % 60:02d}.000",
+                          'counter_broker_id': 0, 'counter_broker_name': '', 'status': 'OK',
+                          'trd_env': self.trd_env})
+        return deals
+
+    def cash_flows(self, day):
+        rng = random.Random(f"{SEED}:{self.acc_id}:flow:{day}")
+        rows = []
+        for i in range(FLOWS_PER_DAY):
+            amount = round(rng.uniform(-500, 500), 2)
+            kind = rng.choice(['Dividend', 'Fee', 'Interest', 'Trade'])
+            rows.append({'cashflow_id': f"{self.acc_id}{day.replace('-', '')}{i:03d}", 'clearing_date': day,
+                         'settlement_date': day, 'currency': 'USD', 'cashflow_type': kind,
+                         'cashflow_direction': 'IN' if amount >= 0 else 'OUT', 'cashflow_amount': amount,
+                         'cashflow_remark': f"Synthetic {kind.lower()}", 'create_time': f"{day} 16:30:00"})
+        return rows
+
+class FakeBroker:
+    """State shared by every fake context in the process (one gateway)."""
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.limiter = RateLimiter()
+        self.market = Market()
+        self.accounts = {}
+        self.unlocked = False
+        self.started = time.monotonic()
+        for env_index, trd_env in enumerate([TrdEnv.SIMULATE, TrdEnv.REAL]):
+            for i in range(ACCOUNTS):
+                acc_id = 1000 + env_index * 100 + i
+                self.accounts[acc_id] = Account(acc_id, trd_env, self.market)
+
+    @classmethod
+    def get(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = FakeBroker()
+            return cls._instance
+
+    def down(self):
+        """True during a simulated outage. A restarted gateway has forgotten the unlock."""
+        if OUTAGE_EVERY <= 0 or OUTAGE_DURATION <= 0:
+            return False
+        elapsed = time.monotonic() - self.started
+        if elapsed < OUTAGE_EVERY or elapsed % OUTAGE_EVERY >= OUTAGE_DURATION:
+            return False
+        self.unlocked = False
+        return True
+
+    def account(self, trd_env, acc_id=0):
+        if acc_id:
+            account = self.accounts.get(int(acc_id))
+            return account if account and account.trd_env == trd_env else None
+        return next((a for a in self.accounts.values() if a.trd_env == trd_env), None)
+
+HANDLER_BASES = (StockQuoteHandlerBase, OrderBookHandlerBase, TradeOrderHandlerBase, TradeDealHandlerBase)
+
+def _handler_kind(handler):
+    return next((base for base in HANDLER_BASES if isinstance(handler, base)), type(handler))
+
+class _FakeContext:
+    """Latency, rate limiting and handler plumbing common to both contexts."""
+    def __init__(self):
+        self._broker = FakeBroker.get()
+        self._handlers = []
+        self._closed = False
+        self._was_down = False
+
+    @property
+    def status(self):
+        """ContextStatus like the SDK's: CLOSED after close() or while the gateway is down."""
+        if self._closed:
+            return ContextStatus.CLOSED
+        if self._broker.down():
+            self._was_down = True
+            return ContextStatus.CLOSED
+        if self._was_down:
+            self._was_down = False
+            self._reconnected()
+        return ContextStatus.READY
+
+    def _reconnected(self):
+        """The SDK's own socket reconnect: subclasses restore what it restores."""
+
+    def _request(self, api, **call):
+        """
+        Simulates one round-trip. Returns an error message if OpenD would reject it.
+        `call` holds the arguments quotas depend on (trd_env, acc_id, acc_index, refresh_cache).
+        """
+        delay = max(0.0, LATENCY + random.uniform(-JITTER, JITTER))
+        if delay:
+            time.sleep(delay)
+        if self.status != ContextStatus.READY:
+            return "Disconnected from OpenD"
+        if not self._broker.limiter.allow(rate_family(api, (), call)):
+            return f"Request too frequent: {api} allows {RATE_LIMITS[api]} calls per {RATE_LIMIT_WINDOW:.0f} seconds"
+        return None
+
+    def set_handler(self, handler):
+        # One handler per push type, like the SDK.
+        kind = _handler_kind(handler)
+        self._handlers = [h for h in self._handlers if _handler_kind(h) is not kind]
+        self._handlers.append(handler)
+        return RET_OK
+
+    def _push(self, base, data):
+        if self.status != ContextStatus.READY:
+            return
+        for handler in list(self._handlers):
+            if isinstance(handler, base) and hasattr(handler, 'callback'):
+                handler.callback(data)
+
+    def close(self):
+        self._closed = True
+
+class FakeTradeContext(_FakeContext):
+    """Offline OpenSecTradeContext."""
+    _contexts = []
+
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._password = None
+        FakeTradeContext._contexts.append(self)
+
+    def _reconnected(self):
+        # The SDK replays unlock_trade on its reconnected socket.
+        if self._password:
+            self._broker.unlocked = True
+
+    def close(self):
+        super().close()
+        if self in FakeTradeContext._contexts:
+            FakeTradeContext._contexts.remove(self)
+
+    def _account(self, trd_env, acc_id):
+        account = self._broker.account(trd_env, acc_id)
+        if account is None:
+            return None, f"No {trd_env} account {acc_id or ''}".strip()
+        return account, None
+
+    def _broadcast(self, base, rows, columns):
+        """Trade pushes go to every open trade context, as OpenD does."""
+        data = _frame(rows, columns)
+        for ctx in list(FakeTradeContext._contexts):
+            ctx._push(base, data)
+
+    def get_acc_list(self):
+        err = self._request('get_acc_list')
+        if err:
+            return RET_ERROR, err
+        rows = [{'acc_id': a.acc_id, 'trd_env': a.trd_env, 'acc_type': 'MARGIN', 'card_num': str(a.acc_id),
+                 'security_firm': 'FUTUINC', 'trdmarket_auth': ['US'], 'acc_status': 'ACTIVE'}
+                for a in self._broker.accounts.values()]
+        return RET_OK, pd.DataFrame(rows)
+
+    def unlock_trade(self, password=None, password_md5=None, is_unlock=True):
+        err = self._request('unlock_trade')
+        if err:
+            return RET_ERROR, err
+        if not password and not password_md5:
+            return RET_ERROR, "Password is empty"
+        self._broker.unlocked = is_unlock
+        self._password = password or password_md5 if is_unlock else None
+        return RET_OK, None
+
+    def accinfo_query(self, trd_env=TrdEnv.REAL, acc_id=0, acc_index=0, refresh_cache=False, currency='USD', **kwargs):
+        err = self._request('accinfo_query', trd_env=trd_env, acc_id=acc_id, acc_index=acc_index,
+                            refresh_cache=refresh_cache)
+        if err:
+            return RET_ERROR, err
+        account, err = self._account(trd_env, acc_id)
+        if err:
+            return RET_ERROR, err
+        rate = FX_RATES.get(str(currency), 1.0)
+        with self._broker.lock:
+            market_val = sum(p['qty'] * self._broker.market.last(c) for c, p in account.positions.items())
+            unrealized = sum(p['qty'] * (self._broker.market.last(c) - p['cost']) for c, p in account.positions.items())
+            row = {'power': account.cash * rate, 'total_assets': (account.cash + market_val) * rate,
+                   'cash': account.cash * rate, 'market_val': market_val * rate,
+                   'realized_pl': account.realized * rate, 'unrealized_pl': unrealized * rate,
+                   'currency': str(currency), 'frozen_cash': 0.0, 'avl_withdrawal_cash': max(account.cash, 0) * rate}
+        return RET_OK, pd.DataFrame([row])
+
+    def position_list_query(self, code='', trd_env=TrdEnv.REAL, acc_id=0, acc_index=0, refresh_cache=False, **kwargs):
+        err = self._request('position_list_query', trd_env=trd_env, acc_id=acc_id, acc_index=acc_index,
+                            refresh_cache=refresh_cache)
+        if err:
+            return RET_ERROR, err
+        account, err = self._account(trd_env, acc_id)
+        if err:
+            return RET_ERROR, err
+        rows = []
+        with self._broker.lock:
+            for c, p in account.positions.items():
+                if code and c != code:
+                    continue
+                price = self._broker.market.last(c)
+                pl = (price - p['cost']) * p['qty']
+                rows.append({'code': c, 'stock_name': c.split('.')[-1], 'qty': float(p['qty']),
+                             'can_sell_qty': float(max(p['qty'], 0)), 'cost_price': p['cost'],
+                             'average_cost': p['cost'], 'diluted_cost': p['cost'],
+                             'market_val': price * p['qty'], 'nominal_price': price,
+                             'pl_ratio': (price / p['cost'] - 1) * 100 if p['cost'] else 0.0, 'pl_val': pl,
+                             'today_pl_val': 0.0, 'unrealized_pl': pl, 'realized_pl': 0.0, 'currency': 'USD'})
+        return RET_OK, _frame(rows, POSITION_COLUMNS)
+
+    def order_list_query(self, order_id="", status_filter_list=[], code='', start='', end='',
+                         trd_env=TrdEnv.REAL, acc_id=0, acc_index=0, refresh_cache=False, **kwargs):
+        err = self._request('order_list_query', trd_env=trd_env, acc_id=acc_id, acc_index=acc_index,
+                            refresh_cache=refresh_cache)
+        if err:
+            return RET_ERROR, err
+        account, err = self._account(trd_env, acc_id)
+        if err:
+            return RET_ERROR, err
+        with self._broker.lock:
+            rows = [dict(o) for o in account.orders.values()
+                    if (not order_id or o['order_id'] == str(order_id)) and (not code or o['code'] == code)
+                    and (not status_filter_list or o['order_status'] in status_filter_list)]
+        return RET_OK, _frame(rows, ORDER_COLUMNS)
+
+    def deal_list_query(self, code="", trd_env=TrdEnv.REAL, acc_id=0, acc_index=0, refresh_cache=False, **kwargs):
+        err = self._request('deal_list_query', trd_env=trd_env, acc_id=acc_id, acc_index=acc_index,
+                            refresh_cache=refresh_cache)
+        if err:
+            return RET_ERROR, err
+        account, err = self._account(trd_env, acc_id)
+        if err:
+            return RET_ERROR, err
+        with self._broker.lock:
+            rows = [dict(d) for d in account.deals if not code or d['code'] == code]
+        return RET_OK, _frame(rows, DEAL_COLUMNS)
+
+    def history_deal_list_query(self, code='', start='', end='', trd_env=TrdEnv.REAL, acc_id=0, acc_index=0, **kwargs):
+        err = self._request('history_deal_list_query', trd_env=trd_env, acc_id=acc_id, acc_index=acc_index)
+        if err:
+            return RET_ERROR, err
+        account, err = self._account(trd_env, acc_id)
+        if err:
+            return RET_ERROR, err
+        today = _today()
+        end = end or today
+        start = start or end
+        span = (datetime.strptime(end[:10], "%Y-%m-%d") - datetime.strptime(start[:10], "%Y-%m-%d")).days
+        if span < 0 or span >= MAX_HISTORY_DAYS:
+            return RET_ERROR, f"Query range must be within {MAX_HISTORY_DAYS} days"
+        rows = []
+        for day in _weekdays(start, min(end[:10], today)):
+            rows.extend(account.history_deals(day) if day < today else [])
+        if start[:10] <= today <= end[:10]:
+            with self._broker.lock:
+                rows.extend(dict(d) for d in account.deals)
+        if code:
+            rows = [r for r in rows if r['code'] == code]
+        return RET_OK, _frame(rows, DEAL_COLUMNS)
+
+    def get_acc_cash_flow(self, clearing_date='', trd_env=TrdEnv.REAL, acc_id=0, acc_index=0, **kwargs):
+        err = self._request('get_acc_cash_flow', trd_env=trd_env, acc_id=acc_id, acc_index=acc_index)
+        if err:
+            return RET_ERROR, err
+        account, err = self._account(trd_env, acc_id)
+        if err:
+            return RET_ERROR, err
+        rows = account.cash_flows(clearing_date) if clearing_date and clearing_date <= _today() else []
+        return RET_OK, _frame(rows, CASH_FLOW_COLUMNS)
+
+    def order_fee_query(self, order_id_list=[], acc_id=0, acc_index=0, trd_env=TrdEnv.REAL):
+        err = self._request('order_fee_query', trd_env=trd_env, acc_id=acc_id, acc_index=acc_index)
+        if err:
+            return RET_ERROR, err
+        if len(order_id_list) > MAX_FEE_ORDERS:
+            return RET_ERROR, f"At most {MAX_FEE_ORDERS} orders per request"
+        rows = []
+        for order_id in order_id_list:
+            fee = round(0.99 + random.Random(f"{SEED}:fee:{order_id}").random() * 4, 2)
+            rows.append({'order_id': order_id, 'fee_amount': fee,
+                         'fee_details': [('Commission', round(fee * 0.6, 2)), ('Platform Fee', round(fee * 0.4, 2))]})
+        return RET_OK, _frame(rows, ['order_id', 'fee_amount', 'fee_details'])
+
+    def place_order(self, price, qty, code, trd_side, order_type=OrderType.NORMAL, adjust_limit=0,
+                    trd_env=TrdEnv.REAL, acc_id=0, acc_index=0, remark=None, aux_price=None,
+                    trail_type=None, trail_value=None, trail_spread=None, **kwargs):
+        err = self._request('place_order', trd_env=trd_env, acc_id=acc_id, acc_index=acc_index)
+        if err:
+            return RET_ERROR, err
+        account, err = self._account(trd_env, acc_id)
+        if err:
+            return RET_ERROR, err
+        if trd_env == TrdEnv.REAL and not self._broker.unlocked:
+            return RET_ERROR, "Please unlock trade first"
+        if qty <= 0:
+            return RET_ERROR, "Quantity must be positive"
+        with self._broker.lock:
+            order = account.new_order(code, trd_side, order_type, price, qty, aux_price, trail_type,
+                                      trail_value, trail_spread, remark)
+            ack = dict(order)
+        threading.Timer(FILL_DELAY, self._work_order, (account, order['order_id'])).start()
+        return RET_OK, _frame([ack], ORDER_COLUMNS)
+
+    def _work_order(self, account, order_id):
+        """Acknowledges a new order, then fills it in 1-3 pieces if it is marketable."""
+        broker = self._broker
+        with broker.lock:
+            order = account.orders[order_id]
+            if order['order_status'] != OrderStatus.SUBMITTING:
+                return
+            order['order_status'] = OrderStatus.SUBMITTED
+            order['updated_time'] = _now()
+            update = dict(order)
+        self._broadcast(TradeOrderHandlerBase, [update], ORDER_COLUMNS)
+
+        last = broker.market.last(order['code'])
+        buy = order['trd_side'] == TrdSide.BUY
+        marketable = order['order_type'] == OrderType.MARKET or (
+            order['order_type'] == OrderType.NORMAL and (order['price'] >= last if buy else order['price'] <= last))
+        if not marketable:
+            return
+
+        rng = random.Random(f"{SEED}:fill:{order_id}")
+        remaining = order['qty']
+        pieces = rng.randint(1, 3) if remaining >= 3 else 1
+        for i in range(pieces):
+            time.sleep(FILL_DELAY * rng.random())
+            with broker.lock:
+                if order['order_status'] not in (OrderStatus.SUBMITTED, OrderStatus.FILLED_PART):
+                    return
+                qty = remaining if i == pieces - 1 else max(1.0, float(int(remaining / (pieces - i))))
+                remaining -= qty
+                price = broker.market.last(order['code'])
+                if order['order_type'] == OrderType.NORMAL:
+                    price = min(price, order['price']) if buy else max(price, order['price'])
+                deal = account.fill(order, qty, price)
+                update = dict(order)
+            self._broadcast(TradeOrderHandlerBase, [update], ORDER_COLUMNS)
+            self._broadcast(TradeDealHandlerBase, [deal], DEAL_COLUMNS)
+
+    def modify_order(self, modify_order_op, order_id, qty, price, adjust_limit=0, trd_env=TrdEnv.REAL,
+                     acc_id=0, acc_index=0, aux_price=None, trail_type=None, trail_value=None, trail_spread=None):
+        err = self._request('modify_order', trd_env=trd_env, acc_id=acc_id, acc_index=acc_index)
+        if err:
+            return RET_ERROR, err
+        account, err = self._account(trd_env, acc_id)
+        if err:
+            return RET_ERROR, err
+        with self._broker.lock:
+            order = account.orders.get(str(order_id))
+            if order is None:
+                return RET_ERROR, f"Order {order_id} not found"
+            if order['order_status'] not in (OrderStatus.SUBMITTING, OrderStatus.SUBMITTED, OrderStatus.FILLED_PART):
+                return RET_ERROR, f"Order {order_id} cannot be modified in status {order['order_status']}"
+            if modify_order_op == ModifyOrderOp.CANCEL:
+                order['order_status'] = OrderStatus.CANCELLED_PART if order['dealt_qty'] else OrderStatus.CANCELLED_ALL
+            elif modify_order_op == ModifyOrderOp.NORMAL:
+                order['qty'] = float(qty) if qty else order['qty']
+                order['price'] = float(price) if price else order['price']
+                if aux_price is not None:
+                    order['aux_price'] = float(aux_price)
+            else:
+                return RET_ERROR, f"Unsupported modify operation {modify_order_op}"
+            order['updated_time'] = _now()
+            update = dict(order)
+        self._broadcast(TradeOrderHandlerBase, [update], ORDER_COLUMNS)
+        return RET_OK, pd.DataFrame([{'trd_env': trd_env, 'order_id': str(order_id)}])
+
+class FakeQuoteContext(_FakeContext):
+    """Offline OpenQuoteContext with subscription quota and a push thread."""
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self._subs = {}  # code -> {subtype: subscribed_at}
+        self._sub_lock = threading.Lock()
+        self._pusher = None
+
+    def _used(self):
+        return sum(len(types) for types in self._subs.values())
+
+    def subscribe(self, code_list, subtype_list, is_first_push=True, subscribe_push=True, **kwargs):
+        err = self._request('subscribe')
+        if err:
+            return RET_ERROR, err
+        now = time.monotonic()
+        with self._sub_lock:
+            new = sum(1 for c in code_list for t in subtype_list if t not in self._subs.get(c, {}))
+            if self._used() + new > SUB_QUOTA:
+                return RET_ERROR, f"Subscription quota exceeded: {self._used()} used of {SUB_QUOTA}"
+            for c in code_list:
+                for t in subtype_list:
+                    self._subs.setdefault(c, {}).setdefault(t, now)
+        if subscribe_push and self._pusher is None:
+            self._pusher = threading.Thread(target=self._push_loop, daemon=True)
+            self._pusher.start()
+        return RET_OK, None
+
+    def unsubscribe(self, code_list, subtype_list, unsubscribe_all=False):
+        err = self._request('unsubscribe')
+        if err:
+            return RET_ERROR, err
+        now = time.monotonic()
+        with self._sub_lock:
+            if unsubscribe_all:
+                code_list = list(self._subs)
+                subtype_list = None
+            for c in code_list:
+                for t, since in self._subs.get(c, {}).items():
+                    if (subtype_list is None or t in subtype_list) and now - since < MIN_SUBSCRIPTION_HOLD:
+                        return RET_ERROR, f"{c} must stay subscribed for at least one minute"
+            for c in code_list:
+                types = self._subs.get(c, {})
+                for t in list(types):
+                    if subtype_list is None or t in subtype_list:
+                        del types[t]
+                if not types:
+                    self._subs.pop(c, None)
+        return RET_OK, None
+
+    def query_subscription(self, is_all_conn=True):
+        err = self._request('query_subscription')
+        if err:
+            return RET_ERROR, err
+        with self._sub_lock:
+            used = self._used()
+            sub_list = {}
+            for c, types in self._subs.items():
+                for t in types:
+                    sub_list.setdefault(t, []).append(c)
+        return RET_OK, {'total_used': used, 'own_used': used, 'remain': SUB_QUOTA - used, 'sub_list': sub_list}
+
+    def _subscribed(self, code, subtype):
+        with self._sub_lock:
+            return subtype in self._subs.get(code, {})
+
+    def get_stock_quote(self, code_list):
+        err = self._request('get_stock_quote')
+        if err:
+            return RET_ERROR, err
+        missing = [c for c in code_list if not self._subscribed(c, SubType.QUOTE)]
+        if missing:
+            return RET_ERROR, f"Please subscribe to QUOTE first: {', '.join(missing)}"
+        return RET_OK, _frame([self._broker.market.quote(c) for c in code_list], QUOTE_COLUMNS)
+
+    def get_order_book(self, code, num=10, **kwargs):
+        err = self._request('get_order_book')
+        if err:
+            return RET_ERROR, err
+        if not self._subscribed(code, SubType.ORDER_BOOK):
+            return RET_ERROR, f"Please subscribe to ORDER_BOOK first: {code}"
+        return RET_OK, self._broker.market.book(code, num)
+
+    def get_market_snapshot(self, code_list):
+        err = self._request('get_market_snapshot')
+        if err:
+            return RET_ERROR, err
+        if len(code_list) > MAX_SNAPSHOT_CODES:
+            return RET_ERROR, f"At most {MAX_SNAPSHOT_CODES} codes per request"
+        return RET_OK, _frame([self._broker.market.snapshot(c) for c in code_list], SNAPSHOT_COLUMNS)
+
+    def request_trading_days(self, market=None, start=None, end=None, code=None):
+        err = self._request('request_trading_days')
+        if err:
+            return RET_ERROR, err
+        end = end or _today()
+        start = start or end
+        return RET_OK, [{'time': d, 'trade_date_type': 'WHOLE'} for d in _weekdays(start, end)]
+
+    def _push_loop(self):
+        """Pushes quote and order-book updates for subscribed codes at PUSH_HZ."""
+        interval = 1.0 / max(PUSH_HZ, 0.1)
+        while not self._closed:
+            time.sleep(interval)
+            with self._sub_lock:
+                quote_codes = [c for c, types in self._subs.items() if SubType.QUOTE in types]
+                book_codes = [c for c, types in self._subs.items() if SubType.ORDER_BOOK in types]
+            if quote_codes:
+                self._push(StockQuoteHandlerBase, _frame([self._broker.market.quote(c) for c in quote_codes],
+                                                         QUOTE_COLUMNS))
+            for c in book_codes:
+                self._push(OrderBookHandlerBase, self._broker.market.book(c))
+
+    def close(self):
+        super().close()
+        self._pusher = None
+
+def gateway_reachable():
+    """Whether the fake gateway would accept a connection right now."""
+    return not FakeBroker.get().down()
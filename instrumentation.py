@@ -0,0 +1,167 @@
+# Lightweight timing of SDK calls and client-side phases (connect, render).
+# Disabled by default: with profiling off, contexts hand back the SDK's bound
+# methods untouched and phase() is a bare context manager.
+import json
+import math
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+# Samples kept per metric for percentiles (counts and totals are exact).
+MAX_SAMPLES = 10000
+
+def _percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not ordered:
+        return 0.0
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
+
+def _union_length(intervals):
+    """Total time covered by possibly overlapping (start, end) intervals."""
+    total, cur_start, cur_end = 0.0, None, None
+    for start, end in sorted(intervals):
+        if cur_end is None or start > cur_end:
+            if cur_end is not None:
+                total += cur_end - cur_start
+            cur_start, cur_end = start, end
+        else:
+            cur_end = max(cur_end, end)
+    if cur_end is not None:
+        total += cur_end - cur_start
+    return total
+
+class Profiler:
+    """
+    Collects timings as (kind, name) metrics:
+      sdk    gateway round-trip of one SDK method (after any scheduler wait)
+      queue  time the call waited in the rate-limit scheduler
+      phase  client-side spans such as 'connect trade' or 'render'
+    Wall time is split into time with at least one SDK call outstanding
+    (gateway + queue) and the rest (client-side: imports aside, mostly
+    pandas and rich).
+    """
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self._metrics = {}
+        self._intervals = []
+        self._started = time.perf_counter()
+        self._stopped = None
+
+    def start(self):
+        with self._lock:
+            self._reset()
+        self.enabled = True
+
+    def stop(self):
+        self.enabled = False
+        self._stopped = time.perf_counter()
+
+    def record(self, kind, name, seconds):
+        with self._lock:
+            metric = self._metrics.get((kind, name))
+            if metric is None:
+                metric = self._metrics[(kind, name)] = {'count': 0, 'total': 0.0, 'max': 0.0,
+                                                        'samples': deque(maxlen=MAX_SAMPLES)}
+            metric['count'] += 1
+            metric['total'] += seconds
+            metric['max'] = max(metric['max'], seconds)
+            metric['samples'].append(seconds)
+
+    def record_call(self, name, start, sent, end):
+        """One SDK call: queued at `start`, sent at `sent`, answered at `end` (perf_counter)."""
+        if sent > start:
+            self.record('queue', name, sent - start)
+        self.record('sdk', name, end - sent)
+        with self._lock:
+            self._intervals.append((start, end))
+
+    def timed(self, name, fn):
+        """Wraps an unscheduled SDK method so each call is recorded."""
+        def call(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record_call(name, start, start, time.perf_counter())
+        return call
+
+    @contextmanager
+    def phase(self, name):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record('phase', name, time.perf_counter() - start)
+
+    def summary(self):
+        """Metrics in milliseconds plus the wall-time split, as a JSON-ready dict."""
+        end = self._stopped if self._stopped is not None and not self.enabled else time.perf_counter()
+        with self._lock:
+            metrics = []
+            for (kind, name), m in sorted(self._metrics.items(), key=lambda item: -item[1]['total']):
+                ordered = sorted(m['samples'])
+                metrics.append({'kind': kind, 'name': name, 'count': m['count'],
+                                'total_ms': m['total'] * 1000, 'mean_ms': m['total'] / m['count'] * 1000,
+                                'p50_ms': _percentile(ordered, 50) * 1000,
+                                'p99_ms': _percentile(ordered, 99) * 1000, 'max_ms': m['max'] * 1000})
+            waiting = _union_length(self._intervals)
+        wall = end - self._started
+        return {'wall_ms': wall * 1000, 'sdk_wall_ms': waiting * 1000,
+                'client_ms': max(0.0, wall - waiting) * 1000, 'metrics': metrics}
+
+    def dump_json(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+
+    def print_report(self, console):
+        from rich.table import Table
+        report = self.summary()
+        table = Table(title="Profile")
+        table.add_column("Kind", style="dim")
+        table.add_column("Name", style="cyan")
+        for column in ("Calls", "Total ms", "Mean ms", "p50 ms", "p99 ms", "Max ms"):
+            table.add_column(column, justify="right")
+        for m in report['metrics']:
+            table.add_row(m['kind'], m['name'], str(m['count']), f"{m['total_ms']:,.1f}", f"{m['mean_ms']:,.1f}",
+                          f"{m['p50_ms']:,.1f}", f"{m['p99_ms']:,.1f}", f"{m['max_ms']:,.1f}")
+        console.print(table)
+        console.print(f"Wall {report['wall_ms']:,.1f} ms = waiting on OpenD {report['sdk_wall_ms']:,.1f} ms "
+                      f"+ client-side {report['client_ms']:,.1f} ms")
+
+@contextmanager
+def profile_rendering(profiler):
+    """Times rich output (Console.print, Live refreshes) as the 'render' phase while active."""
+    from rich.console import Console
+    from rich.live import Live
+    originals = {(Console, 'print'): Console.print, (Live, 'refresh'): Live.refresh}
+    local = threading.local()
+
+    def timed(original):
+        def wrapper(*args, **kwargs):
+            # Live.refresh prints through the console: only time the outermost call.
+            if getattr(local, 'active', False):
+                return original(*args, **kwargs)
+            local.active = True
+            try:
+                with profiler.phase('render'):
+                    return original(*args, **kwargs)
+            finally:
+                local.active = False
+        return wrapper
+
+    for (cls, attr), original in originals.items():
+        setattr(cls, attr, timed(original))
+    try:
+        yield
+    finally:
+        for (cls, attr), original in originals.items():
+            setattr(cls, attr, original)
@@ -0,0 +1,434 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+import pandas as pd
+from moomoo import RET_OK
+from connection import ConnectionManager, CACHE_DIR, TRADING_ENV, parallel_map
+from trading_calendar import get_trading_days, market_today
+
+LEDGER_FILE = os.path.join(CACHE_DIR, "ledger.sqlite3")
+
+# OpenD rejects history queries spanning more than 90 days.
+HISTORY_WINDOW_DAYS = 90
+
+# order_fee_query accepts at most 400 order IDs per request.
+FEE_BATCH_SIZE = 400
+FEE_RETRIES = 3
+
+# Cash flows can post to a clearing day after it closes (settlement, corporate
+# actions), so a day is only cached for good once this many trading days have passed.
+CASH_FLOW_SETTLE_DAYS = 3
+
+# How far back the first (or a full) deal sync reaches when no start is given.
+SYNC_LOOKBACK_DAYS = 365
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS deals (
+    account TEXT NOT NULL,
+    deal_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (account, deal_id)
+);
+CREATE INDEX IF NOT EXISTS deals_by_day ON deals (account, day);
+-- The fields lot matching needs, as typed columns stored in time order, so
+-- reading the whole history is one sequential scan with no JSON decoding.
+-- (A deal's create_time never changes, so the key still identifies it.)
+CREATE TABLE IF NOT EXISTS deal_fills (
+    account TEXT NOT NULL,
+    create_time TEXT NOT NULL,
+    deal_id TEXT NOT NULL,
+    code TEXT NOT NULL,
+    trd_side TEXT NOT NULL,
+    qty REAL NOT NULL,
+    price REAL NOT NULL,
+    PRIMARY KEY (account, create_time, deal_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS cash_flows (
+    account TEXT NOT NULL,
+    day TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    PRIMARY KEY (account, day)
+);
+CREATE TABLE IF NOT EXISTS fees (
+    account TEXT NOT NULL,
+    order_id TEXT NOT NULL,
+    fee_amount REAL NOT NULL,
+    PRIMARY KEY (account, order_id)
+);
+CREATE TABLE IF NOT EXISTS watermarks (
+    account TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    last_time TEXT NOT NULL,
+    last_id TEXT NOT NULL,
+    PRIMARY KEY (account, kind)
+);
+CREATE TABLE IF NOT EXISTS closed_days (
+    account TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    day TEXT NOT NULL,
+    PRIMARY KEY (account, kind, day)
+);
+"""
+
+def _records(df):
+    """DataFrame -> list of JSON-safe dicts (numpy scalars and timestamps included)."""
+    if df is None or df.empty:
+        return []
+    return json.loads(df.to_json(orient='records', date_format='iso'))
+
+def _number(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+def _next_day(day):
+    return (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+
+class Ledger:
+    """
+    Local SQLite store for history that cannot change once a trading day has closed:
+    deals, per-day cash flows and order fees. Rows are keyed by account
+    (see ConnectionManager.account_key) so SIMULATE and REAL never mix.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, path=LEDGER_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def get(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _write(self, sql, rows):
+        with self._lock, self._conn:
+            self._conn.executemany(sql, rows)
+
+    # --- Closed-day bookkeeping ---
+    def closed_days(self, account, kind, days):
+        """Subset of `days` already fully cached for `kind` (e.g. 'deals')."""
+        if not days:
+            return set()
+        rows = self._query(
+            "SELECT day FROM closed_days WHERE account = ? AND kind = ? AND day BETWEEN ? AND ?",
+            (account, kind, min(days), max(days)))
+        return {r[0] for r in rows} & set(days)
+
+    def mark_closed(self, account, kind, days):
+        self._write("INSERT OR IGNORE INTO closed_days VALUES (?, ?, ?)",
+                    [(account, kind, d) for d in days])
+
+    def clear(self, account, kind):
+        """Drops every cached row of `kind` for the account (used by a full resync)."""
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM {kind} WHERE account = ?", (account,))
+            if kind == 'deals':
+                self._conn.execute("DELETE FROM deal_fills WHERE account = ?", (account,))
+            self._conn.execute("DELETE FROM closed_days WHERE account = ? AND kind = ?", (account, kind))
+            self._conn.execute("DELETE FROM watermarks WHERE account = ? AND kind = ?", (account, kind))
+
+    # --- Sync watermarks ---
+    def get_watermark(self, account, kind):
+        """Returns (last_time, last_id) of the newest synced row, or None."""
+        rows = self._query("SELECT last_time, last_id FROM watermarks WHERE account = ? AND kind = ?",
+                           (account, kind))
+        return rows[0] if rows else None
+
+    def set_watermark(self, account, kind, last_time, last_id):
+        self._write("INSERT OR REPLACE INTO watermarks VALUES (?, ?, ?, ?)",
+                    [(account, kind, last_time, str(last_id))])
+
+    # --- Deals ---
+    def put_deals(self, account, df):
+        records = _records(df)
+        rows = [(account, str(r.get('deal_id')), str(r.get('create_time', ''))[:10], json.dumps(r))
+                for r in records]
+        fills = [(account, str(r.get('create_time', '')), str(r.get('deal_id')), str(r.get('code')),
+                  str(r.get('trd_side')), _number(r.get('qty')), _number(r.get('price')))
+                 for r in records]
+        with self._lock, self._conn:
+            self._conn.executemany("INSERT OR REPLACE INTO deals VALUES (?, ?, ?, ?)", rows)
+            self._conn.executemany("INSERT OR REPLACE INTO deal_fills VALUES (?, ?, ?, ?, ?, ?, ?)", fills)
+
+    def count_deals(self, account):
+        return self._query("SELECT COUNT(*) FROM deals WHERE account = ?", (account,))[0][0]
+
+    def get_deals(self, account, start, end):
+        rows = self._query(
+            "SELECT payload FROM deals WHERE account = ? AND day BETWEEN ? AND ?",
+            (account, start, end))
+        return pd.DataFrame([json.loads(r[0]) for r in rows])
+
+    def get_fills(self, account, end):
+        """
+        Every fill up to and including day `end` as a DataFrame (code, trd_side,
+        qty, price, create_time), oldest first. Ledgers written before
+        deal_fills existed are backfilled from the payloads once.
+        """
+        with self._lock, self._conn:
+            missing = self._conn.execute(
+                "SELECT (SELECT COUNT(*) FROM deals WHERE account = ?) - "
+                "(SELECT COUNT(*) FROM deal_fills WHERE account = ?)", (account, account)).fetchone()[0]
+            if missing:
+                self._conn.execute(
+                    "INSERT OR IGNORE INTO deal_fills SELECT account, "
+                    "IFNULL(json_extract(payload, '$.create_time'), ''), deal_id, "
+                    "json_extract(payload, '$.code'), json_extract(payload, '$.trd_side'), "
+                    "IFNULL(json_extract(payload, '$.qty'), 0), IFNULL(json_extract(payload, '$.price'), 0) "
+                    "FROM deals WHERE account = ?", (account,))
+        rows = self._query(
+            "SELECT code, trd_side, qty, price, create_time FROM deal_fills "
+            "WHERE account = ? AND create_time < ? ORDER BY create_time, deal_id",
+            (account, _next_day(end)))
+        return pd.DataFrame(rows, columns=['code', 'trd_side', 'qty', 'price', 'create_time'])
+
+    # --- Cash flows (stored per clearing day) ---
+    def put_cash_flow(self, account, day, df):
+        self._write("INSERT OR REPLACE INTO cash_flows VALUES (?, ?, ?)",
+                    [(account, day, json.dumps(_records(df)))])
+
+    def drop_cash_flows(self, account, since):
+        """Forgets cached cash flows from day `since` on (days that may still change)."""
+        self._write("DELETE FROM cash_flows WHERE account = ? AND day >= ?", [(account, since)])
+
+    def get_cash_flows(self, account, days):
+        """Returns {day: DataFrame} for the days present in the ledger."""
+        if not days:
+            return {}
+        rows = self._query(
+            "SELECT day, payload FROM cash_flows WHERE account = ? AND day BETWEEN ? AND ?",
+            (account, min(days), max(days)))
+        wanted = set(days)
+        return {d: pd.DataFrame(json.loads(p)) for d, p in rows if d in wanted}
+
+    # --- Fees (final once every fill of the order is on a closed day) ---
+    def put_fees(self, account, fees):
+        self._write("INSERT OR REPLACE INTO fees VALUES (?, ?, ?)",
+                    [(account, str(oid), amt) for oid, amt in fees.items()])
+
+    def get_fees(self, account, order_ids):
+        wanted = {str(oid): oid for oid in order_ids}
+        if not wanted:
+            return {}
+        rows = self._query("SELECT order_id, fee_amount FROM fees WHERE account = ?", (account,))
+        return {wanted[oid]: amt for oid, amt in rows if oid in wanted}
+
+# --- Ledger-backed fetchers: closed days come from disk, everything else from OpenD ---
+
+def _history_windows(start, end):
+    """Splits [start, end] into consecutive windows OpenD accepts for history queries."""
+    s = datetime.strptime(start, "%Y-%m-%d")
+    e = datetime.strptime(end, "%Y-%m-%d")
+    windows = []
+    while s <= e:
+        w_end = min(s + timedelta(days=HISTORY_WINDOW_DAYS - 1), e)
+        windows.append((s.strftime("%Y-%m-%d"), w_end.strftime("%Y-%m-%d")))
+        s = w_end + timedelta(days=1)
+    return windows
+
+def query_deal_history(ctx, start, end):
+    """history_deal_list_query over an arbitrary range, split into API-sized windows."""
+    def fetch(window):
+        return ctx.history_deal_list_query(start=window[0], end=window[1], trd_env=TRADING_ENV)
+
+    results = parallel_map(fetch, _history_windows(start, end))
+    frames = []
+    for ret, data in results:
+        if ret != RET_OK:
+            return ret, data
+        if not data.empty:
+            frames.append(data)
+    return RET_OK, pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def fetch_deals(ctx, start, end):
+    """
+    Deals executed between start and end (inclusive, 'YYYY-MM-DD').
+    Only the span of trading days not yet cached as closed is requested from OpenD.
+    """
+    days = get_trading_days(start, end)
+    if not days:
+        return RET_OK, pd.DataFrame()
+
+    ledger = Ledger.get()
+    account = ConnectionManager.account_key()
+    cached = ledger.closed_days(account, 'deals', days)
+    missing = [d for d in days if d not in cached]
+
+    if missing:
+        ret, data = query_deal_history(ctx, missing[0], missing[-1])
+        if ret != RET_OK:
+            return ret, data
+        ledger.put_deals(account, data)
+        today = market_today()
+        ledger.mark_closed(account, 'deals', [d for d in missing if d < today])
+
+    return RET_OK, ledger.get_deals(account, days[0], days[-1])
+
+def _settled_before(today):
+    """First day whose cash flows may still change: CASH_FLOW_SETTLE_DAYS trading days before today."""
+    start = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=CASH_FLOW_SETTLE_DAYS * 2 + 10)).strftime("%Y-%m-%d")
+    recent = [d for d in get_trading_days(start, today) if d < today]
+    return recent[-CASH_FLOW_SETTLE_DAYS] if len(recent) >= CASH_FLOW_SETTLE_DAYS else start
+
+def fetch_cash_flows(ctx, days):
+    """
+    {clearing day: cash-flow DataFrame} for `days`, in date order. Settled days
+    (CASH_FLOW_SETTLE_DAYS trading days back) are served from the ledger; the
+    rest are fetched concurrently. Days whose query failed are missing from
+    the result.
+    """
+    ledger = Ledger.get()
+    account = ConnectionManager.account_key()
+    settled = _settled_before(market_today())
+    # Recent days cached by older versions may predate late postings: fetch them again.
+    ledger.drop_cash_flows(account, settled)
+    flows = ledger.get_cash_flows(account, days)
+    missing = [d for d in days if d not in flows]
+
+    def fetch(d):
+        return ctx.get_acc_cash_flow(clearing_date=d, trd_env=TRADING_ENV)
+
+    results = parallel_map(fetch, missing)
+    for d, (ret, data) in zip(missing, results):
+        if ret != RET_OK:
+            continue
+        flows[d] = data
+        if d < settled:
+            ledger.put_cash_flow(account, d, data)
+
+    return {d: flows[d] for d in days if d in flows}
+
+# In-process memo of final fees fetched this session, keyed by (account, order_id):
+# the shell and daemon switch accounts. Orders that may still fill are not memoized,
+# or a long-lived process would keep serving their first, partial fee.
+_fee_memo = {}
+
+def _query_fee_batch(ctx, batch):
+    """order_fee_query for one batch, retried with backoff. Returns {order_id: fee} or None."""
+    for attempt in range(FEE_RETRIES):
+        ret, data = ctx.order_fee_query(order_id_list=batch, trd_env=TRADING_ENV)
+        if ret == RET_OK:
+            if data.empty:
+                return {}
+            amounts = pd.to_numeric(data['fee_amount'], errors='coerce').fillna(0.0)
+            return amounts.groupby(data['order_id']).sum().to_dict()
+        if attempt < FEE_RETRIES - 1:
+            time.sleep(2 ** attempt)
+    return None
+
+def fetch_order_fees(ctx, order_ids, final_ids=()):
+    """
+    Total fee per order_id. Fees are memoized per order (session memo, then the
+    ledger); the rest are fetched in API-sized batches concurrently (throttled by the scheduler). A batch that
+    still fails after retries is left out of the result, so callers should report
+    the order_ids missing from it.
+    Only orders listed in `final_ids` (all fills on closed days) are memoized
+    and persisted; the others are fetched again on every call.
+    """
+    ledger = Ledger.get()
+    account = ConnectionManager.account_key()
+    fees = {oid: _fee_memo[(account, oid)] for oid in order_ids if (account, oid) in _fee_memo}
+    fees.update(ledger.get_fees(account, [oid for oid in order_ids if oid not in fees]))
+    missing = [oid for oid in order_ids if oid not in fees]
+    if not missing:
+        return fees
+
+    batches = [missing[i:i + FEE_BATCH_SIZE] for i in range(0, len(missing), FEE_BATCH_SIZE)]
+    fetched = {}
+    for result in parallel_map(lambda batch: _query_fee_batch(ctx, batch), batches):
+        if result:
+            fetched.update(result)
+
+    fees.update(fetched)
+    final = set(final_ids)
+    final_fees = {oid: amt for oid, amt in fetched.items() if oid in final}
+    _fee_memo.update(((account, oid), amt) for oid, amt in final_fees.items())
+    ledger.put_fees(account, final_fees)
+    return fees
+
+def sync_deals(ctx, full_resync=False, since=None):
+    """
+    Brings the ledger's deal history up to date for the current account.
+    Normally only the delta since the stored watermark is requested (from the
+    watermark's day, so later fills on that day are picked up; duplicates are
+    collapsed by deal_id). A `since` before the synced history is backfilled
+    first. `full_resync` drops the cached history and re-downloads it from
+    `since` (default: SYNC_LOOKBACK_DAYS ago).
+    Returns (ret, number of new deals) or (ret, error message).
+    """
+    ledger = Ledger.get()
+    account = ConnectionManager.account_key()
+    today = market_today()
+
+    if full_resync:
+        ledger.clear(account, 'deals')
+
+    before = ledger.count_deals(account)
+    watermark = ledger.get_watermark(account, 'deals')
+    if watermark:
+        start = watermark[0][:10]
+        if since and since < start:
+            # Trading days between `since` and the watermark that were never fetched.
+            days = [d for d in get_trading_days(since, start) if d < start]
+            cached = ledger.closed_days(account, 'deals', days)
+            missing = [d for d in days if d not in cached]
+            if missing:
+                ret, data = query_deal_history(ctx, missing[0], missing[-1])
+                if ret != RET_OK:
+                    return ret, data
+                ledger.put_deals(account, data)
+                ledger.mark_closed(account, 'deals', missing)
+    elif since:
+        start = since
+    else:
+        start = (datetime.strptime(today, "%Y-%m-%d") - timedelta(days=SYNC_LOOKBACK_DAYS)).strftime("%Y-%m-%d")
+
+    ret, data = query_deal_history(ctx, start, today)
+    if ret != RET_OK:
+        return ret, data
+
+    ledger.put_deals(account, data)
+    ledger.mark_closed(account, 'deals', [d for d in get_trading_days(start, today) if d < today])
+
+    if not data.empty:
+        newest = data.sort_values(by=['create_time', 'deal_id']).iloc[-1]
+        if watermark is None or str(newest['create_time']) >= watermark[0]:
+            ledger.set_watermark(account, 'deals', str(newest['create_time']), newest['deal_id'])
+
+    return RET_OK, ledger.count_deals(account) - before
+
+def read_deals(start, end):
+    """Deals between start and end from the ledger only (no network)."""
+    return Ledger.get().get_deals(ConnectionManager.account_key(), start, end)
+
+def local_account_key():
+    """
+    Account key of the most recently synced deal history in TRADING_ENV, or
+    None. Lets offline commands find their data without asking OpenD.
+    """
+    rows = Ledger.get()._query(
+        "SELECT account FROM watermarks WHERE kind = 'deals' AND account LIKE ? ORDER BY last_time DESC LIMIT 1",
+        (f"%:{TRADING_ENV}",))
+    return rows[0][0] if rows else None
+
+def read_fills(end, account=None):
+    """
+    Every fill up to day `end` from the ledger only, for lot matching (see
+    Ledger.get_fills). `account` defaults to the trade context's account.
+    """
+    return Ledger.get().get_fills(account or ConnectionManager.account_key(), end)
@@ -0,0 +1,241 @@
+# Lot matching over deal history: which fills closed which, realized P&L per
+# matched lot, holding periods, and the lots still open. Works on a plain deals
+# DataFrame (code, trd_side, qty, price, create_time), e.g. from the local
+# ledger, so it needs no gateway.
+#
+# Fills are split into legs that open or close a lot in one "book" (a symbol's
+# long or short side). FIFO and average cost are vectorized over every book at
+# once; LIFO walks each book with a stack.
+import numpy as np
+import pandas as pd
+
+METHODS = ('fifo', 'lifo', 'average')
+
+# Signed direction of each trade side: buys add to a position, sells reduce it.
+SIDE_SIGNS = {'BUY': 1.0, 'BUY_BACK': 1.0, 'SELL': -1.0, 'SELL_SHORT': -1.0}
+
+MATCH_COLUMNS = ['code', 'direction', 'open_time', 'close_time', 'qty', 'open_price', 'close_price',
+                 'realized_pl', 'holding_days']
+OPEN_LOT_COLUMNS = ['code', 'direction', 'open_time', 'qty', 'open_price']
+
+# Cumulative quantities are compared after rounding, so summation order can't
+# create phantom slivers of a share.
+QTY_DECIMALS = 6
+_QTY_EPSILON = 10.0 ** -QTY_DECIMALS
+
+# The average-cost scan restarts its running product before it can underflow.
+_LOG_FLOOR = 600.0
+
+def _segment_cumsum(values, first):
+    """Cumulative sum restarting wherever `first` is True (rows grouped contiguously)."""
+    # Summed per segment, not as a global cumsum minus offsets: segments can
+    # differ by hundreds of orders of magnitude (see _average).
+    return pd.Series(values).groupby(np.cumsum(first)).cumsum().to_numpy()
+
+def _firsts(keys):
+    return np.r_[True, keys[1:] != keys[:-1]] if len(keys) else np.zeros(0, dtype=bool)
+
+def _legs(deals):
+    """
+    Fills as lot legs, grouped by book and in fill order within each book. A
+    fill that takes a position through zero becomes a closing leg plus an
+    opening leg. Returns (dict of arrays: code, book, time, price, qty,
+    direction (+1 long lot, -1 short lot), is_open; array of code names).
+    """
+    sign = deals['trd_side'].astype(str).map(SIDE_SIGNS).to_numpy(dtype=float)
+    valid = ~np.isnan(sign)
+    code, codes = pd.factorize(deals['code'].to_numpy()[valid])
+    time = pd.to_datetime(deals['create_time'].astype(str)[valid], format='ISO8601', errors='coerce').to_numpy()
+    qty = pd.to_numeric(deals['qty'][valid], errors='coerce').fillna(0.0).to_numpy()
+    price = pd.to_numeric(deals['price'][valid], errors='coerce').fillna(0.0).to_numpy()
+
+    # lexsort is stable: fills with the same timestamp keep their input order.
+    order = np.lexsort((time.view('i8'), code))
+    code, time, qty, price, sign = code[order], time[order], qty[order], price[order], sign[order]
+    signed = qty * sign
+    before = _segment_cumsum(signed, _firsts(code)) - signed
+    closing = np.where(before * signed < 0, np.minimum(np.abs(signed), np.abs(before)), 0.0)
+
+    # Each fill's closing leg goes just before its opening leg.
+    legs = {
+        'code': np.repeat(code, 2),
+        'time': np.repeat(time, 2),
+        'price': np.repeat(price, 2),
+        'qty': np.column_stack([closing, np.abs(signed) - closing]).ravel(),
+        'direction': np.column_stack([np.sign(before), sign]).ravel().astype(int),
+        'is_open': np.tile([False, True], len(code)),
+    }
+    keep = legs['qty'] > 0
+    legs = {k: v[keep] for k, v in legs.items()}
+    legs['book'] = legs['code'] * 2 + (legs['direction'] > 0)
+    by_book = np.argsort(legs['book'], kind='stable')
+    return {k: v[by_book] for k, v in legs.items()}, codes
+
+def _matches(codes, code, direction, open_time, close_time, qty, open_price, close_price):
+    return pd.DataFrame({'code': codes[code], 'direction': direction,
+                         'open_time': open_time, 'close_time': close_time,
+                         'qty': qty, 'open_price': open_price, 'close_price': close_price,
+                         'realized_pl': qty * (close_price - open_price) * direction,
+                         'holding_days': (close_time - open_time) / np.timedelta64(1, 'D')},
+                        columns=MATCH_COLUMNS)
+
+def _open_lots(codes, code, direction, open_time, qty, open_price):
+    return pd.DataFrame({'code': codes[code], 'direction': direction, 'open_time': open_time,
+                         'qty': qty, 'open_price': open_price}, columns=OPEN_LOT_COLUMNS)
+
+def _fifo(legs, codes):
+    """
+    Lays every book's opens end to end on one cumulative quantity axis, and its
+    closes on the same axis from the book's start. FIFO fills are then the
+    intersections of open and close intervals, found with searchsorted.
+    """
+    o = {k: v[legs['is_open']] for k, v in legs.items()}
+    c = {k: v[~legs['is_open']] for k, v in legs.items()}
+    if not len(c['qty']):
+        # Nothing closed yet (e.g. a buy-only account): every opening leg is still held.
+        matches = _matches(codes, c['code'], c['direction'], c['time'], c['time'], c['qty'], c['price'], c['price'])
+        return matches, _open_lots(codes, o['code'], o['direction'], o['time'], o['qty'], o['price'])
+
+    o_end = np.round(np.cumsum(o['qty']), QTY_DECIMALS)
+    o_start = np.round(o_end - o['qty'], QTY_DECIMALS)
+    # A book's closes start where its first open does (a close always follows an open).
+    book_start = o_start[np.searchsorted(o['book'], c['book'], side='left')]
+    c_end = np.round(book_start + _segment_cumsum(c['qty'], _firsts(c['book'])), QTY_DECIMALS)
+    c_start = np.round(c_end - c['qty'], QTY_DECIMALS)
+
+    # Elementary segments between every interval boundary; keep those inside a close.
+    points = np.unique(np.concatenate([o_start, o_end, c_start, c_end]))
+    seg_start, seg_end = points[:-1], points[1:]
+    j = np.searchsorted(c_start, seg_start, side='right') - 1
+    inside = (j >= 0) & (seg_start < c_end[np.maximum(j, 0)])
+    seg_start, seg_end, j = seg_start[inside], seg_end[inside], j[inside]
+    k = np.searchsorted(o_start, seg_start, side='right') - 1
+    matches = _matches(codes, c['code'][j], c['direction'][j], o['time'][k], c['time'][j],
+                       seg_end - seg_start, o['price'][k], c['price'][j])
+
+    # Whatever of an open lot lies beyond its book's last close is still held.
+    last_close = np.searchsorted(c['book'], o['book'], side='right') - 1
+    has_close = (last_close >= 0) & (c['book'][np.maximum(last_close, 0)] == o['book'])
+    consumed = np.where(has_close, c_end[np.maximum(last_close, 0)], -np.inf)
+    remaining = np.clip(o_end - np.maximum(o_start, consumed), 0.0, None)
+    held = remaining > _QTY_EPSILON
+    open_lots = _open_lots(codes, o['code'][held], o['direction'][held], o['time'][held],
+                           remaining[held], o['price'][held])
+    return matches, open_lots
+
+def _lifo(legs, codes):
+    """Per book, each close consumes the most recent open lots first."""
+    rows, open_rows = [], []
+    quantities, opening = legs['qty'].tolist(), legs['is_open'].tolist()
+    starts = np.flatnonzero(_firsts(legs['book'])).tolist()
+    for begin, end in zip(starts, starts[1:] + [len(quantities)]):
+        stack = []  # [leg index, remaining qty]
+        for i in range(begin, end):
+            qty = quantities[i]
+            if opening[i]:
+                stack.append([i, qty])
+                continue
+            while qty > _QTY_EPSILON and stack:
+                lot = stack[-1]
+                take = min(qty, lot[1])
+                rows.append((lot[0], i, take))
+                lot[1] -= take
+                qty -= take
+                if lot[1] <= _QTY_EPSILON:
+                    stack.pop()
+        open_rows.extend(stack)
+
+    k, j, qty = (np.array(col) for col in zip(*rows)) if rows else (np.zeros(0, dtype=int),) * 3
+    k, j = k.astype(int), j.astype(int)
+    matches = _matches(codes, legs['code'][j], legs['direction'][j], legs['time'][k], legs['time'][j],
+                       qty.astype(float), legs['price'][k], legs['price'][j])
+    i, remaining = (np.array(col) for col in zip(*open_rows)) if open_rows else (np.zeros(0, dtype=int),) * 2
+    i = i.astype(int)
+    open_lots = _open_lots(codes, legs['code'][i], legs['direction'][i], legs['time'][i],
+                           remaining.astype(float), legs['price'][i])
+    return matches, open_lots
+
+def _average(legs, codes):
+    """
+    Average cost: closes realize against the book's running average, opens
+    re-average it. The average obeys avg_i = a_i * avg_(i-1) + b_i, with
+    a = held_before / held_after and b = price * qty / held_after for opens, and
+    a = 1, b = 0 for closes. That recurrence is solved with cumulative products:
+    avg_i = P_i * (carry + sum_(k<=i) b_k / P_k).
+    Each run of the book away from flat (an episode) starts fresh. Products are
+    restarted in blocks before they can underflow, and the few blocks that
+    continue an episode get the previous block's average carried in.
+    """
+    qty, price, is_open = legs['qty'], legs['price'], legs['is_open']
+    new_book = _firsts(legs['book'])
+    change = np.where(is_open, qty, -qty)
+    held_after = np.round(_segment_cumsum(change, new_book), QTY_DECIMALS)
+    held_before = np.round(held_after - change, QTY_DECIMALS)
+    episode_start = new_book | (held_before <= 0)
+
+    held = np.where(held_after > 0, held_after, 1.0)
+    a = np.where(is_open, held_before / held, 1.0)
+    b = np.where(is_open, price * qty / held, 0.0)
+    log_a = np.zeros(len(qty))
+    log_a[~episode_start] = np.log(a[~episode_start])
+    log_p = _segment_cumsum(log_a, episode_start)
+
+    level = np.floor(-log_p / _LOG_FLOOR)
+    block_first = episode_start | np.r_[False, level[1:] != level[:-1]]
+    block = np.cumsum(block_first) - 1
+    # P relative to the row before the block (an episode's first a is 0 and left out).
+    scale = np.exp(log_p - (log_p - log_a)[np.flatnonzero(block_first)][block])
+    avg = scale * _segment_cumsum(b / scale, block_first)
+    for start in np.flatnonzero(block_first & ~episode_start):
+        members = block == block[start]
+        avg[members] += scale[members] * avg[start - 1]
+
+    closing = ~is_open
+    avg_before = np.r_[0.0, avg[:-1]][closing]
+    no_time = np.full(closing.sum(), np.datetime64('NaT'), dtype=legs['time'].dtype)
+    matches = _matches(codes, legs['code'][closing], legs['direction'][closing], no_time, legs['time'][closing],
+                       qty[closing], avg_before, price[closing])
+
+    last = np.r_[new_book[1:], True] & (held_after > _QTY_EPSILON)
+    open_lots = _open_lots(codes, legs['code'][last], legs['direction'][last],
+                           np.full(last.sum(), np.datetime64('NaT'), dtype=legs['time'].dtype),
+                           held_after[last], avg[last])
+    return matches, open_lots
+
+def missing_opens(deals):
+    """
+    Symbols where a SELL or BUY_BACK takes the position past zero. Those sides
+    only close lots (shorts open with SELL_SHORT), so the opening fills predate
+    `deals` and the symbol's matches and open lots are incomplete.
+    """
+    if deals is None or deals.empty:
+        return []
+    side = deals['trd_side'].astype(str)
+    sign = side.map(SIDE_SIGNS)
+    valid = sign.notna()
+    fills = pd.DataFrame({
+        'code': deals['code'][valid].to_numpy(),
+        'time': pd.to_datetime(deals['create_time'][valid].astype(str), format='ISO8601', errors='coerce').to_numpy(),
+        'signed': pd.to_numeric(deals['qty'][valid], errors='coerce').fillna(0.0).to_numpy() * sign[valid].to_numpy(),
+        'closing': side[valid].isin(['SELL', 'BUY_BACK']).to_numpy(),
+    }).sort_values(['code', 'time'], kind='stable')
+    held = np.round(fills.groupby('code')['signed'].cumsum(), QTY_DECIMALS)
+    # A closing fill must leave the position on the side it started from (or flat).
+    overshoot = fills['closing'] & (held * np.sign(fills['signed']) > _QTY_EPSILON)
+    return sorted(fills.loc[overshoot, 'code'].unique())
+
+def match_lots(deals, method='fifo'):
+    """
+    Matches opening and closing fills. Returns (matches, open_lots):
+      matches    one row per matched quantity: code, direction (1 long, -1 short),
+                 open/close time and price, qty, realized_pl, holding_days
+                 (average cost pools lots, so it has no open time or holding period)
+      open_lots  lots still held after the last deal, at their cost
+    Realized P&L is before fees.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Unknown lot method {method!r}; expected one of {', '.join(METHODS)}")
+    if deals is None or deals.empty:
+        return pd.DataFrame(columns=MATCH_COLUMNS), pd.DataFrame(columns=OPEN_LOT_COLUMNS)
+    legs, codes = _legs(deals)
+    return {'fifo': _fifo, 'lifo': _lifo, 'average': _average}[method](legs, np.asarray(codes, dtype=object))
@@ -1,13 +1,70 @@
+import sys
+from daemon import forward_to_daemon
+
+# Hand the command to a running session daemon before loading the SDK.
+if __name__ == '__main__':
+    _exit_code = forward_to_daemon(sys.argv[1:])
+    if _exit_code is not None:
+        sys.exit(_exit_code)
+
+import contextlib
 import click
-from portfolio import get_account_summary, get_deals, get_statement, get_positions
-from market_data import get_stock_quote
-from trading import place_trade, get_orders, cancel_order 
-from connection import ConnectionManager
+
+# Command modules (and with them moomoo, pandas and rich) are imported inside
+# each command, so --help and simple commands only load what they use.
+# bench_startup.py tracks the resulting cold-start times.
+
+# Rows rendered per table unless --limit says otherwise (0 shows everything):
+# rich lays out every row it is given, so huge histories are paged by default.
+DEFAULT_ROW_LIMIT = 500
+OUTPUT_FORMATS = ('table', 'json', 'jsonl', 'csv', 'parquet')
+
+def paging_options(f):
+    """--limit/--page for commands that print potentially large tables."""
+    f = click.option("--page", default=1, show_default=True, help="Page to show when --limit is set.")(f)
+    f = click.option("--limit", default=DEFAULT_ROW_LIMIT, show_default=True,
+                     help="Show at most this many rows per table (0 for all).")(f)
+    return f
 
 @click.group()
-def cli():
+@click.option("--format", "output_format", type=click.Choice(OUTPUT_FORMATS), default="table",
+              help="Write orders/positions/deals/statement results as data instead of a table.")
+@click.option("--output", "-o", default=None, type=click.Path(dir_okay=False),
+              help="File for --format output (default: stdout).")
+@click.option("--profile", is_flag=True, help="Time SDK calls and phases; print a summary at exit (to stderr).")
+@click.option("--profile-json", default=None, type=click.Path(dir_okay=False),
+              help="Also write the profile as JSON to this file (implies --profile).")
+@click.pass_context
+def cli(ctx, output_format, output, profile, profile_json):
     """Moomoo CLI Trader - A terminal-based trading tool."""
-    pass
+    if profile or profile_json:
+        _start_profile(ctx, profile_json)
+    if output_format == "table":
+        return
+    from render import set_output
+    # Data goes to the real stdout; status messages are moved to stderr.
+    set_output(output_format, output, stream=sys.stdout)
+    # The shell and daemon run many commands in one process: reset afterwards.
+    ctx.call_on_close(set_output)
+    ctx.with_resource(contextlib.redirect_stdout(sys.stderr))
+
+def _start_profile(ctx, json_path):
+    """Profiles this command; the report is printed (and dumped) when it finishes."""
+    from rich.console import Console
+    from connection import ConnectionManager
+    from instrumentation import profile_rendering
+    profiler = ConnectionManager.profiler
+
+    def report():
+        profiler.stop()
+        profiler.print_report(Console(stderr=True))
+        if json_path:
+            profiler.dump_json(json_path)
+
+    profiler.start()
+    # Close runs these in reverse: rendering is unhooked before the report prints.
+    ctx.call_on_close(report)
+    ctx.with_resource(profile_rendering(profiler))
 
 @cli.group()
 def portfolio():
@@ -16,30 +73,61 @@ def portfolio():
 
 @portfolio.command("summary")
 @click.option("--currency", default="USD", type=click.Choice(["USD", "HKD", "CNH"]), help="Currency to display (USD, HKD, CNH).")
-def summary_cmd(currency):
+@click.option("--all", "all_accounts", is_flag=True,
+              help="Every account in USD, HKD and CNH, fetched concurrently into one table.")
+def summary_cmd(currency, all_accounts):
     """
     Display current assets, cash, and market value.
     Example: python main.py portfolio summary --currency HKD
     """
+    if all_accounts:
+        from portfolio import get_all_summaries
+        get_all_summaries()
+        return
+    from portfolio import get_account_summary
     get_account_summary(currency)
 
 @portfolio.command("positions")
-def positions_cmd():
+@paging_options
+def positions_cmd(limit, page):
     """List current stock holdings."""
-    get_positions()
+    from portfolio import get_positions
+    get_positions(limit=limit, page=page)
 
 @portfolio.command("deals")
 @click.option("--days", default=0, help="Number of past days to fetch.")
 @click.option("--start", default=None, help="Start date (YYYY-MM-DD)")
 @click.option("--end", default=None, help="End date (YYYY-MM-DD)")
-def deals_cmd(days, start, end):
+@click.option("--sync", is_flag=True, help="Incrementally sync deal history into the local ledger first.")
+@click.option("--full-resync", is_flag=True, help="Discard the local deal history and download it again.")
+@paging_options
+def deals_cmd(days, start, end, sync, full_resync, limit, page):
     """List executed trades (Deals). Defaults to Today."""
-    get_deals(days=days, start_date=start, end_date=end)
+    from portfolio import get_deals
+    get_deals(days=days, start_date=start, end_date=end, sync=sync, full_resync=full_resync,
+              limit=limit, page=page)
+
+@portfolio.command("pnl")
+@click.option("--from", "start", default=None, help="First close date (YYYY-MM-DD). Default: January 1 of --to's year.")
+@click.option("--to", "end", default=None, help="Last close date (YYYY-MM-DD). Default: today.")
+@click.option("--method", default="fifo", show_default=True, type=click.Choice(["fifo", "lifo", "average"]),
+              help="How closing fills are matched to open lots.")
+@click.option("--offline", is_flag=True, help="Only use the local ledger: no sync, no live prices.")
+@click.option("--lots", "show_lots", is_flag=True, help="List every matched lot instead of per-symbol totals.")
+@paging_options
+def pnl_cmd(start, end, method, offline, show_lots, limit, page):
+    """
+    Realized and unrealized P&L from locally matched lots.
+    Example: python main.py portfolio pnl --from 2025-01-01 --to 2025-06-30 --method lifo
+    """
+    from portfolio import get_pnl
+    get_pnl(start=start, end=end, method=method, offline=offline, show_lots=show_lots, limit=limit, page=page)
 
 # --- STATEMENT COMMAND ---
 @cli.command("statement")
 @click.argument("date_str", required=False)
-def statement_cmd(date_str):
+@paging_options
+def statement_cmd(date_str, limit, page):
     """
     Get statement (Trades & Cash Flow).
     
@@ -48,33 +136,144 @@ def statement_cmd(date_str):
       - 'YYMMDD-YYMMDD' (e.g. 251216-251217) for a range (inclusive).
       - Default: Today if omitted.
     """
-    get_statement(date_str)
+    from portfolio import get_statement
+    get_statement(date_str, limit=limit, page=page)
 
 @cli.command("quote")
-@click.argument("ticker")
-def quote_cmd(ticker):
-    """Get real-time quote."""
-    get_stock_quote(ticker)
+@click.argument("tickers", nargs=-1)
+@click.option("--watchlist", type=click.Path(exists=True, dir_okay=False), help="File with tickers (one per line).")
+@click.option("--watch", is_flag=True, help="Stream live updates with order-book analytics (Ctrl+C to exit).")
+@click.option("--fps", type=float, default=4.0, show_default=True, help="Max screen refreshes per second in --watch mode.")
+def quote_cmd(tickers, watchlist, watch, fps):
+    """
+    Get real-time quote.
+
+    One ticker shows the quote with its Level-2 order book; several tickers
+    (or --watchlist) are fetched in batched snapshots and shown as one table.
+    Example: python main.py quote AAPL MSFT NVDA
+    Live:    python main.py quote AAPL --watch --fps 2
+    """
+    from market_data import get_stock_quote, get_batch_quotes, load_watchlist, watch_quotes
+    tickers = list(tickers) + (load_watchlist(watchlist) if watchlist else [])
+    if not tickers:
+        raise click.UsageError("Provide at least one TICKER or --watchlist.")
+    if watch:
+        watch_quotes(tickers, fps=fps)
+    elif len(tickers) == 1 and not watchlist:
+        get_stock_quote(tickers[0])
+    else:
+        get_batch_quotes(tickers)
+
+@cli.command("blotter")
+@click.option("--fps", type=float, default=2.0, show_default=True, help="Max screen refreshes per second.")
+def blotter_cmd(fps):
+    """Live order and position blotter driven by trade pushes (Ctrl+C to exit)."""
+    from blotter import run_blotter
+    run_blotter(fps=fps)
+
+@cli.command("subscriptions")
+def subscriptions_cmd():
+    """Show quote subscription quota usage (most useful in the daemon or shell)."""
+    from market_data import show_subscriptions
+    show_subscriptions()
 
 @cli.command("unlock")
 @click.argument("password")
 def unlock_cmd(password):
     """Unlock trading with 6-digit PIN."""
+    from connection import ConnectionManager
     ConnectionManager.unlock(password)
 
 @cli.command("orders")
-def orders_cmd():
+@paging_options
+def orders_cmd(limit, page):
     """List all open and recent orders."""
-    get_orders()
+    from trading import get_orders
+    get_orders(limit=limit, page=page)
 
 @cli.command("cancel")
-@click.argument("order_id")
-def cancel_cmd(order_id):
+@click.argument("order_id", required=False)
+@click.option("--all", "cancel_all", is_flag=True, help="Cancel every working order.")
+@click.option("--symbol", default=None, help="Cancel working orders for this ticker.")
+@click.option("--side", type=click.Choice(['buy', 'sell'], case_sensitive=False), default=None, help="Cancel working orders on this side.")
+def cancel_cmd(order_id, cancel_all, symbol, side):
     """
-    Cancel an open order.
+    Cancel an open order, or working orders in bulk.
     Example: python main.py cancel 657248
+    Bulk:    python main.py cancel --all | --symbol AAPL | --side buy
+    """
+    from trading import cancel_order, cancel_orders
+    bulk = cancel_all or symbol or side
+    if order_id and bulk:
+        raise click.UsageError("Give an ORDER_ID or bulk filters (--all/--symbol/--side), not both.")
+    if bulk:
+        cancel_orders(symbol=symbol, side=side)
+    elif order_id:
+        cancel_order(order_id)
+    else:
+        raise click.UsageError("Give an ORDER_ID, or --all/--symbol/--side to cancel in bulk.")
+
+@cli.command("shell")
+def shell_cmd():
+    """Interactive shell that reuses one OpenD connection for all commands."""
+    from shell import run_shell
+    run_shell(cli)
+
+@cli.group()
+def daemon():
+    """Background session holding warm OpenD connections."""
+    pass
+
+@daemon.command("start")
+def daemon_start_cmd():
+    """Start the daemon; later commands are forwarded to it automatically."""
+    from daemon import start_daemon, SOCKET_PATH
+    if start_daemon():
+        click.echo(f"Daemon running (socket: {SOCKET_PATH}).")
+    else:
+        click.echo("Daemon failed to start. Run 'python main.py daemon run' to see errors.")
+        sys.exit(1)
+
+@daemon.command("stop")
+def daemon_stop_cmd():
+    """Stop the daemon and close its connections."""
+    from daemon import stop_daemon
+    click.echo("Daemon stopped." if stop_daemon() else "Daemon is not running.")
+
+@daemon.command("status")
+def daemon_status_cmd():
+    """Show whether the daemon is running."""
+    from daemon import daemon_status
+    status = daemon_status()
+    if status is None:
+        click.echo("Daemon is not running.")
+    else:
+        click.echo(f"Daemon pid {status['pid']}, up {status['uptime']:.0f}s, "
+                   f"{status['commands']} commands served.")
+        health = status.get('health')
+        if health:
+            click.echo(f"OpenD link {health['state']}: {health['reconnects']} reconnects, "
+                       f"{health['downtime']:.0f}s down in total.")
+
+@daemon.command("run")
+def daemon_run_cmd():
+    """Run the daemon in the foreground."""
+    from daemon import serve
+    serve(cli)
+
+@cli.command("batch")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--dry-run", is_flag=True, help="Only validate the file; submit nothing.")
+def batch_cmd(path, dry_run):
+    """
+    Place many orders from a CSV, JSONL or JSON file.
+
+    Columns: ticker, side, order_type, qty, price, aux, trail, trail_type, spread.
+    Every row is validated first; nothing is sent if any row is invalid.
+    Example: python main.py batch rebalance.csv
     """
-    cancel_order(order_id)
+    from trading import place_batch
+    place_batch(path, dry_run=dry_run)
 
 # --- Updated Buy/Sell Commands ---
 
@@ -90,7 +289,9 @@ ORDER_TYPES = ['LIMIT', 'MARKET', 'STOP', 'STOP_LIMIT', 'MIT', 'LIT', 'TR_STOP',
 @click.option("--trail", type=float, default=0.0, help="Trailing Value (Amount or Ratio).")
 @click.option("--trail_type", type=click.Choice(['amount', 'ratio'], case_sensitive=False), default='amount', help="Trailing Type (default: amount).")
 @click.option("--spread", type=float, default=0.0, help="Limit Spread (for Trailing Stop Limit).")
-def buy_cmd(ticker, order_type, qty, price, aux, trail, trail_type, spread):
+@click.option("--wait", is_flag=True, help="Block until the order is filled, cancelled or failed.")
+@click.option("--timeout", type=float, default=60.0, show_default=True, help="Seconds to wait with --wait.")
+def buy_cmd(ticker, order_type, qty, price, aux, trail, trail_type, spread, wait, timeout):
     """
     Place a BUY order.
     
@@ -100,9 +301,14 @@ def buy_cmd(ticker, order_type, qty, price, aux, trail, trail_type, spread):
     Limit:   buy AAPL limit 10 150.5
     Stop:    buy AAPL stop 10 0 --aux 155.0
     Trail:   buy AAPL tr_stop 10 0 --trail 2.0 --trail_type amount
+    Wait:    buy AAPL market 10 --wait --timeout 30
     """
-    place_trade(ticker, 'buy', order_type, price, qty, 
-                aux_price=aux, trail_type=trail_type, trail_value=trail, trail_spread=spread)
+    from trading import place_trade
+    ok = place_trade(ticker, 'buy', order_type, price, qty, 
+                     aux_price=aux, trail_type=trail_type, trail_value=trail, trail_spread=spread,
+                     wait=wait, timeout=timeout)
+    if wait and not ok:
+        sys.exit(1)
 
 @cli.command("sell")
 @click.argument("ticker")
@@ -113,7 +319,9 @@ def buy_cmd(ticker, order_type, qty, price, aux, trail, trail_type, spread):
 @click.option("--trail", type=float, default=0.0, help="Trailing Value (Amount or Ratio).")
 @click.option("--trail_type", type=click.Choice(['amount', 'ratio'], case_sensitive=False), default='amount', help="Trailing Type.")
 @click.option("--spread", type=float, default=0.0, help="Limit Spread (for Trailing Stop Limit).")
-def sell_cmd(ticker, order_type, qty, price, aux, trail, trail_type, spread):
+@click.option("--wait", is_flag=True, help="Block until the order is filled, cancelled or failed.")
+@click.option("--timeout", type=float, default=60.0, show_default=True, help="Seconds to wait with --wait.")
+def sell_cmd(ticker, order_type, qty, price, aux, trail, trail_type, spread, wait, timeout):
     """
     Place a SELL order.
     
@@ -122,8 +330,12 @@ def sell_cmd(ticker, order_type, qty, price, aux, trail, trail_type, spread):
     Stop:    sell AAPL stop 10 0 --aux 140.0
     Trail:   sell AAPL tr_stop 10 0 --trail 5.0 --trail_type ratio
     """
-    place_trade(ticker, 'sell', order_type, price, qty, 
-                aux_price=aux, trail_type=trail_type, trail_value=trail, trail_spread=spread)
+    from trading import place_trade
+    ok = place_trade(ticker, 'sell', order_type, price, qty, 
+                     aux_price=aux, trail_type=trail_type, trail_value=trail, trail_spread=spread,
+                     wait=wait, timeout=timeout)
+    if wait and not ok:
+        sys.exit(1)
 
 if __name__ == '__main__':
     cli()
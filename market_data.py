@@ -3,12 +3,194 @@ from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from rich.columns import Columns
-from moomoo import RET_OK, SubType
+from rich.console import Group
+from rich.live import Live
+from moomoo import RET_OK, SubType, StockQuoteHandlerBase, OrderBookHandlerBase
 # Modified: Import helpers from connection
-from connection import ConnectionManager, normalize_ticker, safe_float
+from connection import ConnectionManager, normalize_ticker, safe_float, parallel_map, interruptible, health_note
+from orderbook import OrderBook
+import pandas as pd
+import numpy as np
+import threading
+import time
 
 console = Console()
 
+# get_market_snapshot accepts at most 400 codes per request.
+SNAPSHOT_BATCH_SIZE = 400
+
+# Default cap on screen refreshes per second in --watch mode
+DEFAULT_WATCH_FPS = 4
+
+class QuotePushHandler(StockQuoteHandlerBase):
+    """Forwards pushed quote DataFrames to a callback (runs on the SDK's push thread)."""
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret == RET_OK:
+            self.callback(data)
+        return ret, data
+
+class OrderBookPushHandler(OrderBookHandlerBase):
+    """Forwards pushed order-book dicts to a callback (runs on the SDK's push thread)."""
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret == RET_OK:
+            self.callback(data)
+        return ret, data
+
+def load_watchlist(path):
+    """
+    Reads tickers from a text file: one or more per line (comma/space separated),
+    blank lines and '#' comments ignored.
+    """
+    tickers = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0]
+            tickers.extend(t for t in line.replace(',', ' ').split() if t)
+    return tickers
+
+def get_batch_quotes(tickers):
+    """
+    Fetches snapshots for many tickers in as few round-trips as possible and shows
+    them in one compact table. Snapshots need no subscription, so quota is untouched.
+    """
+    codes = list(dict.fromkeys(normalize_ticker(t) for t in tickers))
+    ctx = ConnectionManager.get_quote_context()
+    console.print(f"[dim]Fetching snapshots for {len(codes)} symbols...[/dim]")
+
+    batches = [codes[i:i + SNAPSHOT_BATCH_SIZE] for i in range(0, len(codes), SNAPSHOT_BATCH_SIZE)]
+    results = parallel_map(lambda batch: ctx.get_market_snapshot(batch), batches)
+
+    frames = []
+    for batch, (ret, data) in zip(batches, results):
+        if ret != RET_OK:
+            console.print(f"[bold red]Snapshot failed for {len(batch)} symbols:[/bold red] {data}")
+        elif not data.empty:
+            frames.append(data)
+
+    if not frames:
+        console.print("[yellow]No quotes returned.[/yellow]")
+        ConnectionManager.close()
+        return
+
+    data = pd.concat(frames, ignore_index=True)
+    # Keep the caller's ordering (watchlist order), not the API's.
+    data = data.set_index('code').reindex([c for c in codes if c in set(data['code'])]).reset_index()
+
+    def num(col):
+        if col not in data.columns:
+            return pd.Series(0.0, index=data.index)
+        return pd.to_numeric(data[col], errors='coerce').fillna(0.0)
+
+    last = num('last_price')
+    prev_close = num('prev_close_price')
+    change = last - prev_close
+    change_pct = (change / prev_close.where(prev_close != 0)).fillna(0.0) * 100
+
+    table = Table(title=f"Quotes ({len(data)} symbols)")
+    table.add_column("Symbol", style="yellow")
+    table.add_column("Name")
+    table.add_column("Last", justify="right", style="bold")
+    table.add_column("Chg", justify="right")
+    table.add_column("Chg %", justify="right")
+    table.add_column("Open", justify="right")
+    table.add_column("High", justify="right")
+    table.add_column("Low", justify="right")
+    table.add_column("Volume", justify="right")
+    table.add_column("Bid", justify="right", style="green")
+    table.add_column("Ask", justify="right", style="red")
+    table.add_column("Time", justify="right", style="dim")
+
+    names = data['name'] if 'name' in data.columns else pd.Series('', index=data.index)
+    times = data['update_time'] if 'update_time' in data.columns else pd.Series('', index=data.index)
+    columns = zip(data['code'], names, last, change, change_pct, num('open_price'), num('high_price'),
+                  num('low_price'), num('volume'), num('bid_price'), num('ask_price'), times)
+    for code, name, lp, chg, pct, op, hi, lo, vol, bid, ask, ts in columns:
+        style = "green" if chg >= 0 else "red"
+        table.add_row(
+            str(code), str(name), f"{lp:.2f}",
+            f"[{style}]{chg:+.2f}[/{style}]", f"[{style}]{pct:+.2f}%[/{style}]",
+            f"{op:.2f}", f"{hi:.2f}", f"{lo:.2f}", f"{vol:,.0f}",
+            f"{bid:.2f}", f"{ask:.2f}", str(ts)
+        )
+
+    missing = [c for c in codes if c not in set(data['code'])]
+    console.print(table)
+    if missing:
+        console.print(f"[yellow]No data for:[/yellow] {', '.join(missing)}")
+    ConnectionManager.close()
+
+def _quote_panel(code, q):
+    """Panel with last/high/low/volume/open/prev close for one quote row."""
+    # Use safe_float for robustness
+    last_price = safe_float(q.get('last_price'))
+    open_price = safe_float(q.get('open_price'))
+    high_price = safe_float(q.get('high_price'))
+    low_price = safe_float(q.get('low_price'))
+    prev_close = safe_float(q.get('prev_close_price'))
+    volume = safe_float(q.get('volume'))
+
+    color = "green" if last_price >= open_price else "red"
+    
+    grid = Table.grid(expand=True)
+    grid.add_column(justify="center", ratio=1)
+    grid.add_column(justify="center", ratio=1)
+    grid.add_column(justify="center", ratio=1)
+    
+    grid.add_row(
+        f"[bold {color}]Last: {last_price}[/]", 
+        f"High: {high_price}", 
+        f"Low: {low_price}"
+    )
+    grid.add_row(
+        f"Vol: {volume:,.0f}", 
+        f"Open: {open_price}", 
+        f"Prev Cls: {prev_close}"
+    )
+
+    return Panel(grid, title=f"[bold gold1]{code}[/] Quote", subtitle=str(q.get('data_time')))
+
+def _order_book_view(data_book, limit=10):
+    """Side-by-side Bid/Ask tables for the top `limit` levels."""
+    bids = data_book.get('Bid', [])
+    asks = data_book.get('Ask', [])
+    
+    bid_table = Table(title="Bid (Buy)", style="green", box=None)
+    bid_table.add_column("Vol", justify="right")
+    bid_table.add_column("Price", justify="right", style="bold green")
+
+    ask_table = Table(title="Ask (Sell)", style="red", box=None)
+    ask_table.add_column("Price", justify="left", style="bold red")
+    ask_table.add_column("Vol", justify="left")
+
+    for i in range(limit):
+        if i < len(bids):
+            item = bids[i]
+            b_price = safe_float(item[0])
+            b_vol = safe_float(item[1])
+            bid_table.add_row(f"{b_vol:,.0f}", f"{b_price:.2f}")
+        else:
+            bid_table.add_row("-", "-")
+            
+        if i < len(asks):
+            item = asks[i]
+            a_price = safe_float(item[0])
+            a_vol = safe_float(item[1])
+            ask_table.add_row(f"{a_price:.2f}", f"{a_vol:,.0f}")
+        else:
+            ask_table.add_row("-", "-")
+
+    return Columns([bid_table, ask_table])
+
 def get_stock_quote(ticker):
     """
     Fetches and displays Quote and Level-2 Order Book for a stock.
@@ -19,8 +201,8 @@ def get_stock_quote(ticker):
 
     console.print(f"[dim]Fetching data for {code}...[/dim]")
 
-    # 1. Subscribe to QUOTE and ORDER_BOOK
-    ret_sub, err_message = ctx.subscribe([code], [SubType.QUOTE, SubType.ORDER_BOOK])
+    # 1. Subscribe to QUOTE and ORDER_BOOK (reuses an existing subscription)
+    ret_sub, err_message = ConnectionManager.subscriptions.ensure([code], [SubType.QUOTE, SubType.ORDER_BOOK])
     
     if ret_sub != RET_OK:
         console.print(f"[bold red]Subscription failed:[/bold red] {err_message}")
@@ -42,69 +224,179 @@ def get_stock_quote(ticker):
     
     # A. Display Basic Quote Info
     if not data_quote.empty:
-        q = data_quote.iloc[0]
-        
-        # Use safe_float for robustness
-        last_price = safe_float(q.get('last_price'))
-        open_price = safe_float(q.get('open_price'))
-        high_price = safe_float(q.get('high_price'))
-        low_price = safe_float(q.get('low_price'))
-        prev_close = safe_float(q.get('prev_close_price'))
-        volume = safe_float(q.get('volume'))
-
-        color = "green" if last_price >= open_price else "red"
-        
-        grid = Table.grid(expand=True)
-        grid.add_column(justify="center", ratio=1)
-        grid.add_column(justify="center", ratio=1)
-        grid.add_column(justify="center", ratio=1)
-        
-        grid.add_row(
-            f"[bold {color}]Last: {last_price}[/]", 
-            f"High: {high_price}", 
-            f"Low: {low_price}"
-        )
-        grid.add_row(
-            f"Vol: {volume:,.0f}", 
-            f"Open: {open_price}", 
-            f"Prev Cls: {prev_close}"
-        )
-
-        console.print(Panel(grid, title=f"[bold gold1]{code}[/] Quote", subtitle=str(q.get('data_time'))))
+        console.print(_quote_panel(code, data_quote.iloc[0]))
 
     # B. Display Level 2 Order Book
     if ret_book == RET_OK and data_book is not None:
-        bids = data_book.get('Bid', [])
-        asks = data_book.get('Ask', [])
-        
-        bid_table = Table(title="Bid (Buy)", style="green", box=None)
-        bid_table.add_column("Vol", justify="right")
-        bid_table.add_column("Price", justify="right", style="bold green")
-
-        ask_table = Table(title="Ask (Sell)", style="red", box=None)
-        ask_table.add_column("Price", justify="left", style="bold red")
-        ask_table.add_column("Vol", justify="left")
-
-        limit = 10
-        for i in range(limit):
-            if i < len(bids):
-                item = bids[i]
-                b_price = safe_float(item[0])
-                b_vol = safe_float(item[1])
-                bid_table.add_row(f"{b_vol:,.0f}", f"{b_price:.2f}")
-            else:
-                bid_table.add_row("-", "-")
-                
-            if i < len(asks):
-                item = asks[i]
-                a_price = safe_float(item[0])
-                a_vol = safe_float(item[1])
-                ask_table.add_row(f"{a_price:.2f}", f"{a_vol:,.0f}")
+        console.print(_order_book_view(data_book))
+    else:
+        console.print("[yellow]Order book not available (Check permissions or market status).[/yellow]")
+
+    ConnectionManager.close()
+
+def _fmt(value, spec=".2f"):
+    return "-" if np.isnan(value) else format(value, spec)
+
+def _ladder_view(book, limit=10):
+    """Bid/Ask ladder with cumulative depth plus spread/mid/microprice/imbalance."""
+    ladder = Table(box=None)
+    ladder.add_column("Bid Cum", justify="right", style="dim")
+    ladder.add_column("Bid Vol", justify="right")
+    ladder.add_column("Bid", justify="right", style="bold green")
+    ladder.add_column("Ask", justify="left", style="bold red")
+    ladder.add_column("Ask Vol", justify="left")
+    ladder.add_column("Ask Cum", justify="left", style="dim")
+
+    for i in range(min(limit, book.depth)):
+        bid = (f"{book.bid_cum[i]:,.0f}", f"{book.bid_vol[i]:,.0f}", f"{book.bid_px[i]:.2f}") \
+            if i < book.bid_levels else ("-", "-", "-")
+        ask = (f"{book.ask_px[i]:.2f}", f"{book.ask_vol[i]:,.0f}", f"{book.ask_cum[i]:,.0f}") \
+            if i < book.ask_levels else ("-", "-", "-")
+        ladder.add_row(*bid, *ask)
+
+    stats = (f"Spread: {_fmt(book.spread, '.3f')} | Mid: {_fmt(book.mid, '.3f')} | "
+             f"Micro: {_fmt(book.microprice, '.3f')} | Imbalance: {_fmt(book.imbalance, '+.2f')}")
+    return Group(ladder, f"[cyan]{stats}[/cyan]")
+
+def _watch_table(codes, quotes, books):
+    """One row per symbol: last price and book analytics."""
+    table = Table(title=f"Live Quotes ({len(codes)} symbols)")
+    table.add_column("Symbol", style="yellow")
+    table.add_column("Last", justify="right", style="bold")
+    table.add_column("Bid", justify="right", style="green")
+    table.add_column("Ask", justify="right", style="red")
+    table.add_column("Spread", justify="right")
+    table.add_column("Mid", justify="right")
+    table.add_column("Micro", justify="right")
+    table.add_column("Imbalance", justify="right")
+    table.add_column("Bid Depth", justify="right", style="dim")
+    table.add_column("Ask Depth", justify="right", style="dim")
+
+    for code in codes:
+        q = quotes.get(code)
+        book = books[code]
+        last = f"{safe_float(q.get('last_price')):.2f}" if q is not None else "-"
+        imb_style = "green" if book.imbalance > 0 else "red"
+        table.add_row(
+            code, last, _fmt(book.best_bid), _fmt(book.best_ask),
+            _fmt(book.spread, '.3f'), _fmt(book.mid, '.3f'), _fmt(book.microprice, '.3f'),
+            f"[{imb_style}]{_fmt(book.imbalance, '+.2f')}[/{imb_style}]",
+            f"{book.bid_cum[-1]:,.0f}", f"{book.ask_cum[-1]:,.0f}"
+        )
+    return table
+
+def watch_quotes(tickers, fps=DEFAULT_WATCH_FPS):
+    """
+    Live quotes and order books driven by OpenD push handlers (no polling).
+    Pushes only update state (books are applied in place to OrderBook ladders);
+    the screen is redrawn at most `fps` times per second, so a busy ticker's
+    updates are coalesced into one frame. One ticker shows the full ladder,
+    several show one analytics row each.
+    """
+    codes = list(dict.fromkeys(normalize_ticker(t) for t in tickers))
+    ctx = ConnectionManager.get_quote_context()
+
+    quotes = {}
+    books = {code: OrderBook(code) for code in codes}
+    state = {'updates': 0}
+    lock = threading.Lock()
+    dirty = threading.Event()
+
+    def on_quote(data):
+        rows = data[data['code'].isin(books)]
+        if not rows.empty:
+            with lock:
+                for _, row in rows.iterrows():
+                    quotes[row['code']] = row
+                state['updates'] += len(rows)
+            dirty.set()
+
+    def on_book(book):
+        code = book.get('code')
+        if code in books:
+            with lock:
+                books[code].update(book)
+                state['updates'] += 1
+            dirty.set()
+
+    handlers = [QuotePushHandler(on_quote), OrderBookPushHandler(on_book)]
+    for handler in handlers:
+        ctx.set_handler(handler)
+
+    ret_sub, err_message = ConnectionManager.subscriptions.ensure(codes, [SubType.QUOTE, SubType.ORDER_BOOK])
+    if ret_sub != RET_OK:
+        console.print(f"[bold red]Subscription failed:[/bold red] {err_message}")
+        for handler in handlers:
+            ctx.remove_handler(handler)
+        ConnectionManager.close()
+        return
+
+    # Seed the view; pushes only arrive on the next change.
+    ret_quote, data_quote = ctx.get_stock_quote(codes)
+    if ret_quote == RET_OK:
+        on_quote(data_quote)
+    for code in codes:
+        ret_book, data_book = ctx.get_order_book(code)
+        if ret_book == RET_OK and data_book is not None:
+            on_book(data_book)
+
+    def render():
+        with lock:
+            if len(codes) == 1:
+                code = codes[0]
+                quote = quotes.get(code)
+                parts = [_quote_panel(code, quote) if quote is not None else f"[dim]Waiting for {code} quote...[/dim]"]
+                if books[code].updates:
+                    parts.append(_ladder_view(books[code]))
             else:
-                ask_table.add_row("-", "-")
+                parts = [_watch_table(codes, quotes, books)]
+            updates = state['updates']
+        note = health_note(ConnectionManager.health_stats())
+        parts.append(f"[dim]{updates} updates | max {fps} fps{note} | Ctrl+C to exit[/dim]")
+        return Group(*parts)
+
+    interval = 1.0 / max(fps, 0.1)
+    note = health_note(ConnectionManager.health_stats())
+    try:
+        with interruptible(), Live(render(), console=console, auto_refresh=False) as live:
+            while True:
+                changed = dirty.wait(timeout=1.0)
+                # Also redraw when the link goes down or comes back.
+                previous, note = note, health_note(ConnectionManager.health_stats())
+                if changed or note != previous:
+                    dirty.clear()
+                    live.update(render(), refresh=True)
+                    # Pushes arriving during this pause collapse into the next frame.
+                    time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # The shell keeps this context: stop feeding the closed view.
+        for handler in handlers:
+            ctx.remove_handler(handler)
+        ConnectionManager.close()
 
-        console.print(Columns([bid_table, ask_table]))
+def show_subscriptions():
+    """Displays OpenD subscription quota usage and this session's subscriptions (LRU first)."""
+    quota, rows = ConnectionManager.subscriptions.usage()
+
+    if quota is None:
+        console.print("[bold red]Could not query subscription quota.[/bold red]")
     else:
-        console.print("[yellow]Order book not available (Check permissions or market status).[/yellow]")
+        console.print(f"Quota: [bold]{quota.get('total_used')}[/bold] used "
+                      f"(this session: {quota.get('own_used')}), "
+                      f"[bold green]{quota.get('remain')}[/bold green] remaining")
+
+    if rows:
+        table = Table(title="Session Subscriptions (least recently used first)")
+        table.add_column("Symbol", style="yellow")
+        table.add_column("Types")
+        table.add_column("Held", justify="right")
+        table.add_column("Idle", justify="right", style="dim")
+        for code, types, held, idle in rows:
+            table.add_row(code, ", ".join(types), f"{held:.0f}s", f"{idle:.0f}s")
+        console.print(table)
+    else:
+        console.print("[dim]No subscriptions held by this session.[/dim]")
 
-    ConnectionManager.close()
\ No newline at end of file
+    ConnectionManager.close()
@@ -0,0 +1,75 @@
+import numpy as np
+
+# Levels kept per side; OpenD pushes at most this many for a standard subscription.
+DEFAULT_DEPTH = 10
+
+class OrderBook:
+    """
+    Fixed-depth bid/ask ladder backed by preallocated NumPy arrays.
+    OpenD pushes the top-N levels of each side; update() copies only changed
+    levels in place and refreshes the analytics without allocating.
+    """
+    def __init__(self, code, depth=DEFAULT_DEPTH):
+        self.code = code
+        self.depth = depth
+        self.bid_px = np.zeros(depth)
+        self.bid_vol = np.zeros(depth)
+        self.ask_px = np.zeros(depth)
+        self.ask_vol = np.zeros(depth)
+        self.bid_cum = np.zeros(depth)
+        self.ask_cum = np.zeros(depth)
+        self.bid_levels = 0
+        self.ask_levels = 0
+        self.updates = 0
+        self.spread = np.nan
+        self.mid = np.nan
+        self.microprice = np.nan
+        self.imbalance = np.nan
+
+    @staticmethod
+    def _load(levels, px, vol):
+        """Writes (price, volume, ...) tuples into px/vol in place. Returns the level count."""
+        n = min(len(levels), len(px))
+        for i in range(n):
+            p, v = levels[i][0], levels[i][1]
+            if px[i] != p or vol[i] != v:
+                px[i] = p
+                vol[i] = v
+        px[n:] = 0.0
+        vol[n:] = 0.0
+        return n
+
+    def update(self, book):
+        """Applies an OpenD order-book dict ({'Bid': [...], 'Ask': [...]})."""
+        self.bid_levels = self._load(book.get('Bid') or (), self.bid_px, self.bid_vol)
+        self.ask_levels = self._load(book.get('Ask') or (), self.ask_px, self.ask_vol)
+        np.cumsum(self.bid_vol, out=self.bid_cum)
+        np.cumsum(self.ask_vol, out=self.ask_cum)
+        self.updates += 1
+
+        if self.bid_levels and self.ask_levels:
+            bid, ask = self.bid_px[0], self.ask_px[0]
+            bid_sz, ask_sz = self.bid_vol[0], self.ask_vol[0]
+            self.spread = ask - bid
+            self.mid = (ask + bid) / 2
+            top = bid_sz + ask_sz
+            # Microprice leans toward the side with less resting size.
+            self.microprice = (bid * ask_sz + ask * bid_sz) / top if top else self.mid
+        else:
+            self.spread = self.mid = self.microprice = np.nan
+        self.imbalance = self.depth_imbalance()
+
+    def depth_imbalance(self, levels=None):
+        """(bid vol - ask vol) / (bid vol + ask vol) over the top `levels` (default: all)."""
+        k = self.depth if levels is None else max(1, min(levels, self.depth))
+        bid, ask = self.bid_cum[k - 1], self.ask_cum[k - 1]
+        total = bid + ask
+        return (bid - ask) / total if total else np.nan
+
+    @property
+    def best_bid(self):
+        return self.bid_px[0] if self.bid_levels else np.nan
+
+    @property
+    def best_ask(self):
+        return self.ask_px[0] if self.ask_levels else np.nan
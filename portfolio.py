@@ -1,11 +1,17 @@
+import asyncio
 import click
 from rich.console import Console
 from rich.table import Table
 from rich.panel import Panel
 from moomoo import RET_OK
-from connection import ConnectionManager, TRADING_ENV, safe_float
+from connection import ConnectionManager, TRADING_ENV, safe_float, parallel_map
+import aio
+from trading_calendar import get_trading_days, market_today
+from ledger import fetch_deals, fetch_cash_flows, fetch_order_fees, sync_deals, read_deals, read_fills, local_account_key
+from render import numeric, text, fmt, choose, styled, sign_style, paginate, add_rows, machine_output, emit
 from datetime import datetime, timedelta
 import pytz
+import numpy as np
 import pandas as pd
 
 console = Console()
@@ -38,10 +44,90 @@ def get_account_summary(currency='USD'):
         console.print(f"[yellow]No account data found for {currency}.[/yellow]")
     ConnectionManager.close()
 
+# portfolio summary --all: every account in TRADING_ENV, in each of these currencies
+SUMMARY_CURRENCIES = ('USD', 'HKD', 'CNH')
+SUMMARY_FIELDS = ('total_assets', 'cash', 'market_val', 'realized_pl', 'unrealized_pl')
+
+async def _fetch_summaries(session, accounts, currencies):
+    """accinfo_query for every (account, currency) pair at once. Returns (account, currency, ret, data) tuples."""
+    async def one(account, currency):
+        ret, data = await session.trade.accinfo_query(trd_env=account['trd_env'], acc_id=account['acc_id'],
+                                                      currency=currency)
+        return account, currency, ret, data
+    return await asyncio.gather(*(one(a, c) for a in accounts for c in currencies))
+
+def get_all_summaries(currencies=SUMMARY_CURRENCIES):
+    """
+    Consolidated summary of every account from get_acc_list in each currency,
+    fetched concurrently over the one trade context, with per-currency totals.
+    """
+    ctx = ConnectionManager.get_trade_context()
+    ret, accounts = ctx.get_acc_list()
+    if ret != RET_OK:
+        console.print(f"[bold red]Error fetching accounts:[/bold red] {accounts}")
+        ConnectionManager.close()
+        return
+    accounts = accounts[accounts['trd_env'] == TRADING_ENV]
+    if accounts.empty:
+        console.print(f"[yellow]No {TRADING_ENV} accounts found.[/yellow]")
+        ConnectionManager.close()
+        return
+
+    with console.status(f"[dim]Fetching {len(accounts)} account(s) x {len(currencies)} currencies...[/dim]"):
+        results = aio.run(_fetch_summaries, accounts.to_dict('records'), currencies)
+
+    rows, errors = [], []
+    for account, currency, ret, data in results:
+        if ret != RET_OK or data.empty:
+            errors.append(f"{account['acc_id']} ({currency}): {data if ret != RET_OK else 'no data'}")
+            continue
+        row = data.iloc[0]
+        rows.append({'acc_id': account['acc_id'], 'acc_type': account.get('acc_type', 'N/A'), 'currency': currency,
+                     **{field: row.get(field) for field in SUMMARY_FIELDS}})
+    data = pd.DataFrame(rows, columns=['acc_id', 'acc_type', 'currency', *SUMMARY_FIELDS])
+
+    if machine_output():
+        emit(data)
+    elif not data.empty:
+        values = numeric(data, *SUMMARY_FIELDS)
+        data[list(SUMMARY_FIELDS)] = pd.concat(values, axis=1).to_numpy()
+        if data['acc_id'].nunique() > 1:
+            totals = data.groupby('currency', sort=False)[list(SUMMARY_FIELDS)].sum().reset_index()
+            data = pd.concat([data, totals.assign(acc_id='Total', acc_type='')], ignore_index=True)
+
+        table = Table(title=f"Account Summary ({TRADING_ENV}) - All Accounts")
+        table.add_column("Account", style="cyan", no_wrap=True)
+        table.add_column("Type", style="dim")
+        table.add_column("Currency")
+        for title in ("Total Assets", "Cash", "Market Value", "Realized P&L", "Unrealized P&L"):
+            table.add_column(title, justify="right")
+
+        total_assets, cash, market_val, realized, unrealized = numeric(data, *SUMMARY_FIELDS)
+        add_rows(table,
+                 text(data, 'acc_id'),
+                 text(data, 'acc_type'),
+                 text(data, 'currency'),
+                 fmt(total_assets, ',.2f'),
+                 fmt(cash, ',.2f'),
+                 fmt(market_val, ',.2f'),
+                 styled(fmt(realized, '+,.2f'), sign_style(realized)),
+                 styled(fmt(unrealized, '+,.2f'), sign_style(unrealized)))
+        console.print(table)
+    else:
+        console.print("[yellow]No account data found.[/yellow]")
+
+    for error in errors:
+        console.print(f"[bold red]Error fetching funds[/bold red] {error}")
+    ConnectionManager.close()
+
 def get_market_timezone():
     return pytz.timezone('US/Eastern')
 
-def get_deals(days=0, start_date=None, end_date=None):
+def get_deals(days=0, start_date=None, end_date=None, sync=False, full_resync=False, limit=None, page=1):
+    """
+    Lists executed trades. With `sync`, the local ledger is first brought up to
+    date incrementally (or fully, with `full_resync`) and the range is read from it.
+    """
     from datetime import timedelta
     ctx = ConnectionManager.get_trade_context()
     market_tz = get_market_timezone()
@@ -51,7 +137,22 @@ def get_deals(days=0, start_date=None, end_date=None):
     if start_date or (days and days > 0):
         is_history = True
 
-    if is_history:
+    if sync or full_resync:
+        end = end_date if end_date else now_in_market.strftime("%Y-%m-%d")
+        if start_date:
+            start = start_date
+        else:
+            start = (now_in_market - timedelta(days=days)).strftime("%Y-%m-%d")
+        mode = "Full resync" if full_resync else "Incremental sync"
+        console.print(f"[dim]{mode} of deal history...[/dim]")
+        # 显式给出的起点 (--start 或 --days) 早于已同步范围时会先回补
+        ret, synced = sync_deals(ctx, full_resync=full_resync, since=start if is_history else None)
+        if ret == RET_OK:
+            console.print(f"[dim]{synced} new deals synced. Showing {start} to {end}.[/dim]")
+            data = read_deals(start, end)
+        else:
+            data = synced
+    elif is_history:
         if start_date:
             start = start_date
             end = end_date if end_date else now_in_market.strftime("%Y-%m-%d")
@@ -60,7 +161,8 @@ def get_deals(days=0, start_date=None, end_date=None):
             start_dt = now_in_market - timedelta(days=days)
             start = start_dt.strftime("%Y-%m-%d")
         console.print(f"[dim]Querying history from {start} to {end}...[/dim]")
-        ret, data = ctx.history_deal_list_query(start=start, end=end, trd_env=TRADING_ENV)
+        # 已收盘的交易日从本地账本读取，只向 OpenD 请求缺失的部分
+        ret, data = fetch_deals(ctx, start, end)
     else:
         console.print(f"[dim]Querying today's deals...[/dim]")
         ret, data = ctx.deal_list_query(trd_env=TRADING_ENV)
@@ -69,6 +171,11 @@ def get_deals(days=0, start_date=None, end_date=None):
         console.print(f"[bold red]Error fetching deals:[/bold red] {data}")
         return
 
+    if machine_output():
+        emit(data)
+        ConnectionManager.close()
+        return
+
     if not data.empty:
         if 'create_time' in data.columns:
             data = data.sort_values(by='create_time', ascending=False)
@@ -78,22 +185,24 @@ def get_deals(days=0, start_date=None, end_date=None):
         table.add_column("Symbol", style="yellow")
         table.add_column("Price", justify="right")
         table.add_column("Qty", justify="right")
-        for _, row in data.iterrows():
-            side = row.get('trd_side', 'UNKNOWN')
-            color = "red" if side == "BUY" else "green"
-            table.add_row(
-                str(row.get('create_time', 'N/A')),
-                f"[{color}]{side}[/{color}]",
-                str(row.get('code', 'N/A')),
-                f"{safe_float(row.get('price')):,.2f}",
-                f"{safe_float(row.get('qty')):,.0f}"
-            )
+
+        rows, note = paginate(data, limit, page)
+        price, qty = numeric(rows, 'price', 'qty')
+        side = text(rows, 'trd_side', 'UNKNOWN')
+        add_rows(table,
+                 text(rows, 'create_time'),
+                 styled(side, choose(side == "BUY", "red", "green", rows.index)),
+                 text(rows, 'code'),
+                 fmt(price, ',.2f'),
+                 fmt(qty, ',.0f'))
         console.print(table)
+        if note:
+            console.print(f"[dim]{note}[/dim]")
     else:
         console.print("[yellow]No deals found.[/yellow]")
     ConnectionManager.close()
 
-def get_positions():
+def get_positions(limit=None, page=1):
     """
     Fetches and displays the current stock positions.
     """
@@ -107,6 +216,11 @@ def get_positions():
         ConnectionManager.close()
         return
 
+    if machine_output():
+        emit(data)
+        ConnectionManager.close()
+        return
+
     if not data.empty:
         table = Table(title=f"Current Positions ({TRADING_ENV})")
         
@@ -120,39 +234,59 @@ def get_positions():
         table.add_column("P&L", justify="right")
         table.add_column("P&L %", justify="right")
 
-        for _, row in data.iterrows():
-            code = str(row.get('code', 'N/A'))
-            name = str(row.get('stock_name', 'N/A'))
-            qty = safe_float(row.get('qty'))
-            cost = safe_float(row.get('cost_price'))
-            avg_cost = safe_float(row.get('average_cost'))
-            price = safe_float(row.get('nominal_price'))
-            mkt_val = safe_float(row.get('market_val'))
-            pl_val = safe_float(row.get('pl_val'))
-            pl_ratio = safe_float(row.get('pl_ratio'))
-
-            pl_style = "green" if pl_val >= 0 else "red"
-            
-            table.add_row(
-                code,
-                name,
-                f"{qty:,.0f}",
-                f"{cost:,.2f}",
-                f"{avg_cost:,.2f}",
-                f"{price:,.2f}",
-                f"{mkt_val:,.2f}",
-                f"[{pl_style}]{pl_val:+,.2f}[/{pl_style}]",
-                f"[{pl_style}]{pl_ratio:+.2f}%[/{pl_style}]"
-            )
+        rows, note = paginate(data, limit, page)
+        qty, cost, avg_cost, price, mkt_val, pl_val, pl_ratio = numeric(
+            rows, 'qty', 'cost_price', 'average_cost', 'nominal_price', 'market_val', 'pl_val', 'pl_ratio')
+        pl_style = sign_style(pl_val)
+
+        add_rows(table,
+                 text(rows, 'code'),
+                 text(rows, 'stock_name'),
+                 fmt(qty, ',.0f'),
+                 fmt(cost, ',.2f'),
+                 fmt(avg_cost, ',.2f'),
+                 fmt(price, ',.2f'),
+                 fmt(mkt_val, ',.2f'),
+                 styled(fmt(pl_val, '+,.2f'), pl_style),
+                 styled(fmt(pl_ratio, '+.2f') + '%', pl_style))
         
         console.print(table)
+        if note:
+            console.print(f"[dim]{note}[/dim]")
     else:
         console.print("[yellow]No positions found (Empty portfolio).[/yellow]")
 
     ConnectionManager.close()
 
 # --- 修改后的 get_statement 函数 ---
-def get_statement(date_str=None):
+async def _fetch_statement(session, ctx, start_date, end_date, date_list):
+    """
+    Deals (then their fees) and cash flows, fetched concurrently.
+    Returns ((ret_deals, data_deals, fees_map, order ids whose fee fetch failed),
+    (list of non-empty daily cash-flow frames, days whose fetch failed)).
+    """
+    async def deals_and_fees():
+        # API 支持范围查询，已收盘交易日走本地账本
+        ret_deals, data_deals = await session.run(fetch_deals, ctx, start_date, end_date)
+        fees_map, missing_fees = {}, []
+        if ret_deals == RET_OK and not data_deals.empty:
+            order_ids = list(set(data_deals['order_id'].tolist()))
+            # 所有成交都在已收盘交易日的订单，费用不会再变，可写入本地账本
+            last_fill_day = data_deals.groupby('order_id')['create_time'].max().astype(str).str[:10]
+            final_ids = last_fill_day[last_fill_day < market_today()].index.tolist()
+            # API 单次最多 400 个订单，大范围时自动分批并发查询 (按批重试)
+            fees_map = await session.run(fetch_order_fees, ctx, order_ids, final_ids)
+            missing_fees = sorted(oid for oid in order_ids if oid not in fees_map)
+        return ret_deals, data_deals, fees_map, missing_fees
+
+    async def cash_flows():
+        # API 需要单日查询，按日并发 (受 OpenD 频率限制)；结果按 date_list 顺序返回
+        flows = await session.run(fetch_cash_flows, ctx, date_list)
+        return [d_data for d_data in flows.values() if not d_data.empty], [d for d in date_list if d not in flows]
+
+    return await asyncio.gather(deals_and_fees(), cash_flows())
+
+def get_statement(date_str=None, limit=None, page=1):
     """
     Fetches a statement (Deals + Cash Flow) for a specific date or date range.
     date_str format: 'YYMMDD' or 'YYMMDD-YYMMDD'.
@@ -163,7 +297,6 @@ def get_statement(date_str=None):
     start_date = None
     end_date = None
     query_label = ""
-    date_list = []
 
     # 1. 解析日期或日期范围
     if date_str:
@@ -186,19 +319,12 @@ def get_statement(date_str=None):
                 end_date = e_obj.strftime("%Y-%m-%d")
                 query_label = f"{start_date} to {end_date}"
                 
-                # 生成所有需要查询的日期列表 (用于 Cash Flow)
-                curr = s_obj
-                while curr <= e_obj:
-                    date_list.append(curr.strftime("%Y-%m-%d"))
-                    curr += timedelta(days=1)
-                    
             else:
                 # 处理单日: YYMMDD
                 dt = datetime.strptime(date_str, "%y%m%d")
                 start_date = dt.strftime("%Y-%m-%d")
                 end_date = start_date
                 query_label = start_date
-                date_list = [start_date]
                 
         except ValueError:
             console.print(f"[bold red]Invalid date format:[/bold red] {date_str}. Use YYMMDD or YYMMDD-YYMMDD.")
@@ -209,25 +335,26 @@ def get_statement(date_str=None):
         start_date = today
         end_date = today
         query_label = today
-        date_list = [today]
 
     console.print(f"[dim]Generating statement for [bold white]{query_label}[/bold white]...[/dim]")
 
-    # 2. 查询交易 (Deals) - API 支持范围查询
-    ret_deals, data_deals = ctx.history_deal_list_query(
-        start=start_date, end=end_date, trd_env=TRADING_ENV
-    )
+    # 只查询交易日 (周末和假日不会有交收)，日历缓存于本地
+    date_list = get_trading_days(start_date, end_date)
+
+    # 2-4. 交易+费用 与 资金流水互不依赖，并发查询：耗时取决于较慢的一路，而非相加
+    # 使用 rich 的 status 显示加载动画，防止查询太久用户以为卡死
+    with console.status(f"[dim]Fetching deals, fees and cash flows for {len(date_list)} days...[/dim]"):
+        (ret_deals, data_deals, fees_map, missing_fees), (all_cash_flows, missing_days) = aio.run(
+            _fetch_statement, ctx, start_date, end_date, date_list)
+
+    # 重试后仍失败的部分如实提示，否则费用合计和资金流水会悄悄偏少
+    if missing_fees:
+        console.print(f"[bold yellow]Fees could not be fetched for {len(missing_fees)} order(s); "
+                      f"fee totals are understated:[/bold yellow] {', '.join(map(str, missing_fees[:10]))}"
+                      + (f" and {len(missing_fees) - 10} more" if len(missing_fees) > 10 else ""))
+    if missing_days:
+        console.print(f"[bold yellow]Cash flows could not be fetched for:[/bold yellow] {', '.join(missing_days)}")
 
-    # 3. 查询资金流水 (Cash Flow) - API 需要单日循环
-    all_cash_flows = []
-    
-    # 使用 rich 的 status 显示加载动画，防止循环太久用户以为卡死
-    with console.status(f"[dim]Fetching cash flows for {len(date_list)} days...[/dim]"):
-        for d in date_list:
-            r, d_data = ctx.get_acc_cash_flow(clearing_date=d, trd_env=TRADING_ENV)
-            if r == RET_OK and not d_data.empty:
-                all_cash_flows.append(d_data)
-    
     data_flow = pd.DataFrame()
     ret_flow = RET_OK
     if all_cash_flows:
@@ -239,22 +366,16 @@ def get_statement(date_str=None):
         elif 'pay_time' in data_flow.columns:
              data_flow = data_flow.sort_values(by='pay_time')
 
-    # 4. 查询费用 (Fees)
-    fees_map = {} 
-    if ret_deals == RET_OK and not data_deals.empty:
-        order_ids = list(set(data_deals['order_id'].tolist()))
-        # API 限制一次查太多可能会报错，通常几百个没问题。
-        # 如果范围很大，建议分批查询 (这里暂且假设日内或短周期交易量不超限)
-        ret_fee, data_fee = ctx.order_fee_query(order_id_list=order_ids, trd_env=TRADING_ENV)
-        
-        if ret_fee == RET_OK and not data_fee.empty:
-            for _, row in data_fee.iterrows():
-                oid = row.get('order_id')
-                amt = safe_float(row.get('fee_amount'))
-                if oid in fees_map:
-                    fees_map[oid] += amt
-                else:
-                    fees_map[oid] = amt
+    if machine_output():
+        # 交易与资金流水合并为一张表，以 section 列区分
+        sections = []
+        if ret_deals == RET_OK and not data_deals.empty:
+            sections.append(data_deals.assign(section='deal', order_fee=data_deals['order_id'].map(fees_map)))
+        if not data_flow.empty:
+            sections.append(data_flow.assign(section='cash_flow'))
+        emit(pd.concat(sections, ignore_index=True) if sections else pd.DataFrame(columns=['section']))
+        ConnectionManager.close()
+        return
 
     # --- 显示交易记录 (Deals) ---
     total_fees_period = 0.0
@@ -273,39 +394,29 @@ def get_statement(date_str=None):
         deal_table.add_column("Amount", justify="right")
         deal_table.add_column("Order Fee", justify="right", style="red")
 
-        processed_orders = set()
+        # 同一订单的多笔成交，只在第一笔显示总费用 (整表计算，再分页)
+        order_ids = data_deals['order_id']
+        fee = order_ids.map(fees_map)
+        first_fill = ~order_ids.duplicated()
+        fee_display = pd.Series(np.where(fee.isna(), "-",
+                                         np.where(first_fill, fmt(fee.fillna(0.0), '.2f'), "(see above)")),
+                                index=data_deals.index)
+        total_fees_period = sum(fees_map[oid] for oid in order_ids.unique() if oid in fees_map)
 
-        for _, row in data_deals.iterrows():
-            side = row.get('trd_side', 'UNKNOWN')
-            color = "red" if side == "BUY" else "green"
-            
-            price = safe_float(row.get('price'))
-            qty = safe_float(row.get('qty'))
-            amount = price * qty
-            
-            order_id = row.get('order_id')
-            fee_display = "-"
-            
-            if order_id in fees_map:
-                fee_val = fees_map[order_id]
-                # 只是为了显示美观，对于同一个订单的多笔成交，只在第一笔显示总费用
-                if order_id not in processed_orders:
-                    fee_display = f"{fee_val:.2f}"
-                    total_fees_period += fee_val
-                    processed_orders.add(order_id)
-                else:
-                    fee_display = "(see above)"
-
-            deal_table.add_row(
-                str(row.get('create_time', 'N/A')), # 显示完整时间
-                f"[{color}]{side}[/{color}]",
-                str(row.get('code', 'N/A')),
-                f"{price:,.2f}",
-                f"{qty:,.0f}",
-                f"{amount:,.2f}",
-                fee_display
-            )
+        rows, note = paginate(data_deals, limit, page)
+        price, qty = numeric(rows, 'price', 'qty')
+        side = text(rows, 'trd_side', 'UNKNOWN')
+        add_rows(deal_table,
+                 text(rows, 'create_time'), # 显示完整时间
+                 styled(side, choose(side == "BUY", "red", "green", rows.index)),
+                 text(rows, 'code'),
+                 fmt(price, ',.2f'),
+                 fmt(qty, ',.0f'),
+                 fmt(price * qty, ',.2f'),
+                 fee_display.loc[rows.index])
         console.print(deal_table)
+        if note:
+            console.print(f"[dim]{note}[/dim]")
         console.print(f"[dim right]Total Fees for period: ${total_fees_period:.2f}[/dim right]")
     else:
         console.print(Panel(f"No trades executed during {query_label}.", title="Trades", style="dim"))
@@ -318,19 +429,161 @@ def get_statement(date_str=None):
         flow_table.add_column("Amount", justify="right")
         flow_table.add_column("Description", style="dim")
 
-        for _, row in data_flow.iterrows():
-            amt = safe_float(row.get('cash_flow_amount', 0))
-            color = "green" if amt >= 0 else "red"
-            time_val = str(row.get('create_time', row.get('pay_time', 'N/A')))
-            
-            flow_table.add_row(
-                time_val,
-                str(row.get('cash_flow_name', 'Unknown')),
-                f"[{color}]{amt:,.2f}[/{color}]",
-                str(row.get('cash_flow_remark', '')) 
-            )
+        rows, note = paginate(data_flow, limit, page)
+        amt, = numeric(rows, 'cashflow_amount')
+        time_col = 'create_time' if 'create_time' in rows.columns else 'pay_time'
+        add_rows(flow_table,
+                 text(rows, time_col),
+                 text(rows, 'cashflow_type', 'Unknown'),
+                 styled(fmt(amt, ',.2f'), sign_style(amt)),
+                 text(rows, 'cashflow_remark', '').replace({'None': '', 'nan': ''}))
         console.print(flow_table)
+        if note:
+            console.print(f"[dim]{note}[/dim]")
     else:
         console.print(Panel(f"No cash flow settled during {query_label}.", title="Cash Flow", style="dim"))
 
-    ConnectionManager.close()
\ No newline at end of file
+    ConnectionManager.close()
+
+def _last_prices(codes):
+    """{code: last price} from market snapshots, batched; symbols that fail are left out."""
+    from market_data import SNAPSHOT_BATCH_SIZE
+    ctx = ConnectionManager.get_quote_context()
+    batches = [codes[i:i + SNAPSHOT_BATCH_SIZE] for i in range(0, len(codes), SNAPSHOT_BATCH_SIZE)]
+    prices = {}
+    for ret, data in parallel_map(lambda batch: ctx.get_market_snapshot(batch), batches):
+        if ret == RET_OK and not data.empty:
+            prices.update(zip(data['code'], numeric(data, 'last_price')[0]))
+    return prices
+
+def get_pnl(start=None, end=None, method='fifo', offline=False, show_lots=False, limit=None, page=1):
+    """
+    Realized P&L of lots closed between start and end (YYYY-MM-DD), matched
+    locally from the ledger's deal history (see lots.py), plus unrealized P&L
+    of the lots still open when the range ends today.
+    Unless `offline`, the ledger is first synced incrementally (back to `start`
+    at least) and open lots are priced from market snapshots; offline nothing
+    touches OpenD. Symbols whose opening fills predate the ledger are flagged.
+    """
+    from lots import match_lots, missing_opens
+    today = market_today()
+    end = end or today
+    start = start or f"{end[:4]}-01-01"
+    if start > end:
+        console.print("[bold red]--from must not be after --to.[/bold red]")
+        return
+
+    if offline:
+        account = local_account_key()
+        if account is None:
+            console.print(f"[yellow]No {TRADING_ENV} deal history in the local ledger yet. "
+                          f"Run once without --offline.[/yellow]")
+            return
+    else:
+        console.print("[dim]Incremental sync of deal history...[/dim]")
+        ret, synced = sync_deals(ConnectionManager.get_trade_context(), since=start)
+        if ret != RET_OK:
+            console.print(f"[bold red]Sync failed, using local data:[/bold red] {synced}")
+        account = ConnectionManager.account_key()
+
+    # Lots opened before the range still matter: match the whole history up to `end`.
+    deals = read_fills(end, account=account)
+    matches, open_lots = match_lots(deals, method)
+    incomplete = missing_opens(deals)
+    if incomplete:
+        first_day = str(deals['create_time'].iloc[0])[:10]
+        shown = ', '.join(incomplete[:10]) + (f" and {len(incomplete) - 10} more" if len(incomplete) > 10 else "")
+        console.print(f"[yellow]Deal history before {first_day} is missing for {shown}: they close more than "
+                      f"the ledger ever opened, so their realized P&L and open lots are incomplete. "
+                      f"Backfill with `portfolio deals --sync --start YYYY-MM-DD`.[/yellow]")
+    close_day = matches['close_time'].dt.strftime('%Y-%m-%d') if not matches.empty else pd.Series(dtype=str)
+    closed = matches[(close_day >= start) & (close_day <= end)]
+
+    # Unrealized P&L only means something at today's prices.
+    open_lots = open_lots.assign(last_price=np.nan, unrealized_pl=np.nan)
+    if not offline and end >= today and not open_lots.empty:
+        prices = _last_prices(sorted(open_lots['code'].unique()))
+        open_lots['last_price'] = open_lots['code'].map(prices)
+        open_lots['unrealized_pl'] = (open_lots['qty'] * (open_lots['last_price'] - open_lots['open_price'])
+                                      * open_lots['direction'])
+
+    if show_lots:
+        data = closed.sort_values('close_time', ascending=False)
+    else:
+        # Holding period is a qty-weighted mean over lots that have one (average cost has none).
+        dated = closed['holding_days'].notna()
+        realized = closed.assign(weighted_days=closed['holding_days'].fillna(0.0) * closed['qty'],
+                                 dated_qty=closed['qty'].where(dated, 0.0))
+        realized = realized.groupby('code')[['qty', 'realized_pl', 'weighted_days', 'dated_qty']].sum()
+        realized = realized.rename(columns={'qty': 'closed_qty'})
+        realized['avg_holding_days'] = realized['weighted_days'] / realized['dated_qty'].where(realized['dated_qty'] > 0)
+        held = open_lots.assign(open_qty=open_lots['qty'] * open_lots['direction'],
+                                basis=open_lots['qty'] * open_lots['open_price'] * open_lots['direction'])
+        held = held.groupby('code')[['open_qty', 'basis', 'last_price', 'unrealized_pl']].sum(min_count=1)
+        held['last_price'] = open_lots.groupby('code')['last_price'].first()
+        held['avg_cost'] = held['basis'] / held['open_qty']
+        data = (realized[['closed_qty', 'realized_pl', 'avg_holding_days']]
+                .join(held[['open_qty', 'avg_cost', 'last_price', 'unrealized_pl']], how='outer')
+                .reset_index().rename(columns={'index': 'code'}))
+
+    if machine_output():
+        emit(data)
+        ConnectionManager.close()
+        return
+
+    label = f"{start} to {end}, {method.upper()}"
+    if data.empty:
+        console.print(f"[yellow]No closed lots or open positions for {label}.[/yellow]")
+        ConnectionManager.close()
+        return
+
+    rows, note = paginate(data, limit, page)
+    if show_lots:
+        table = Table(title=f"Matched Lots ({TRADING_ENV}, {label})")
+        for title in ("Closed", "Opened", "Symbol", "Side", "Qty", "Open", "Close", "Days", "Realized P&L"):
+            table.add_column(title, justify="right" if title in ("Qty", "Open", "Close", "Days", "Realized P&L") else "left")
+        qty, open_price, close_price, days, pl = numeric(rows, 'qty', 'open_price', 'close_price',
+                                                          'holding_days', 'realized_pl')
+        dated = rows['holding_days'].notna()
+        add_rows(table,
+                 rows['close_time'].dt.strftime('%Y-%m-%d %H:%M:%S'),
+                 rows['open_time'].dt.strftime('%Y-%m-%d %H:%M:%S').fillna('-'),
+                 text(rows, 'code'),
+                 choose(rows['direction'] > 0, "Long", "Short", rows.index),
+                 fmt(qty, ',.0f'),
+                 fmt(open_price, ',.2f'),
+                 fmt(close_price, ',.2f'),
+                 choose(dated, fmt(days, '.1f'), '-', rows.index),
+                 styled(fmt(pl, '+,.2f'), sign_style(pl)))
+    else:
+        table = Table(title=f"P&L by Symbol ({TRADING_ENV}, {label})")
+        table.add_column("Symbol", style="yellow")
+        for title in ("Closed Qty", "Realized P&L", "Avg Days", "Open Qty", "Avg Cost", "Last", "Unrealized P&L"):
+            table.add_column(title, justify="right")
+        closed_qty, realized, days, open_qty, avg_cost, last, unrealized = numeric(
+            rows, 'closed_qty', 'realized_pl', 'avg_holding_days', 'open_qty', 'avg_cost', 'last_price',
+            'unrealized_pl')
+
+        def blank(column, values):
+            return choose(rows[column].notna(), values, '-', rows.index)
+
+        add_rows(table,
+                 text(rows, 'code'),
+                 blank('closed_qty', fmt(closed_qty, ',.0f')),
+                 blank('realized_pl', styled(fmt(realized, '+,.2f'), sign_style(realized))),
+                 blank('avg_holding_days', fmt(days, '.1f')),
+                 blank('open_qty', fmt(open_qty, ',.0f')),
+                 blank('avg_cost', fmt(avg_cost, ',.2f')),
+                 blank('last_price', fmt(last, ',.2f')),
+                 blank('unrealized_pl', styled(fmt(unrealized, '+,.2f'), sign_style(unrealized))))
+
+    console.print(table)
+    if note:
+        console.print(f"[dim]{note}[/dim]")
+    total_realized = closed['realized_pl'].sum()
+    total_unrealized = open_lots['unrealized_pl'].sum(min_count=1)
+    summary = f"Realized P&L: [bold]{total_realized:+,.2f}[/bold] (before fees)"
+    if not pd.isna(total_unrealized):
+        summary += f" | Unrealized P&L: [bold]{total_unrealized:+,.2f}[/bold]"
+    console.print(summary)
+    ConnectionManager.close()
@@ -0,0 +1,118 @@
+import math
+import sys
+import click
+import numpy as np
+import pandas as pd
+
+# Vectorized helpers for turning API DataFrames into rich tables. Columns are
+# coerced and formatted a whole Series at a time instead of per cell.
+
+def numeric(df, *columns):
+    """
+    Float Series for each column, coerced in one pass (same semantics as
+    safe_float: missing column, None or junk -> 0.0).
+    """
+    return [pd.to_numeric(df[c], errors='coerce').fillna(0.0) if c in df.columns
+            else pd.Series(0.0, index=df.index) for c in columns]
+
+def text(df, column, default='N/A'):
+    """Column as strings; `default` if the column is absent."""
+    if column not in df.columns:
+        return pd.Series(default, index=df.index)
+    return df[column].astype(str)
+
+def fmt(values, spec):
+    """Formats a numeric Series with a format spec, e.g. ',.2f'."""
+    return values.map(('{:' + spec + '}').format)
+
+def choose(condition, if_true, if_false, index):
+    """Element-wise choice between two values/Series, as a Series on `index`."""
+    return pd.Series(np.where(condition, if_true, if_false), index=index)
+
+def styled(values, styles):
+    """Wraps each string in rich markup using the per-row style Series (or one style)."""
+    return '[' + styles + ']' + values + '[/' + styles + ']'
+
+def sign_style(values, positive='green', negative='red'):
+    return choose(values >= 0, positive, negative, values.index)
+
+def paginate(df, limit=None, page=1):
+    """
+    Returns (rows for the requested page, note or None). Slicing happens before
+    any formatting so only the rows shown are ever rendered.
+    """
+    total = len(df)
+    if not limit or limit <= 0 or (total <= limit and page <= 1):
+        return df, None
+    pages = max(1, math.ceil(total / limit))
+    page = min(max(page, 1), pages)
+    start = (page - 1) * limit
+    part = df.iloc[start:start + limit]
+    note = f"Showing rows {start + 1}-{start + len(part)} of {total} (page {page}/{pages}, use --page)"
+    return part, note
+
+def add_rows(table, *columns):
+    """Adds rows to a rich Table from equally long column sequences."""
+    for row in zip(*columns):
+        table.add_row(*row)
+
+# --- Machine-readable output (--format) ---
+
+# Text formats are serialized this many rows at a time, so the encoded copy of a
+# large history never exists in memory all at once.
+EXPORT_CHUNK_ROWS = 10000
+
+_output = {'format': 'table', 'path': None, 'stream': None}
+
+def set_output(output_format='table', path=None, stream=None):
+    """Selects how command results are written; `stream` is stdout for machine formats."""
+    _output.update(format=output_format, path=path, stream=stream)
+
+def machine_output():
+    """True when results go out as data (--format other than table)."""
+    return _output['format'] != 'table'
+
+def _chunks(df):
+    for start in range(0, len(df), EXPORT_CHUNK_ROWS):
+        yield df.iloc[start:start + EXPORT_CHUNK_ROWS]
+
+def _write_text(df, output_format, out):
+    if output_format == 'jsonl':
+        for chunk in _chunks(df):
+            lines = chunk.to_json(orient='records', lines=True, date_format='iso')
+            out.write(lines if lines.endswith('\n') else lines + '\n')
+    elif output_format == 'json':
+        out.write('[')
+        for i, chunk in enumerate(_chunks(df)):
+            if i:
+                out.write(',')
+            out.write(chunk.to_json(orient='records', date_format='iso')[1:-1])
+        out.write(']\n')
+    else:
+        out.write(df.iloc[:0].to_csv(index=False))
+        for chunk in _chunks(df):
+            out.write(chunk.to_csv(index=False, header=False))
+
+def emit(df):
+    """
+    Writes a result DataFrame in the selected --format to --output, or to stdout.
+    Parquet needs pyarrow (or fastparquet) installed.
+    """
+    output_format, path = _output['format'], _output['path']
+    stream = _output['stream'] or sys.stdout
+    if output_format == 'parquet':
+        if path is None:
+            stream = getattr(stream, 'buffer', None)
+            if stream is None:
+                raise click.UsageError("Parquet cannot be written to this stdout; use --output FILE.")
+        try:
+            df.to_parquet(path if path is not None else stream, index=False)
+        except ImportError:
+            raise click.ClickException("Parquet output needs pyarrow: pip install pyarrow")
+        return
+    if path is None:
+        _write_text(df, output_format, stream)
+        stream.flush()
+    else:
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            _write_text(df, output_format, f)
@@ -0,0 +1,260 @@
+import itertools
+import threading
+import time
+from collections import deque
+
+# OpenD request quotas: max calls per 30-second window, per API (see the
+# "Interface Limitations" note of each call in the moomoo OpenAPI docs).
+# Trade quotas count per account (ACCOUNT_LIMITED), and the four cached
+# queries are only limited when they bypass OpenD's cache (refresh_cache=True).
+RATE_LIMIT_WINDOW = 30.0
+DEFAULT_RATE_LIMIT = 10
+RATE_LIMITS = {
+    'place_order': 15,
+    'modify_order': 20,
+    'unlock_trade': 10,
+    'accinfo_query': 10,
+    'position_list_query': 10,
+    'order_list_query': 10,
+    'deal_list_query': 10,
+    'history_deal_list_query': 10,
+    'get_acc_cash_flow': 20,
+    'order_fee_query': 10,
+    'get_market_snapshot': 60,
+    'request_trading_days': 30,
+}
+
+ACCOUNT_LIMITED = {'place_order', 'modify_order', 'accinfo_query', 'position_list_query', 'order_list_query',
+                   'deal_list_query', 'history_deal_list_query', 'get_acc_cash_flow', 'order_fee_query'}
+CACHED_QUERIES = {'accinfo_query', 'position_list_query', 'order_list_query', 'deal_list_query'}
+
+# Scheduling priorities (lower runs first): pulling orders beats everything.
+PRIORITY_CANCEL = 0
+PRIORITY_ORDER = 1
+PRIORITY_QUERY = 2
+PRIORITY_HISTORY = 3
+
+API_PRIORITIES = {
+    'place_order': PRIORITY_ORDER,
+    'modify_order': PRIORITY_ORDER,
+    'history_deal_list_query': PRIORITY_HISTORY,
+    'get_acc_cash_flow': PRIORITY_HISTORY,
+    'order_fee_query': PRIORITY_HISTORY,
+}
+
+def rate_family(api, args, kwargs):
+    """
+    Quota bucket one SDK call counts against, e.g. 'place_order' or
+    'accinfo_query@SIMULATE:0:0' (per trd_env/acc_id/acc_index), or None when
+    OpenD does not limit it. Accounts are read from keyword arguments.
+    """
+    if api not in RATE_LIMITS:
+        return None
+    if api in CACHED_QUERIES and not kwargs.get('refresh_cache'):
+        return None
+    if api in ACCOUNT_LIMITED:
+        return f"{api}@{kwargs.get('trd_env', '')}:{kwargs.get('acc_id', 0)}:{kwargs.get('acc_index', 0)}"
+    return api
+
+def call_priority(api, args, kwargs):
+    """Priority of one SDK call; modify_order(ModifyOrderOp.CANCEL, ...) counts as a cancel."""
+    if api == 'modify_order':
+        op = args[0] if args else kwargs.get('modify_order_op')
+        if str(op) == 'CANCEL':
+            return PRIORITY_CANCEL
+    return API_PRIORITIES.get(api, PRIORITY_QUERY)
+
+class TokenBucket:
+    """
+    Token bucket for one API family: `capacity` tokens, each returned exactly
+    `period` seconds after it was taken. Unlike a constant-rate refill this never
+    lets more than `capacity` calls into any window, matching OpenD's accounting.
+    """
+    def __init__(self, capacity, period=RATE_LIMIT_WINDOW):
+        self.capacity = capacity
+        self.period = period
+        self._taken = deque()
+
+    def _expire(self, now):
+        while self._taken and now - self._taken[0] >= self.period:
+            self._taken.popleft()
+
+    def wait_time(self, now):
+        """Seconds until a token is available (0 if one is available now)."""
+        self._expire(now)
+        if len(self._taken) < self.capacity:
+            return 0.0
+        return self.period - (now - self._taken[0])
+
+    def take(self, now):
+        self._taken.append(now)
+
+class Scheduler:
+    """
+    Central gate for OpenD requests. Each API family (see rate_family(): trade
+    quotas are per account) has a TokenBucket; waiting
+    calls form one priority queue, and the highest-priority call whose family has
+    a token runs next (cancels first, history queries last). At most
+    `max_in_flight` requests are outstanding at once. Queue-wait time is tracked
+    per family.
+    """
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self._cond = threading.Condition()
+        self._queue = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._buckets = {}
+        self._waits = {}
+        self._local = threading.local()
+
+    def _bucket(self, family):
+        if family not in self._buckets:
+            api = family.split('@')[0]
+            self._buckets[family] = TokenBucket(RATE_LIMITS.get(api, DEFAULT_RATE_LIMIT))
+        return self._buckets[family]
+
+    def _next_runnable(self, now):
+        """Returns (ticket to run or None, seconds until something may become runnable)."""
+        retry = None
+        for ticket in sorted(self._queue):
+            wait = self._bucket(ticket[2]).wait_time(now)
+            if wait == 0:
+                return ticket, 0.0
+            retry = wait if retry is None else min(retry, wait)
+        return None, retry
+
+    def run(self, family, priority, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) once the scheduler grants it a slot and a token."""
+        ticket = (priority, next(self._seq), family)
+        enqueued = time.monotonic()
+        with self._cond:
+            self._queue.append(ticket)
+            while True:
+                now = time.monotonic()
+                if self._in_flight < self.max_in_flight:
+                    runnable, retry = self._next_runnable(now)
+                    if runnable is ticket:
+                        break
+                    if runnable is not None:
+                        # Someone else is up: wake them, then wait for their dispatch.
+                        self._cond.notify_all()
+                        retry = None
+                else:
+                    retry = None
+                self._cond.wait(timeout=retry)
+            self._queue.remove(ticket)
+            self._bucket(family).take(now)
+            self._in_flight += 1
+            self._record_wait(family, now - enqueued)
+            # The next ticket in line may be runnable too.
+            self._cond.notify_all()
+
+        self._local.last_wait = now - enqueued
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            with self._cond:
+                self._in_flight -= 1
+                self._cond.notify_all()
+
+    def _record_wait(self, family, wait):
+        stats = self._waits.setdefault(family, {'calls': 0, 'total_wait': 0.0, 'max_wait': 0.0})
+        stats['calls'] += 1
+        stats['total_wait'] += wait
+        stats['max_wait'] = max(stats['max_wait'], wait)
+
+    def last_wait(self):
+        """Queue wait (seconds) of the calling thread's most recent scheduled call."""
+        return getattr(self._local, 'last_wait', 0.0)
+
+    def queue_stats(self):
+        """{family: {'calls', 'total_wait', 'max_wait'}} since start."""
+        with self._cond:
+            return {family: dict(stats) for family, stats in self._waits.items()}
+
+class ScheduledContext:
+    """
+    Wraps an OpenSecTradeContext/OpenQuoteContext so every rate-limited SDK call
+    goes through the scheduler. Everything else passes straight through. With an
+    enabled profiler, every public method call is also timed (queue wait and
+    gateway round-trip separately).
+
+    The wrapped context can be swapped after a reconnect (replace()); push
+    handlers are remembered and re-registered on the new one. A temporary
+    handler can be removed again (remove_handler()), which reinstates the one
+    it displaced. While `gate` (a
+    threading.Event) is clear the link is down, and requests wait up to
+    `gate_timeout` seconds for it to come back instead of failing at once.
+    """
+    def __init__(self, ctx, scheduler, profiler=None, gate=None, gate_timeout=0.0):
+        self._ctx = ctx
+        self._scheduler = scheduler
+        self._profiler = profiler
+        self._gate = gate
+        self._gate_timeout = gate_timeout
+        self._handlers = {}  # handler class -> instances, the active one last
+
+    def set_handler(self, handler):
+        self._handlers.setdefault(type(handler), []).append(handler)
+        return self._ctx.set_handler(handler)
+
+    def remove_handler(self, handler):
+        """
+        Unregisters `handler`. The handler it displaced becomes active again, or
+        the SDK's bare base handler (which ignores pushes) if there was none.
+        """
+        stack = self._handlers.get(type(handler), [])
+        if handler not in stack:
+            return
+        active = stack[-1] is handler
+        stack.remove(handler)
+        if not active:
+            return
+        if stack:
+            self._ctx.set_handler(stack[-1])
+        else:
+            del self._handlers[type(handler)]
+            # The SDK keeps one handler per push type and has no unregister call.
+            base = next(cls for cls in type(handler).__mro__ if cls.__module__.startswith('moomoo'))
+            self._ctx.set_handler(base())
+
+    def replace(self, ctx):
+        """Points the wrapper at a new SDK context and re-registers the push handlers."""
+        self._ctx = ctx
+        for stack in self._handlers.values():
+            ctx.set_handler(stack[-1])
+
+    def close(self):
+        return self._ctx.close()
+
+    def _wait_gate(self):
+        if self._gate is not None and not self._gate.is_set():
+            self._gate.wait(self._gate_timeout)
+
+    def __getattr__(self, name):
+        attr = getattr(self._ctx, name)
+        if not callable(attr) or name.startswith('_'):
+            return attr
+        profiler = self._profiler
+        if name not in RATE_LIMITS and self._gate is None:
+            return profiler.timed(name, attr) if profiler is not None and profiler.enabled else attr
+
+        def call(*args, **kwargs):
+            self._wait_gate()
+            # Looked up after the wait: a reconnect may have replaced the context.
+            fn = getattr(self._ctx, name)
+            profiling = profiler is not None and profiler.enabled
+            family = rate_family(name, args, kwargs)
+            if family is None:
+                return profiler.timed(name, fn)(*args, **kwargs) if profiling else fn(*args, **kwargs)
+            priority = call_priority(name, args, kwargs)
+            if not profiling:
+                return self._scheduler.run(family, priority, fn, *args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return self._scheduler.run(family, priority, fn, *args, **kwargs)
+            finally:
+                # last_wait is monotonic seconds; both clocks tick at the same rate.
+                profiler.record_call(name, start, start + self._scheduler.last_wait(), time.perf_counter())
+        return call
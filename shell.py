@@ -0,0 +1,123 @@
+import os
+import shlex
+import click
+from rich.console import Console
+from moomoo import RET_OK
+from connection import ConnectionManager, TRADING_ENV, CACHE_DIR, interruptible
+
+console = Console()
+
+HISTORY_FILE = os.path.join(CACHE_DIR, "shell_history")
+HISTORY_LENGTH = 1000
+
+# Commands that make no sense inside a running shell.
+EXCLUDED_COMMANDS = {"shell", "daemon"}
+
+def _held_tickers():
+    """Symbols currently held (without the 'US.' prefix), for tab completion."""
+    ctx = ConnectionManager.get_trade_context()
+    ret, data = ctx.position_list_query(trd_env=TRADING_ENV)
+    if ret != RET_OK or data.empty:
+        return set()
+    return {str(code).split(".", 1)[-1] for code in data['code']}
+
+class _Completer:
+    """readline completer: command names first, then subcommands and held tickers."""
+    def __init__(self, cli, tickers):
+        self.cli = cli
+        self.tickers = tickers
+        self._matches = []
+
+    def _candidates(self, words):
+        if not words:
+            return [name for name in self.cli.commands if name not in EXCLUDED_COMMANDS]
+        command = self.cli.commands.get(words[0])
+        if isinstance(command, click.Group) and len(words) == 1:
+            return list(command.commands)
+        return sorted(self.tickers)
+
+    def complete(self, text, state):
+        import readline
+        if state == 0:
+            line = readline.get_line_buffer()[:readline.get_begidx()]
+            words = line.split()
+            self._matches = sorted(c + " " for c in self._candidates(words) if c.upper().startswith(text.upper()))
+        return self._matches[state] if state < len(self._matches) else None
+
+def run_shell(cli):
+    """
+    Interactive trading shell: contexts are opened once and reused by every
+    command, so quote/buy/sell/cancel/orders skip connection setup.
+    """
+    try:
+        import readline
+    except ImportError:
+        readline = None
+
+    ConnectionManager.keep_alive()
+    tickers = _held_tickers()
+
+    if readline:
+        try:
+            readline.read_history_file(HISTORY_FILE)
+        except OSError:
+            pass
+        readline.set_history_length(HISTORY_LENGTH)
+        readline.set_completer(_Completer(cli, tickers).complete)
+        readline.set_completer_delims(" \t")
+        readline.parse_and_bind("tab: complete")
+
+    console.print(f"[bold]Moomoo trading shell ({TRADING_ENV}).[/bold] "
+                  "[dim]Type 'help' for commands, 'exit' to quit.[/dim]")
+    try:
+        with interruptible():
+            _loop(cli, tickers)
+    finally:
+        if readline:
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                readline.write_history_file(HISTORY_FILE)
+            except OSError:
+                pass
+        ConnectionManager.keep_alive(False)
+        ConnectionManager.shutdown()
+
+def _loop(cli, tickers):
+    """Reads and runs commands until 'exit' or EOF."""
+    while True:
+        try:
+            line = input("moomoo> ").strip()
+        except KeyboardInterrupt:
+            console.print()
+            continue
+        except EOFError:
+            console.print()
+            break
+        if not line:
+            continue
+        if line in ("exit", "quit"):
+            break
+
+        try:
+            args = shlex.split(line)
+        except ValueError as e:
+            console.print(f"[bold red]Parse error:[/bold red] {e}")
+            continue
+        if args[0] == "help":
+            args = ["--help"]
+        if args[0] in EXCLUDED_COMMANDS:
+            console.print(f"[yellow]'{args[0]}' is not available inside the shell.[/yellow]")
+            continue
+
+        try:
+            cli.main(args=args, prog_name="", standalone_mode=False)
+        except click.exceptions.ClickException as e:
+            e.show()
+        except (click.exceptions.Abort, KeyboardInterrupt):
+            console.print("[dim]Aborted.[/dim]")
+        except SystemExit:
+            pass
+
+        # Newly traded symbols become completable right away.
+        if args[0] in ("buy", "sell", "quote") and len(args) > 1:
+            tickers.add(args[1].upper().split(".", 1)[-1])
@@ -0,0 +1,15 @@
+import pandas as pd
+from moomoo import TrdSide
+from trading import filter_side
+
+def _orders():
+    return pd.DataFrame({
+        'order_id': ['1', '2', '3', '4'],
+        'trd_side': [TrdSide.BUY, TrdSide.BUY_BACK, TrdSide.SELL, TrdSide.SELL_SHORT],
+    })
+
+def test_cancel_side_buy_includes_buy_backs():
+    assert filter_side(_orders(), 'buy')['order_id'].tolist() == ['1', '2']
+
+def test_cancel_side_sell_includes_short_sales():
+    assert filter_side(_orders(), 'SELL')['order_id'].tolist() == ['3', '4']
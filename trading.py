@@ -1,9 +1,17 @@
+import csv
+import json
+import os
+import threading
+import time
 import click
+import numpy as np
+import pandas as pd
 from rich.console import Console
 from rich.table import Table
-from moomoo import TrdSide, OrderType, OrderStatus, RET_OK, ModifyOrderOp, TrailType
+from moomoo import TrdSide, OrderType, OrderStatus, RET_OK, ModifyOrderOp, TrailType, TradeOrderHandlerBase, TradeDealHandlerBase
 # 确保 connection.py 已经包含 safe_float 和 normalize_ticker
-from connection import ConnectionManager, TRADING_ENV, safe_float, normalize_ticker
+from connection import ConnectionManager, TRADING_ENV, safe_float, normalize_ticker, parallel_map
+from render import numeric, text, fmt, choose, styled, paginate, add_rows, machine_output, emit
 
 console = Console()
 
@@ -19,7 +27,111 @@ ORDER_TYPE_MAP = {
     'TR_STOP_LIMIT': OrderType.TRAILING_STOP_LIMIT # Trailing Stop Limit
 }
 
-def get_orders():
+class OrderPushHandler(TradeOrderHandlerBase):
+    """Forwards order-update pushes (one-row DataFrames) to a callback on the SDK's push thread."""
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret == RET_OK:
+            self.callback(data)
+        return ret, data
+
+class DealPushHandler(TradeDealHandlerBase):
+    """Forwards fill pushes (one-row DataFrames) to a callback on the SDK's push thread."""
+    def __init__(self, callback):
+        super().__init__()
+        self.callback = callback
+
+    def on_recv_rsp(self, rsp_pb):
+        ret, data = super().on_recv_rsp(rsp_pb)
+        if ret == RET_OK:
+            self.callback(data)
+        return ret, data
+
+# Statuses after which an order will not change any more
+FINAL_STATUSES = [OrderStatus.FILLED_ALL, OrderStatus.CANCELLED_ALL, OrderStatus.CANCELLED_PART,
+                  OrderStatus.FAILED, OrderStatus.SUBMIT_FAILED, OrderStatus.DELETED,
+                  OrderStatus.DISABLED, OrderStatus.TIMEOUT, OrderStatus.FILL_CANCELLED]
+
+class OrderWaiter:
+    """
+    Collects order and deal pushes so a caller can block until one order is done.
+    Pushes are buffered from before placement (the order_id is only known once
+    place_order returns, and fast fills can arrive first).
+    """
+    def __init__(self):
+        self._events = []  # (perf_counter, kind, row)
+        self._cond = threading.Condition()
+
+    def on_order(self, data):
+        self._record('order', data)
+
+    def on_deal(self, data):
+        self._record('deal', data)
+
+    def _record(self, kind, data):
+        now = time.perf_counter()
+        with self._cond:
+            self._events.extend((now, kind, r) for r in data.to_dict('records'))
+            self._cond.notify_all()
+
+    def wait(self, order_id, qty, timeout):
+        """
+        Blocks until order_id reaches a final status or `timeout` seconds pass.
+        Returns (status or None, filled qty, avg fill price, first fill time, full fill time);
+        times are perf_counter values or None.
+        """
+        order_id = str(order_id)
+        deadline = time.perf_counter() + timeout
+        status, first_fill, full_fill = None, None, None
+        seen_deals, deal_qty, deal_notional = set(), 0.0, 0.0
+        order_qty, order_notional = 0.0, 0.0
+        filled = notional = 0.0
+        cursor = 0
+        with self._cond:
+            while True:
+                for t, kind, r in self._events[cursor:]:
+                    if str(r.get('order_id')) != order_id:
+                        continue
+                    if kind == 'deal' and r.get('deal_id') not in seen_deals:
+                        seen_deals.add(r.get('deal_id'))
+                        deal_qty += safe_float(r.get('qty'))
+                        deal_notional += safe_float(r.get('qty')) * safe_float(r.get('price'))
+                        first_fill = first_fill or t
+                    elif kind == 'order':
+                        status = r.get('order_status')
+                        if safe_float(r.get('dealt_qty')) > order_qty:
+                            order_qty = safe_float(r.get('dealt_qty'))
+                            order_notional = order_qty * safe_float(r.get('dealt_avg_price'))
+                            first_fill = first_fill or t
+                    # Order pushes carry the cumulative fill, deal pushes one fill each:
+                    # use whichever has seen more (either kind can arrive first or be missed).
+                    if deal_qty >= order_qty:
+                        filled, notional = deal_qty, deal_notional
+                    else:
+                        filled, notional = order_qty, order_notional
+                    if full_fill is None and (filled >= qty or status == OrderStatus.FILLED_ALL):
+                        full_fill = t
+                cursor = len(self._events)
+
+                if status in FINAL_STATUSES or (full_fill and filled >= qty):
+                    break
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(timeout=remaining)
+
+        avg = notional / filled if filled else 0.0
+        return status, filled, avg, first_fill, full_fill
+
+# Orders that can still be cancelled
+WORKING_STATUSES = [OrderStatus.UNSUBMITTED, OrderStatus.WAITING_SUBMIT, OrderStatus.SUBMITTING,
+                    OrderStatus.SUBMITTED, OrderStatus.FILLED_PART]
+
+def get_orders(limit=None, page=1):
     """
     Fetches and displays the list of orders for today.
     """
@@ -34,6 +146,11 @@ def get_orders():
         ConnectionManager.close()
         return
 
+    if machine_output():
+        emit(data)
+        ConnectionManager.close()
+        return
+
     if not data.empty:
         # Sort by updated_time descending
         if 'updated_time' in data.columns:
@@ -53,102 +170,79 @@ def get_orders():
         table.add_column("Trigger", justify="right", style="magenta") 
         table.add_column("Time", justify="right", style="dim")
 
-        for _, row in data.iterrows():
-            side = row.get('trd_side', 'UNKNOWN')
-            side_style = "bold red" if side == "BUY" else "bold green"
-            
-            status = row.get('order_status', 'UNKNOWN')
-            status_style = "green" if status in [OrderStatus.FILLED_ALL, OrderStatus.FILLED_PART] else "white"
-            if status in [OrderStatus.CANCELLED_ALL, OrderStatus.CANCELLED_PART]:
-                status_style = "dim"
-            elif status == OrderStatus.FAILED:
-                status_style = "red"
-
-            order_id = str(row.get('order_id', ''))
-            code = str(row.get('code', ''))
-            price = safe_float(row.get('price'))
-            dealt_avg_price = safe_float(row.get('dealt_avg_price'))
-            qty = safe_float(row.get('qty'))
-            dealt_qty = safe_float(row.get('dealt_qty'))
-            update_time = str(row.get('updated_time', ''))
-            
-            # 获取触发价 (Aux Price)
-            aux_price = safe_float(row.get('aux_price'))
-            # 如果有触发价则显示，否则显示 "-"
-            aux_display = f"{aux_price:.2f}" if aux_price > 0 else "-"
-
-            filled_price_display = f"{dealt_avg_price:.2f}"
-            if dealt_qty == 0:
-                filled_price_display = "-"
-
-            table.add_row(
-                order_id,
-                code,
-                f"[{side_style}]{side}[/{side_style}]",
-                f"[{status_style}]{status}[/{status_style}]",
-                f"{price:.2f}",
-                filled_price_display,
-                f"{qty:.0f}",
-                f"{dealt_qty:.0f}",
-                aux_display, # 显示触发价
-                update_time
-            )
+        rows, note = paginate(data, limit, page)
+        price, dealt_avg_price, qty, dealt_qty, aux_price = numeric(
+            rows, 'price', 'dealt_avg_price', 'qty', 'dealt_qty', 'aux_price')
+        side = text(rows, 'trd_side', 'UNKNOWN')
+        status = text(rows, 'order_status', 'UNKNOWN')
+        status_style = pd.Series(np.select(
+            [status.isin([OrderStatus.FILLED_ALL, OrderStatus.FILLED_PART]),
+             status.isin([OrderStatus.CANCELLED_ALL, OrderStatus.CANCELLED_PART]),
+             status == OrderStatus.FAILED],
+            ["green", "dim", "red"], default="white"), index=rows.index)
+
+        add_rows(table,
+                 text(rows, 'order_id', ''),
+                 text(rows, 'code', ''),
+                 styled(side, choose(side == "BUY", "bold red", "bold green", rows.index)),
+                 styled(status, status_style),
+                 fmt(price, '.2f'),
+                 choose(dealt_qty == 0, "-", fmt(dealt_avg_price, '.2f'), rows.index),
+                 fmt(qty, '.0f'),
+                 fmt(dealt_qty, '.0f'),
+                 # 有触发价 (aux_price) 则显示，否则显示 "-"
+                 choose(aux_price > 0, fmt(aux_price, '.2f'), "-", rows.index),
+                 text(rows, 'updated_time', ''))
 
         console.print(table)
+        if note:
+            console.print(f"[dim]{note}[/dim]")
     else:
         console.print("[yellow]No orders found.[/yellow]")
 
     ConnectionManager.close()
 
-def place_trade(ticker, side, order_type_str, price, qty, 
-                aux_price=0.0, trail_type=None, trail_value=0.0, trail_spread=0.0):
+def build_order_params(ticker, side, order_type_str, price, qty,
+                       aux_price=0.0, trail_type=None, trail_value=0.0, trail_spread=0.0):
     """
-    Executes a trade order with support for advanced order types.
+    Validates an order and maps it to place_order keyword arguments.
+    Raises ValueError with a user-facing message if the order is invalid.
     """
-    ctx = ConnectionManager.get_trade_context()
-    
     code = normalize_ticker(ticker)
+    if side.lower() not in ('buy', 'sell'):
+        raise ValueError(f"Invalid side: {side}")
     trd_side = TrdSide.BUY if side.lower() == 'buy' else TrdSide.SELL
-    
+
+    if qty <= 0:
+        raise ValueError("Quantity must be positive.")
+
     # 1. Map CLI String to Enum
     order_type_enum = ORDER_TYPE_MAP.get(order_type_str.upper())
     if not order_type_enum:
-        console.print(f"[bold red]Invalid order type:[/bold red] {order_type_str}")
-        return
+        raise ValueError(f"Invalid order type: {order_type_str}")
 
     # 2. Validate Parameters
     # Limit Orders need Price
     if order_type_enum in [OrderType.NORMAL, OrderType.STOP_LIMIT, OrderType.LIMIT_IF_TOUCHED] and price <= 0:
-        console.print("[bold red]Error:[/bold red] This order type requires a limit PRICE.")
-        return
+        raise ValueError("This order type requires a limit PRICE.")
     
     # Trigger Orders need Aux Price (Stop/MIT/LIT)
     if order_type_enum in [OrderType.STOP, OrderType.STOP_LIMIT, OrderType.MARKET_IF_TOUCHED, OrderType.LIMIT_IF_TOUCHED]:
         if aux_price <= 0:
-            console.print(f"[bold red]Error:[/bold red] {order_type_str} requires --aux (Trigger/Stop Price).")
-            return
+            raise ValueError(f"{order_type_str} requires --aux (Trigger/Stop Price).")
 
     # Trailing Orders need Trail Value
     moomoo_trail_type = TrailType.NONE
     if order_type_enum in [OrderType.TRAILING_STOP, OrderType.TRAILING_STOP_LIMIT]:
         if trail_value <= 0:
-            console.print(f"[bold red]Error:[/bold red] {order_type_str} requires --trail (Trailing Amount/Ratio).")
-            return
+            raise ValueError(f"{order_type_str} requires --trail (Trailing Amount/Ratio).")
         
         if trail_type and trail_type.lower() == 'ratio':
             moomoo_trail_type = TrailType.RATIO
         else:
             moomoo_trail_type = TrailType.AMOUNT
 
-    console.print(f"[yellow]Placing order...[/yellow]")
-    console.print(f"Side: [bold]{trd_side}[/bold] | Symbol: [bold cyan]{code}[/bold cyan]")
-    console.print(f"Type: {order_type_str.upper()} | Qty: {qty}")
-    if price > 0: console.print(f"Limit Price: {price}")
-    if aux_price > 0: console.print(f"Trigger Price: {aux_price}")
-    if trail_value > 0: console.print(f"Trailing: {trail_value} ({moomoo_trail_type})")
-
-    # 3. Call API
-    ret, data = ctx.place_order(
+    return dict(
         price=price, 
         qty=qty, 
         code=code, 
@@ -162,14 +256,236 @@ def place_trade(ticker, side, order_type_str, price, qty,
         trail_spread=trail_spread  # For Trailing Stop Limit
     )
 
-    if ret == RET_OK:
-        order_id = data['order_id'][0]
-        console.print(f"[bold green]Order Placed Successfully![/bold green]")
-        console.print(f"Order ID: {order_id}")
-    else:
-        console.print(f"[bold red]Order Failed:[/bold red] {data}")
-        if "lock" in str(data).lower():
-            console.print("[dim]Tip: Use 'python main.py unlock <password>' first.[/dim]")
+def place_trade(ticker, side, order_type_str, price, qty, 
+                aux_price=0.0, trail_type=None, trail_value=0.0, trail_spread=0.0,
+                wait=False, timeout=60.0):
+    """
+    Executes a trade order with support for advanced order types.
+    With `wait`, blocks on the order's pushes until it is filled, cancelled or
+    failed (or `timeout` seconds pass) and reports submit-to-ack/fill latency.
+    Returns True if the order was placed (and, with `wait`, completely filled).
+    """
+    try:
+        params = build_order_params(ticker, side, order_type_str, price, qty,
+                                    aux_price, trail_type, trail_value, trail_spread)
+    except ValueError as e:
+        console.print(f"[bold red]Error:[/bold red] {e}")
+        return False
+
+    ctx = ConnectionManager.get_trade_context()
+    code = params['code']
+    trd_side = params['trd_side']
+    moomoo_trail_type = params['trail_type']
+
+    console.print(f"[yellow]Placing order...[/yellow]")
+    console.print(f"Side: [bold]{trd_side}[/bold] | Symbol: [bold cyan]{code}[/bold cyan]")
+    console.print(f"Type: {order_type_str.upper()} | Qty: {qty}")
+    if price > 0: console.print(f"Limit Price: {price}")
+    if aux_price > 0: console.print(f"Trigger Price: {aux_price}")
+    if trail_value > 0: console.print(f"Trailing: {trail_value} ({moomoo_trail_type})")
+
+    # Listen before submitting: a marketable order can fill before place_order returns.
+    waiter, handlers = None, []
+    if wait:
+        waiter = OrderWaiter()
+        handlers = [OrderPushHandler(waiter.on_order), DealPushHandler(waiter.on_deal)]
+        for handler in handlers:
+            ctx.set_handler(handler)
+
+    try:
+        # 3. Call API
+        t0 = time.perf_counter()
+        ret, data = ctx.place_order(**params)
+        # "Submit" is when the request left the queue, not when we asked for it.
+        submitted = t0 + ConnectionManager.scheduler.last_wait()
+        acked = time.perf_counter()
+
+        ok = ret == RET_OK
+        if ok:
+            order_id = data['order_id'][0]
+            console.print(f"[bold green]Order Placed Successfully![/bold green]")
+            console.print(f"Order ID: {order_id}")
+            if waiter:
+                ok = _report_fill(waiter, order_id, qty, timeout, submitted, acked)
+        else:
+            console.print(f"[bold red]Order Failed:[/bold red] {data}")
+            if "lock" in str(data).lower():
+                console.print("[dim]Tip: Use 'python main.py unlock <password>' first.[/dim]")
+    finally:
+        # The shell and daemon share this context: stop buffering pushes once the wait is over.
+        for handler in handlers:
+            ctx.remove_handler(handler)
+
+    ConnectionManager.close()
+    return ok
+
+def _report_fill(waiter, order_id, qty, timeout, submitted, acked):
+    """Waits for the order to finish and prints its outcome and latencies. True if fully filled."""
+    console.print(f"[dim]Waiting up to {timeout:.0f}s for order {order_id}...[/dim]")
+    status, filled, avg, first_fill, full_fill = waiter.wait(order_id, qty, timeout)
+
+    def ms(t):
+        return f"{(t - submitted) * 1000:,.1f} ms" if t else "-"
+
+    table = Table(title=f"Order {order_id}", show_header=False)
+    table.add_column("Metric", style="cyan")
+    table.add_column("Value")
+    table.add_row("Status", str(status or "no final status (timeout)"))
+    table.add_row("Filled", f"{filled:.0f} / {qty} @ {avg:.4f}" if filled else f"0 / {qty}")
+    table.add_row("Submit → Ack", ms(acked))
+    table.add_row("Submit → First Fill", ms(first_fill))
+    table.add_row("Submit → Full Fill", ms(full_fill))
+    console.print(table)
+
+    done = full_fill is not None
+    if not done and status not in FINAL_STATUSES:
+        console.print(f"[bold yellow]Timed out after {timeout:.0f}s; order may still be working.[/bold yellow]")
+    return done
+
+# Columns accepted in batch order files (CSV header or JSONL keys)
+BATCH_FIELDS = ['ticker', 'side', 'order_type', 'qty', 'price', 'aux', 'trail', 'trail_type', 'spread']
+
+def load_order_file(path):
+    """
+    Reads order rows from a .csv (with header), a .jsonl/.ndjson file (one object
+    per line) or a .json file (an array of objects, or JSON lines).
+    Returns one entry per row, normally a dict keyed by BATCH_FIELDS (missing
+    optional fields omitted); _row_to_params rejects anything else.
+    """
+    with open(path, newline='') as f:
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.json':
+            content = f.read()
+            try:
+                rows = json.loads(content)
+            except ValueError:
+                rows = None
+            if isinstance(rows, list):
+                return rows
+            return [json.loads(line) for line in content.splitlines() if line.strip()]
+        if extension in ('.jsonl', '.ndjson'):
+            return [json.loads(line) for line in f if line.strip()]
+        reader = csv.DictReader(f)
+        return [{k.strip().lower(): v.strip() if isinstance(v, str) else v for k, v in row.items()
+                 if k and v is not None and str(v).strip() != ''} for row in reader]
+
+def _row_to_params(row):
+    """Converts one batch row to place_order kwargs using the same rules as place_trade."""
+    if not isinstance(row, dict):
+        raise ValueError("Row must be an object of order fields.")
+    unknown = set(row) - set(BATCH_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown field(s): {', '.join(sorted(unknown))}")
+    for field in ('ticker', 'side', 'order_type', 'qty'):
+        if str(row.get(field, '')).strip() == '':
+            raise ValueError(f"Missing {field}.")
+    try:
+        qty = float(row['qty'])
+        price = float(row.get('price') or 0.0)
+        aux = float(row.get('aux') or 0.0)
+        trail = float(row.get('trail') or 0.0)
+        spread = float(row.get('spread') or 0.0)
+    except (TypeError, ValueError):
+        raise ValueError("qty/price/aux/trail/spread must be numeric.")
+    # Like the buy/sell commands: never round a quantity down silently.
+    if not qty.is_integer():
+        raise ValueError(f"qty must be a whole number of shares, got {row['qty']}.")
+    qty = int(qty)
+    return build_order_params(str(row['ticker']), str(row['side']), str(row['order_type']), price, qty,
+                              aux_price=aux, trail_type=row.get('trail_type') or 'amount',
+                              trail_value=trail, trail_spread=spread)
+
+def place_batch(path, dry_run=False):
+    """
+    Validates every order in a CSV/JSONL file, then submits them concurrently over
+    one trade context, throttled by the scheduler's place_order bucket. Nothing is sent if
+    any row is invalid.
+    """
+    try:
+        rows = load_order_file(path)
+    except (OSError, ValueError) as e:
+        console.print(f"[bold red]Could not read {path}:[/bold red] {e}")
+        return
+
+    orders, errors = [], []
+    for i, row in enumerate(rows, start=1):
+        try:
+            orders.append((i, row, _row_to_params(row)))
+        except ValueError as e:
+            errors.append((i, row, str(e)))
+
+    if errors:
+        table = Table(title=f"Invalid Orders ({len(errors)} of {len(rows)})", style="red")
+        table.add_column("Row", justify="right")
+        table.add_column("Order")
+        table.add_column("Error", style="bold red")
+        for i, row, err in errors:
+            if isinstance(row, dict):
+                order = " ".join(str(row.get(k, '')) for k in BATCH_FIELDS[:5]).strip()
+            else:
+                order = json.dumps(row)
+            table.add_row(str(i), order, err)
+        console.print(table)
+        console.print("[bold red]No orders were submitted.[/bold red]")
+        return
+
+    if not orders:
+        console.print("[yellow]No orders found in file.[/yellow]")
+        return
+
+    if dry_run:
+        console.print(f"[bold green]{len(orders)} orders validated.[/bold green] [dim](dry run, nothing submitted)[/dim]")
+        return
+
+    ctx = ConnectionManager.get_trade_context()
+    console.print(f"[yellow]Submitting {len(orders)} orders...[/yellow]")
+
+    def submit(order):
+        _, _, params = order
+        t0 = time.perf_counter()
+        ret, data = ctx.place_order(**params)
+        # Report gateway latency and time spent queued behind the rate limit separately.
+        queued = ConnectionManager.scheduler.last_wait()
+        latency = (time.perf_counter() - t0 - queued) * 1000
+        if ret == RET_OK:
+            return True, str(data['order_id'][0]), latency, queued
+        return False, str(data), latency, queued
+
+    started = time.perf_counter()
+    results = parallel_map(submit, orders)
+    elapsed = time.perf_counter() - started
+
+    table = Table(title=f"Batch Results ({TRADING_ENV})")
+    table.add_column("Row", justify="right", style="dim")
+    table.add_column("Symbol", style="yellow")
+    table.add_column("Side", justify="center")
+    table.add_column("Type")
+    table.add_column("Qty", justify="right")
+    table.add_column("Price", justify="right")
+    table.add_column("Result")
+    table.add_column("Latency", justify="right", style="dim")
+    table.add_column("Queued", justify="right", style="dim")
+
+    placed = 0
+    for (i, row, params), (ok, detail, latency, queued) in zip(orders, results):
+        side_style = "bold red" if params['trd_side'] == TrdSide.BUY else "bold green"
+        placed += ok
+        table.add_row(
+            str(i),
+            params['code'],
+            f"[{side_style}]{params['trd_side']}[/{side_style}]",
+            str(row['order_type']).upper(),
+            f"{params['qty']}",
+            f"{params['price']:.2f}" if params['price'] > 0 else "-",
+            f"[green]{detail}[/green]" if ok else f"[red]{detail}[/red]",
+            f"{latency:.0f} ms",
+            f"{queued:.1f} s"
+        )
+
+    console.print(table)
+    console.print(f"[bold]{placed}/{len(orders)} placed in {elapsed:.2f}s.[/bold]")
+    if placed < len(orders) and any("lock" in detail.lower() for ok, detail, _, _ in results if not ok):
+        console.print("[dim]Tip: Use 'python main.py unlock <password>' first.[/dim]")
 
     ConnectionManager.close()
 
@@ -193,4 +509,80 @@ def cancel_order(order_id):
     else:
         console.print(f"[bold red]Failed to Cancel:[/bold red] {data}")
     
-    ConnectionManager.close()
\ No newline at end of file
+    ConnectionManager.close()
+
+# Trade sides matched by `cancel --side`: short sales are sells, buy-backs are buys.
+CANCEL_SIDES = {
+    'buy': {TrdSide.BUY, TrdSide.BUY_BACK},
+    'sell': {TrdSide.SELL, TrdSide.SELL_SHORT},
+}
+
+def filter_side(orders, side):
+    """Rows of an order DataFrame on one side ('buy' or 'sell'), short sales and buy-backs included."""
+    return orders[orders['trd_side'].isin(CANCEL_SIDES[side.lower()])]
+
+def cancel_orders(symbol=None, side=None):
+    """
+    Cancels every working order, optionally filtered by symbol and/or side.
+    The working set comes from one order_list_query; the cancels are issued
+    concurrently at cancel priority, followed by a per-order outcome report.
+    """
+    ctx = ConnectionManager.get_trade_context()
+    started = time.perf_counter()
+
+    code = normalize_ticker(symbol) if symbol else ''
+    ret, data = ctx.order_list_query(status_filter_list=WORKING_STATUSES, code=code, trd_env=TRADING_ENV)
+    if ret != RET_OK:
+        console.print(f"[bold red]Error fetching orders:[/bold red] {data}")
+        ConnectionManager.close()
+        return
+
+    if side and not data.empty:
+        data = filter_side(data, side)
+
+    scope = " ".join(filter(None, [code, side.upper() if side else None])) or "all"
+    if data.empty:
+        console.print(f"[yellow]No working orders to cancel ({scope}).[/yellow]")
+        ConnectionManager.close()
+        return
+
+    orders = list(zip(data['order_id'].astype(str), data['code'], data['trd_side'],
+                      data['qty'], data['dealt_qty']))
+    console.print(f"[yellow]Cancelling {len(orders)} working orders ({scope})...[/yellow]")
+
+    def cancel(order):
+        t0 = time.perf_counter()
+        ret, result = ctx.modify_order(ModifyOrderOp.CANCEL, order[0], 0, 0, trd_env=TRADING_ENV)
+        latency = (time.perf_counter() - t0 - ConnectionManager.scheduler.last_wait()) * 1000
+        return ret == RET_OK, latency, "" if ret == RET_OK else str(result)
+
+    results = parallel_map(cancel, orders)
+    elapsed = time.perf_counter() - started
+
+    table = Table(title=f"Bulk Cancel ({TRADING_ENV})")
+    table.add_column("Order ID", style="dim")
+    table.add_column("Symbol", style="yellow")
+    table.add_column("Side", justify="center")
+    table.add_column("Qty", justify="right")
+    table.add_column("Filled", justify="right")
+    table.add_column("Result")
+    table.add_column("Latency", justify="right", style="dim")
+
+    cancelled = 0
+    for (order_id, order_code, trd_side, qty, dealt_qty), (ok, latency, err) in zip(orders, results):
+        side_style = "bold red" if trd_side == TrdSide.BUY else "bold green"
+        cancelled += ok
+        table.add_row(
+            order_id,
+            str(order_code),
+            f"[{side_style}]{trd_side}[/{side_style}]",
+            f"{safe_float(qty):.0f}",
+            f"{safe_float(dealt_qty):.0f}",
+            "[green]Cancelled[/green]" if ok else f"[red]{err}[/red]",
+            f"{latency:.0f} ms"
+        )
+
+    console.print(table)
+    style = "bold green" if cancelled == len(orders) else "bold red"
+    console.print(f"[{style}]{cancelled}/{len(orders)} cancelled; time to flat {elapsed:.2f}s.[/{style}]")
+    ConnectionManager.close()
@@ -0,0 +1,74 @@
+import json
+import os
+import time
+from datetime import datetime, timedelta
+import pytz
+from moomoo import RET_OK, TradeDateMarket
+from connection import ConnectionManager, CACHE_DIR
+
+# Holidays are published well in advance; refresh the cached calendar weekly.
+CALENDAR_TTL = 7 * 24 * 3600
+CALENDAR_FILE = os.path.join(CACHE_DIR, "trading_days_US.json")
+
+def _date_range(start, end):
+    """All calendar days between start and end (inclusive), as 'YYYY-MM-DD' strings."""
+    curr = datetime.strptime(start, "%Y-%m-%d")
+    last = datetime.strptime(end, "%Y-%m-%d")
+    days = []
+    while curr <= last:
+        days.append(curr.strftime("%Y-%m-%d"))
+        curr += timedelta(days=1)
+    return days
+
+def _load_cache():
+    try:
+        with open(CALENDAR_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _save_cache(cache):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = CALENDAR_FILE + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(cache, f)
+        os.replace(tmp, CALENDAR_FILE)
+    except OSError:
+        pass  # Cache is an optimization; never fail the command over it.
+
+def _fetch(start, end):
+    """Fetches US trading days from OpenD. Returns a list of dates or None on failure."""
+    ctx = ConnectionManager.get_quote_context()
+    ret, data = ctx.request_trading_days(market=TradeDateMarket.US, start=start, end=end)
+    if ret != RET_OK:
+        return None
+    return sorted(str(item.get('time'))[:10] for item in data)
+
+def get_trading_days(start, end):
+    """
+    Returns the US trading days between start and end (inclusive, 'YYYY-MM-DD').
+    Served from the on-disk cache when it covers the range and has not expired;
+    falls back to weekdays if OpenD cannot provide the calendar.
+    """
+    cache = _load_cache()
+    fresh = cache is not None and time.time() - cache.get('fetched_at', 0) < CALENDAR_TTL
+
+    if fresh and cache['start'] <= start and end <= cache['end']:
+        days = cache['days']
+    else:
+        # Widen to the cached range so a new query never shrinks the cache.
+        q_start, q_end = start, end
+        if fresh:
+            q_start, q_end = min(start, cache['start']), max(end, cache['end'])
+        days = _fetch(q_start, q_end)
+        if days is None:
+            return [d for d in _date_range(start, end)
+                    if datetime.strptime(d, "%Y-%m-%d").weekday() < 5]
+        _save_cache({'fetched_at': time.time(), 'start': q_start, 'end': q_end, 'days': days})
+
+    return [d for d in days if start <= d <= end]
+
+def market_today():
+    """Today's date in the US market timezone ('YYYY-MM-DD')."""
+    return datetime.now(pytz.timezone('US/Eastern')).strftime("%Y-%m-%d")